@@ -0,0 +1,49 @@
+"""benchmark the json codecs used by Jsonl
+usage:
+    PYTHONPATH=src python scripts/benchmark_jsonl_codec.py [n_documents]
+"""
+import gc
+import sys
+import tempfile
+
+from computing_toolbox.utils.jsonl import Jsonl
+from computing_toolbox.utils.jsonl_codec import CODECS, resolve_codec
+from computing_toolbox.utils.tictoc import tic, toc
+
+
+def main(n_documents: int = 200000):
+    """write and read the same documents with every available codec"""
+    documents = [{
+        "id": k,
+        "name": f"name-{k}",
+        "score": k / 7,
+        "tags": ["a", "b", "c"],
+        "nested": {
+            "flag": k % 2 == 0,
+            "value": None
+        }
+    } for k in range(n_documents)]
+
+    print(f"{'codec':>8} {'write(s)':>10} {'read(s)':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for codec in CODECS:
+            try:
+                resolve_codec(codec)
+            except ValueError:
+                print(f"{codec:>8} {'not installed':>21}")
+                continue
+            path = f"{tmp_dir}/{codec}.jsonl"
+            # collect the garbage of the previous codec, it is not charged to this one
+            gc.collect()
+            tic(codec)
+            Jsonl.write(path, documents, codec=codec)
+            write_time = toc(codec, verbose=False)
+            gc.collect()
+            tic(codec)
+            Jsonl.read(path, codec=codec)
+            read_time = toc(codec, verbose=False)
+            print(f"{codec:>8} {write_time:>10.3f} {read_time:>10.3f}")
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -84,6 +84,39 @@ class Gs:
                     f"🟢x{success}") if blob_pbar_it else None
                 yield filename
 
+    @classmethod
+    def stat(cls, path: str) -> dict:
+        """get the size in bytes and the last update time (as epoch seconds) of an object
+
+        :param path: the object path
+        :return: a dictionary with the keys "size" and "mtime"
+        """
+        bucket_name, blob_name = cls.split(path)
+        storage_client = storage.Client()
+        blob = storage_client.bucket(bucket_name).get_blob(blob_name)
+        if blob is None:
+            raise FileNotFoundError(f"Gs.stat: '{path}' doesn't exist")
+        return {"size": blob.size, "mtime": blob.updated.timestamp()}
+
+    @classmethod
+    def rename(cls, path: str, new_path: str) -> str:
+        """rename an object inside the same bucket
+
+        :param path: the object path
+        :param new_path: the new object path
+        :return: the new object path
+        """
+        bucket_name, blob_name = cls.split(path)
+        new_bucket_name, new_blob_name = cls.split(new_path)
+        if bucket_name != new_bucket_name:
+            raise ValueError(
+                f"Gs.rename expects paths in the same bucket. Value provided path='{path}', new_path='{new_path}'"
+            )
+        storage_client = storage.Client()
+        bucket = storage_client.bucket(bucket_name)
+        bucket.rename_blob(bucket.blob(blob_name), new_blob_name)
+        return new_path
+
     @classmethod
     def rm(cls, path: str) -> bool:
         """remove an object from gcp"""
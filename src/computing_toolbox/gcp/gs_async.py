@@ -1,16 +1,17 @@
 """Google Storage class with async operations"""
 import asyncio
-import gzip
 
 from gcloud.aio.storage import Storage
 from tqdm import tqdm
 
 from computing_toolbox.gcp.gs import Gs
+from computing_toolbox.utils.compression import compress, decompress, is_compressed_path
 
 
 class GsAsync:
     """GS async class
-    if you want to read/write gzip files you only need to provide *.gz extension in the path
+    if you want to read/write compressed files you only need to provide the extension in the path:
+    *.gz, *.bz2, *.zst or *.lz4 (see `computing_toolbox.utils.compression`)
 
     example 1:
         response = GsAsync.write(["gs://b1/f1.txt.gz"],["hello, world"])
@@ -127,12 +128,14 @@ class GsAsync:
     async def _read_one(cls,
                         path: str,
                         timeout: int,
-                        tqdm_pbar: tqdm or None = None) -> str or None:
+                        tqdm_pbar: tqdm or None = None,
+                        decode: bool = True) -> str or bytes or None:
         """read one path asynchronously
 
         :param path: path to be read
         :param timeout: timeout before to raise an exception
         :param tqdm_pbar: the progressbar (default: None)
+        :param decode: if True decode the content as utf8 string, else return bytes (default: True)
         :return: path content
         """
         # 1. get bucket and key
@@ -143,13 +146,12 @@ class GsAsync:
             async with Storage() as client:
                 content_in_bytes: bytes = await client.download(
                     bucket, key, timeout=timeout)
-                # 2.1 parse zip content if needed
-                content_in_bytes = gzip.decompress(
-                    content_in_bytes) if path.endswith(
-                        ".gz") else content_in_bytes
+                # 2.1 decompress the content given the path extension
+                content_in_bytes = decompress(content_in_bytes, path)
 
                 # 2.2 if success, convert to string.
-                content = content_in_bytes.decode("utf8")
+                content = content_in_bytes.decode(
+                    "utf8") if decode else content_in_bytes
         except Exception:
             # 2.2 if fails, set content to None
             content = None
@@ -164,19 +166,23 @@ class GsAsync:
     async def _read_many(cls,
                          paths: list[str],
                          timeout: int,
-                         tqdm_pbar: tqdm or None = None) -> list[str]:
+                         tqdm_pbar: tqdm or None = None,
+                         decode: bool = True) -> list[str]:
         """read many paths asynchronously
 
         :param paths: the list of paths
         :param timeout: timeout before trigger an error
         :param tqdm_pbar: the progressbar (default: None)
+        :param decode: if True decode the contents as utf8 strings, else return bytes (default: True)
         :return: the list of contents
         """
         # 1. define the list of functions to call
         tasks = [
             asyncio.ensure_future(
-                cls._read_one(path=path, timeout=timeout, tqdm_pbar=tqdm_pbar))
-            for path in paths
+                cls._read_one(path=path,
+                              timeout=timeout,
+                              tqdm_pbar=tqdm_pbar,
+                              decode=decode)) for path in paths
         ]
         # 2. call all the functions
         results = await asyncio.gather(*tasks)
@@ -188,13 +194,15 @@ class GsAsync:
              paths: list[str],
              batch_size: int = 10,
              timeout: int or None = None,
-             tqdm_kwargs: dict or None = None) -> list[str]:
+             tqdm_kwargs: dict or None = None,
+             decode: bool = True) -> list[str]:
         """wrapper function that calls the async version of read_many
 
         :param paths: the list of paths
         :param batch_size: the number of batch operations to split the async read operation
         :param timeout: timeout before raise an exception, if None set as DEFAULT_TIMEOUT (default: None)
         :param tqdm_kwargs: if not None define a progressbar, set {} for a default progressbar (default: None)
+        :param decode: if True decode the contents as utf8 strings, else return bytes (default: True)
         :return: the list of contents
         """
         # 1. define the timeout
@@ -222,12 +230,39 @@ class GsAsync:
             result_subset = asyncio.run(
                 cls._read_many(paths=path_subset,
                                timeout=timeout,
-                               tqdm_pbar=tqdm_pbar))
+                               tqdm_pbar=tqdm_pbar,
+                               decode=decode))
             results += result_subset
 
         # 3. return the results
         return results
 
+    @classmethod
+    async def aread(cls,
+                    paths: list[str],
+                    batch_size: int = 10,
+                    timeout: int or None = None,
+                    decode: bool = True) -> list[str]:
+        """coroutine version of `read`, to be awaited inside a running event loop
+        (`read` calls `asyncio.run`, so it can't be called from a coroutine)
+
+        :param paths: the list of paths
+        :param batch_size: the number of batch operations to split the async read operation
+        :param timeout: timeout before raise an exception, if None set as DEFAULT_TIMEOUT (default: None)
+        :param decode: if True decode the contents as utf8 strings, else return bytes (default: True)
+        :return: the list of contents
+        """
+        # 1. define the timeout
+        timeout = timeout if timeout else cls.DEFAULT_TIMEOUT
+
+        # 2. await the batches one after the other
+        results = []
+        for k in range(0, len(paths), batch_size):
+            results += await cls._read_many(paths=paths[k:k + batch_size],
+                                            timeout=timeout,
+                                            decode=decode)
+        return results
+
     @classmethod
     async def _write_one(cls,
                          path: str,
@@ -247,8 +282,8 @@ class GsAsync:
 
         # 2. try to write the content
         try:
-            content = gzip.compress(
-                content.encode("utf8")) if path.endswith(".gz") else content
+            content = compress(content.encode("utf8"),
+                               path) if is_compressed_path(path) else content
             async with Storage() as client:
                 response = await client.upload(bucket,
                                                key,
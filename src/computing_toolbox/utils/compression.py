@@ -0,0 +1,144 @@
+"""compression by file extension
+besides the gzip (.gz) and bzip2 (.bz2) formats supported by smart_open, this module
+registers zstandard (.zst) and lz4 (.lz4) in smart_open, so every `Jsonl` method
+and `GsAsync` read and write them transparently given the path extension.
+
+the compression level of every format is taken from `COMPRESSION_LEVELS` when a file
+is written (by smart_open, `compress` or the gzip members of `Jsonl.parallel_write`),
+i.e. to trade some size for speed:
+
+    COMPRESSION_LEVELS[".zst"] = 1
+
+the built-in smart_open handlers of .gz and .bz2 ignore any level, so they are
+replaced by handlers reading the level from `COMPRESSION_LEVELS`.
+NOTE: the handlers are registered in smart_open when this module is imported (by any
+`Jsonl` import), so they apply to every smart_open user of the process: the .gz and
+.bz2 files written by other code also take their level from `COMPRESSION_LEVELS`
+(9 by default, the same level smart_open uses).
+
+the pool workers of `Jsonl` receive the levels resolved in the parent process, so the
+changes of `COMPRESSION_LEVELS` also apply with the "spawn" start method, where the
+workers import this module again with the default levels.
+"""
+import bz2
+import gzip
+import io
+import logging
+import os
+from typing import Optional
+
+import lz4.frame
+import smart_open
+import zstandard
+from smart_open.compression import tweak_close
+
+# compression level used when writing every extension
+COMPRESSION_LEVELS: dict = {".gz": 9, ".bz2": 9, ".zst": 3, ".lz4": 0}
+
+
+def get_extension(path: str) -> str:
+    """the lower case extension of a path, i.e. '.zst'"""
+    return os.path.splitext(path)[1].lower()
+
+
+def _handle_gzip(file_obj, mode: str):
+    """smart_open callback to read or write gzip streams"""
+    result = gzip.GzipFile(fileobj=file_obj,
+                           mode=mode,
+                           compresslevel=COMPRESSION_LEVELS[".gz"])
+    tweak_close(result, file_obj)
+    return result
+
+
+def _handle_bz2(file_obj, mode: str):
+    """smart_open callback to read or write bzip2 streams"""
+    result = bz2.BZ2File(file_obj,
+                         mode,
+                         compresslevel=COMPRESSION_LEVELS[".bz2"])
+    tweak_close(result, file_obj)
+    return result
+
+
+def _handle_zst(file_obj, mode: str):
+    """smart_open callback to read or write zstandard streams"""
+    if "r" in mode:
+        # the buffered reader adds the line iteration missing in binary mode
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(file_obj))
+    compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVELS[".zst"])
+    return compressor.stream_writer(file_obj)
+
+
+def _handle_lz4(file_obj, mode: str):
+    """smart_open callback to read or write lz4 frames"""
+    result = lz4.frame.open(file_obj,
+                            mode,
+                            compression_level=COMPRESSION_LEVELS[".lz4"])
+    tweak_close(result, file_obj)
+    return result
+
+
+def compress(data: bytes, path: str, level: Optional[int] = None) -> bytes:
+    """compress the data with the format given by the path extension
+
+    :param data: the uncompressed data
+    :param path: the file path, unknown extensions return the data unchanged
+    :param level: the compression level, None to use `COMPRESSION_LEVELS` (default: None)
+    :return: the compressed data
+    """
+    extension = get_extension(path)
+    level = level if level is not None else COMPRESSION_LEVELS.get(extension)
+    if extension == ".gz":
+        return gzip.compress(data, compresslevel=level)
+    if extension == ".bz2":
+        return bz2.compress(data, compresslevel=level)
+    if extension == ".zst":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if extension == ".lz4":
+        return lz4.frame.compress(data, compression_level=level)
+    return data
+
+
+def decompress(data: bytes, path: str) -> bytes:
+    """decompress the data with the format given by the path extension
+
+    :param data: the compressed data
+    :param path: the file path, unknown extensions return the data unchanged
+    :return: the uncompressed data
+    """
+    extension = get_extension(path)
+    if extension == ".gz":
+        return gzip.decompress(data)
+    if extension == ".bz2":
+        return bz2.decompress(data)
+    if extension == ".zst":
+        # the streamed frames don't store the content size and files can have many frames
+        with zstandard.ZstdDecompressor().stream_reader(
+                data, read_across_frames=True) as reader:
+            return reader.read()
+    if extension == ".lz4":
+        return lz4.frame.decompress(data)
+    return data
+
+
+def is_compressed_path(path: str) -> bool:
+    """test if the path extension is a known compression format"""
+    return get_extension(path) in COMPRESSION_LEVELS
+
+
+def _register_compressors():
+    """register the handlers of every format in smart_open"""
+    # replacing the built-in .gz and .bz2 handlers is intended, don't warn about it
+    logger = logging.getLogger("smart_open.compression")
+    level = logger.level
+    logger.setLevel(logging.ERROR)
+    try:
+        smart_open.register_compressor(".gz", _handle_gzip)
+        smart_open.register_compressor(".bz2", _handle_bz2)
+    finally:
+        logger.setLevel(level)
+    smart_open.register_compressor(".zst", _handle_zst)
+    smart_open.register_compressor(".lz4", _handle_lz4)
+
+
+_register_compressors()
@@ -1,4 +1,16 @@
-"""dedup file with dedup function"""
+"""dedup file with dedup function and the streaming DedupFilter"""
+import json
+import os
+import sqlite3
+import tempfile
+from hashlib import blake2b
+from typing import Any, Iterator, Optional
+
+import jsons
+import numpy as np
+
+from computing_toolbox.utils.deep_get import deep_get
+from computing_toolbox.utils.jsonl_query import Field
 
 
 def dedup(data: list) -> list:
@@ -13,3 +25,177 @@ def dedup(data: list) -> list:
     #3. extract the unique values in the same order as the input data and return it
     unique_data = [x[0] for x in unique_tuple]
     return unique_data
+
+
+def key_digest(document: Any, paths: list[list]) -> int:
+    """a stable (across processes and runs) digest of the key values of a document
+
+    :param document: the document (dictionary or object)
+    :param paths: the deep_get paths of the key
+    :return: the signed 64 bits blake2b digest of the json encoded values
+    """
+    document = document if isinstance(document,
+                                      (dict, list)) else jsons.dump(document)
+    values = [deep_get(document, path, None) for path in paths]
+    content = json.dumps(values,
+                         sort_keys=True,
+                         separators=(",", ":"),
+                         default=str)
+    return int.from_bytes(blake2b(content.encode("utf8"),
+                                  digest_size=8).digest(),
+                          "little",
+                          signed=True)
+
+
+class DigestSet:
+    """compact set of signed 64 bits digests
+    the digests are kept in a sorted int64 numpy array (8 bytes per digest) and the last
+    added ones in a small python set, merged into the array when it reaches 1/BUFFER_RATIO
+    of its size (or MIN_BUFFER_SIZE digests).
+    """
+
+    # minimum number of digests buffered in the python set before merging them
+    MIN_BUFFER_SIZE: int = 1 << 16
+    # the buffered digests are merged when they reach this fraction of the sorted ones
+    BUFFER_RATIO: int = 16
+
+    def __init__(self):
+        self._sorted = np.empty(0, dtype=np.int64)
+        self._buffer = set()
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._buffer)
+
+    def __contains__(self, digest: int) -> bool:
+        if digest in self._buffer:
+            return True
+        k = int(self._sorted.searchsorted(digest))
+        return k < len(self._sorted) and int(self._sorted[k]) == digest
+
+    def __iter__(self) -> Iterator[int]:
+        yield from self._buffer
+        for start in range(0, len(self._sorted), self.MIN_BUFFER_SIZE):
+            yield from self._sorted[start:start +
+                                    self.MIN_BUFFER_SIZE].tolist()
+
+    def add(self, digest: int) -> bool:
+        """add a digest
+
+        :param digest: the signed 64 bits digest
+        :return: True if the digest was not in the set
+        """
+        if digest in self:
+            return False
+        self._buffer.add(digest)
+        if len(self._buffer) >= max(self.MIN_BUFFER_SIZE,
+                                    len(self._sorted) // self.BUFFER_RATIO):
+            self._merge()
+        return True
+
+    def _merge(self):
+        """merge the buffered digests into the sorted array"""
+        buffer = np.fromiter(self._buffer,
+                             dtype=np.int64,
+                             count=len(self._buffer))
+        buffer.sort()
+        # two sorted runs, the stable sort (timsort) merges them in linear time
+        merged = np.concatenate([self._sorted, buffer])
+        merged.sort(kind="stable")
+        self._sorted = merged
+        self._buffer.clear()
+
+    def clear(self):
+        """remove all the digests"""
+        self._sorted = np.empty(0, dtype=np.int64)
+        self._buffer.clear()
+
+
+class DedupFilter:
+    """streaming filter of duplicated documents by key
+    instead of the documents, only a 64 bits digest of their key values is kept in a
+    `DigestSet` (about 8 bytes per key), when `spill_dir` is defined and the set reaches
+    `max_memory_keys` digests, they are moved to a temporary sqlite file in that directory,
+    so the key set can be larger than the memory.
+
+    distinct keys with the same digest are taken as duplicates and the later documents are
+    dropped, the probability of any collision among n keys is about n^2 / 2^65
+    (~3e-6 for 1e7 keys, ~3% for 1e9 keys).
+
+    example:
+        with DedupFilter(["id"]) as dedup_filter:
+            unique = [x for x in documents if dedup_filter.is_new(x)]
+    """
+
+    # number of digests kept in memory before spilling them to disk
+    MAX_MEMORY_KEYS: int = 10_000_000
+
+    def __init__(self,
+                 key: Optional[list[Field]] = None,
+                 spill_dir: Optional[str] = None,
+                 max_memory_keys: Optional[int] = None):
+        """dedup filter
+
+        :param key: the keys or deep_get paths that identify a document, None to keep all (default: None)
+        :param spill_dir: if defined, spill the digests to a sqlite file in this directory (default: None)
+        :param max_memory_keys: the number of digests kept in memory, see MAX_MEMORY_KEYS (default: None)
+        """
+        self.paths = [[x] if isinstance(x, str) else list(x)
+                      for x in key] if key is not None else None
+        self.spill_dir = spill_dir
+        self.max_memory_keys = max_memory_keys if max_memory_keys is not None else self.MAX_MEMORY_KEYS
+        self.n_duplicates = 0
+        self._digests = DigestSet()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_path: Optional[str] = None
+
+    def digest(self, document: Any) -> int:
+        """the signed 64 bits digest of the key values of a document"""
+        return key_digest(document, self.paths)
+
+    def is_new(self, document: Any) -> bool:
+        """test if the key of a document was not seen before and remember it
+
+        :param document: the document (dictionary or object)
+        :return: True the first time a key is seen, False for its duplicates
+        """
+        if self.paths is None:
+            return True
+        digest = self.digest(document)
+        if self._db is not None:
+            is_new = self._db.execute(
+                "INSERT OR IGNORE INTO digests VALUES (?)",
+                (digest, )).rowcount == 1
+        else:
+            is_new = self._digests.add(digest)
+            if self.spill_dir is not None and len(
+                    self._digests) >= self.max_memory_keys:
+                self._spill()
+        self.n_duplicates += int(not is_new)
+        return is_new
+
+    def _spill(self):
+        """move the digests in memory to a temporary sqlite file"""
+        file_descriptor, self._db_path = tempfile.mkstemp(dir=self.spill_dir,
+                                                          suffix=".sqlite")
+        os.close(file_descriptor)
+        self._db = sqlite3.connect(self._db_path)
+        self._db.execute("PRAGMA journal_mode=OFF")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute("CREATE TABLE digests (digest INTEGER PRIMARY KEY)")
+        self._db.executemany("INSERT INTO digests VALUES (?)",
+                             ((x, ) for x in self._digests))
+        self._digests.clear()
+
+    def close(self):
+        """release the digests and remove the spill file"""
+        self._digests.clear()
+        if self._db is not None:
+            self._db.close()
+            os.remove(self._db_path)
+            self._db, self._db_path = None, None
+
+    def __enter__(self) -> "DedupFilter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
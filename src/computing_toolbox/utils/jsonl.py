@@ -1,102 +1,207 @@
 """json line library
 to handle read and write operations on local and cloud files
-in both format: plain or compressed (gzip)
+in both format: plain or compressed (.gz, .bz2, .zst, .lz4 by extension)
 """
 import os
+
 import logging
+from functools import partial
 from multiprocessing import cpu_count, Pool
-from itertools import count
-from typing import Optional, Type, TypeVar, Union
+from itertools import count, islice
+from typing import Any, Callable, Iterable, Iterator, Optional, Sized, Type, TypeVar, Union
 
-import json
-import jsons
 import smart_open
+from smart_open.compression import NO_COMPRESSION
 from tqdm import tqdm
 
-from computing_toolbox.gcp.gs_async import GsAsync
+from computing_toolbox.algorithms.split_range import split_range_ab
+from computing_toolbox.utils.dedup import DedupFilter
+from computing_toolbox.utils.jsonl_codec import dumps
+from computing_toolbox.utils.jsonl_columns import build_columns
+from computing_toolbox.utils.jsonl_files import JsonlFiles
+from computing_toolbox.utils.jsonl_gzip import read_gzip_members, write_gzip_members
+from computing_toolbox.utils.jsonl_process import process_file
+from computing_toolbox.utils.jsonl_sort import sort_file
+from computing_toolbox.utils.jsonl_query import Dropped, JsonlQuery
+from computing_toolbox.utils.jsonl_index import JsonlIndex, file_stat, is_compressed
+from computing_toolbox.utils.jsonl_workers import _count_newlines, _count_newlines_in_range, \
+    _count_newlines_mmap, _imap_bounded, _jsonl_dumps_chunk, _jsonl_parse_byte_range, _jsonl_parse_chunk, \
+    _jsonl_parse_one_line, _open_at_line
 
 T = TypeVar("T")
 
 
-def _jsonl_parse_one_line(args):
-    """parse one line at a time"""
-    line, mapping_class = args
-    document = jsons.loads(line, cls=mapping_class)
-    return document
-
-
-def _jsonl_dumps_one_object(args):
-    """dumps one object at a time"""
-    x = args
-    line = jsons.dumps(x)
-    return line
-
-
-def _split_str(args):
-    """split string"""
-    text = args
-    lines = text.split('\n') if text else []
-    return lines
-
-
-def _parse_documents(args):
-    """split string"""
-    lines = args
-    documents = [json.loads(line) for line in lines]
-    return documents
-
-
-class Jsonl:
+class Jsonl(JsonlFiles):
     """class that concentrates common json line operations"""
 
+    # strategies available in parallel_read
+    PARALLEL_READ_MODES: tuple = ("lines", "chunks", "byte_ranges",
+                                  "gzip_members")
+
     @classmethod
-    def count_lines(cls, path: str, tqdm_kwargs: Optional[dict] = None) -> int:
+    def count_lines(cls,
+                    path: str,
+                    tqdm_kwargs: Optional[dict] = None,
+                    buffer_size: int = 1 << 20,
+                    use_mmap: bool = False,
+                    workers: Optional[int] = None) -> int:
         """count the number of lines if the path provided
+        the file is read in binary mode by large buffers counting the new line characters,
+        a last line without new line character is counted as well.
+
+        for uncompressed files:
+        - if `workers` is defined, the file is split in byte ranges counted in parallel
+        - if `use_mmap` is True and the file is local, the file is mapped in memory
 
         :param path: the file path to be read
-        :param tqdm_kwargs: if provided (at least {}) define a tqdm progress bar (default: None)
+        :param tqdm_kwargs: if provided (at least {}) define a tqdm progress bar in bytes (default: None)
+        :param buffer_size: the number of bytes read at once (default: 1MB)
+        :param use_mmap: if True, map local uncompressed files in memory (default: False)
+        :param workers: if defined, count byte ranges of uncompressed files in parallel (default: None)
         :return: the number of lines in the file
         """
         # 1. compute tqdm_kwargs
+        compressed = is_compressed(path)
         tqdm_kwargs = {
             **{
-                "desc": f"count_lines('{path})'"
+                "desc": f"count_lines('{path})'",
+                "total": file_stat(path)["size"] if not compressed else None,
+                "unit": "B",
+                "unit_scale": True
             },
             **tqdm_kwargs
         } if tqdm_kwargs is not None else tqdm_kwargs
-        # 2. open the file
-        with smart_open.open(path) as fp:
-            # 2.1 define the file iterator
-            fp_iterator = tqdm(fp, **
-                               tqdm_kwargs) if tqdm_kwargs is not None else fp
-            # 2.2 count the number of lines
-            n_lines = len([1 for _ in fp_iterator])
+        pbar = tqdm(**tqdm_kwargs) if tqdm_kwargs is not None else None
+
+        # 2. count the new line characters and get the last byte
+        if workers is not None and not compressed:
+            n_newlines, last_byte = cls._count_newlines_in_ranges(
+                path, workers, buffer_size, pbar)
+        elif use_mmap and not compressed and "://" not in path:
+            n_newlines, last_byte = _count_newlines_mmap(
+                path, buffer_size, pbar)
+        else:
+            with smart_open.open(path, "rb") as fp:
+                n_newlines, last_byte = _count_newlines(fp, buffer_size, pbar)
+
+        # 3. a last line without a new line character is also a line
+        n_lines = n_newlines + int(last_byte not in (b"", b"\n"))
         return n_lines
 
     @classmethod
-    def read(cls,
-             path: str,
-             mapping_class: Optional[T] = None,
-             offset: int = 0,
-             limit: Optional[int] = None,
-             tqdm_kwargs: Optional[dict] = None) -> list[T | dict]:
-        """read a json line file
-        if provided offset and/or limit, this method jumps the first `offset` lines
-        and only return (at most) `limit` number of objects mapping to a given class `mapping_class`
-        if provided.
+    def _count_newlines_in_ranges(
+            cls,
+            path: str,
+            workers: int,
+            buffer_size: int,
+            pbar: Optional[tqdm] = None) -> tuple[int, bytes]:
+        """count the new line characters of an uncompressed file splitting it in byte ranges
+
+        :param path: the uncompressed file (local or gs://)
+        :param workers: the number of parallel jobs
+        :param buffer_size: the number of bytes read at once
+        :param pbar: if defined, the progress bar updated with the counted bytes
+        :return: the number of new line characters and the last byte of the file
+        """
+        size = file_stat(path)["size"]
+        if size == 0:
+            return 0, b""
+        ranges = split_range_ab(0, size, min(size, workers))
+        parameters = [(path, a, b, buffer_size) for a, b in ranges]
+
+        # 1. count every range in parallel
+        n_newlines = 0
+        with Pool(workers) as pool:
+            for (a,
+                 b), n in zip(ranges,
+                              pool.imap(_count_newlines_in_range, parameters)):
+                n_newlines += n
+                _ = pbar.update(b - a) if pbar is not None else None
+
+        # 2. read the last byte
+        with smart_open.open(path, "rb", compression=NO_COMPRESSION) as fp:
+            fp.seek(size - 1)
+            last_byte = fp.read(1)
+
+        return n_newlines, last_byte
+
+    @classmethod
+    def build_index(cls,
+                    path: str,
+                    every: int = 1000,
+                    tqdm_kwargs: Optional[dict] = None) -> JsonlIndex:
+        """build and save the sidecar line index (`path + ".idx"`) of an uncompressed file
+        the index stores the byte offset of every `every` lines, so reading with
+        `use_index=True` seeks near `offset` and skips at most `every - 1` lines.
+        the index is ignored (and rebuilt on the next indexed read) when the file
+        size or modification time change.
+
+        :param path: the uncompressed jsonl file (local or gs://)
+        :param every: store the byte offset every this number of lines (default: 1000)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar (default: None)
+        :return: the saved index
+        """
+        index = JsonlIndex.build(path, every=every,
+                                 tqdm_kwargs=tqdm_kwargs).save()
+        return index
+
+    @classmethod
+    def iter_read(cls,
+                  path: str,
+                  mapping_class: Optional[T] = None,
+                  offset: int = 0,
+                  limit: Optional[int] = None,
+                  batch_size: Optional[int] = None,
+                  tqdm_kwargs: Optional[dict] = None,
+                  use_index: bool = False,
+                  codec: str = "auto",
+                  fields: Optional[list] = None,
+                  where: Optional[Union[dict, Callable]] = None,
+                  dedup_key: Optional[list] = None,
+                  dedup_spill_dir: Optional[str] = None) -> Iterator[T | dict]:
+        """lazily read a json line file
+        same as `read` but the documents are parsed one at a time while the file is
+        being read, so only one line (or one batch) lives in memory at once.
+        if `batch_size` is provided, the generator yields lists of at most `batch_size` documents
+        instead of single documents.
+        `offset` and `limit` count the lines of the file, before the `where` filter.
 
         :param path: path to the file to be read
         :param mapping_class: class to apply to every read line (default: None)
         :param offset: skip the first `offset` lines (default: 0)
-        :param limit: if provided, return at most `limit` objects (default: None)
+        :param limit: if provided, yield at most `limit` objects (default: None)
+        :param batch_size: if provided, yield lists of this size instead of single objects (default: None)
         :param tqdm_kwargs: if provided (at least {}) define a tqdm progress bar with those parameters (default: None)
-        :return: the list of json objects
+        :param use_index: if True, seek to `offset` with the sidecar line index, see `build_index` (default: False)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param fields: if defined, return only these keys or deep_get paths, see `JsonlQuery` (default: None)
+        :param where: if defined, keep only the documents matching this {"path": value} spec or callable
+                      (it must be picklable to run in the workers), see `JsonlQuery` (default: None)
+        :param dedup_key: if defined, keep only the first document of every value of these keys or
+                          deep_get paths (before `fields`), see `dedup.DedupFilter` (default: None)
+        :param dedup_spill_dir: if defined with `dedup_key`, spill the seen keys to disk in this directory
+                                when they are too many for the memory (default: None)
+        :return: the generator of json objects (or list of json objects if `batch_size` is provided)
         """
+        if batch_size is not None:
+            yield from cls.iter_batches(path,
+                                        batch_size=batch_size,
+                                        mapping_class=mapping_class,
+                                        offset=offset,
+                                        limit=limit,
+                                        tqdm_kwargs=tqdm_kwargs,
+                                        use_index=use_index,
+                                        codec=codec,
+                                        fields=fields,
+                                        where=where,
+                                        dedup_key=dedup_key,
+                                        dedup_spill_dir=dedup_spill_dir)
+            return
+
         # 1. define tqdm_kwargs for skip and read loops
         tqdm_skip_kwargs = {
             **{
-                "desc": f"jsonl_skip('{path}')",
-                "total": offset
+                "desc": f"jsonl_skip('{path}')"
             },
             **tqdm_kwargs
         } if tqdm_kwargs is not None else tqdm_kwargs
@@ -108,16 +213,17 @@ class Jsonl:
             **tqdm_kwargs
         } if tqdm_kwargs is not None else tqdm_kwargs
 
-        # 2. open the file
-        with smart_open.open(path) as fp:
-            # 2.1 skipping the first offset lines
-            if offset:
-                # define the iterator and skip those lines
-                skip_iterator = tqdm(
-                    range(offset), **tqdm_skip_kwargs
-                ) if tqdm_skip_kwargs is not None else range(offset)
-                _ = [_ for _, _ in zip(skip_iterator, fp)]
-
+        query = JsonlQuery(fields, mapping_class, codec, where=where)
+        # with dedup, the key is taken from the raw document before its projection
+        raw_query = JsonlQuery(codec=codec,
+                               where=where) if dedup_key is not None else query
+
+        # 2. open the file skipping the first offset lines
+        with _open_at_line(path,
+                           offset=offset,
+                           use_index=use_index,
+                           tqdm_kwargs=tqdm_skip_kwargs) as fp, DedupFilter(
+                               dedup_key, dedup_spill_dir) as dedup_filter:
             # 2.2 define the read iterator
             limit_iterator = count() if limit is None else range(limit)
             tqdm_limit_iterator = tqdm(
@@ -125,22 +231,137 @@ class Jsonl:
             ) if tqdm_read_kwargs is not None else limit_iterator
 
             # 2.3 read the limit number of lines at most
-            # 2.4 read the data and transforms to object
-            data = [
-                jsons.loads(line_k, mapping_class)
-                for _, line_k in zip(tqdm_limit_iterator, fp)
-            ]
+            # 2.4 read the data and transforms to object one by one
+            for _, line_k in zip(tqdm_limit_iterator, fp):
+                document = raw_query.decode(line_k)
+                if document is not Dropped and dedup_filter.is_new(document):
+                    yield document if raw_query is query else query.project(
+                        document)
+
+    @classmethod
+    def iter_batches(cls,
+                     path: str,
+                     batch_size: int = 1000,
+                     mapping_class: Optional[T] = None,
+                     offset: int = 0,
+                     limit: Optional[int] = None,
+                     tqdm_kwargs: Optional[dict] = None,
+                     use_index: bool = False,
+                     codec: str = "auto",
+                     fields: Optional[list] = None,
+                     where: Optional[Union[dict, Callable]] = None,
+                     dedup_key: Optional[list] = None,
+                     dedup_spill_dir: Optional[str] = None) -> Iterator[list]:
+        """lazily read a json line file in batches
+        yield lists of at most `batch_size` parsed documents, the last batch could be smaller.
+
+        :param path: path to the file to be read
+        :param batch_size: the maximum number of documents per batch (default: 1000)
+        :param mapping_class: class to apply to every read line (default: None)
+        :param offset: skip the first `offset` lines (default: 0)
+        :param limit: if provided, read at most `limit` objects (default: None)
+        :param tqdm_kwargs: if provided (at least {}) define a tqdm progress bar with those parameters (default: None)
+        :param use_index: if True, seek to `offset` with the sidecar line index, see `build_index` (default: False)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param fields: if defined, return only these keys or deep_get paths, see `JsonlQuery` (default: None)
+        :param where: if defined, keep only the documents matching this {"path": value} spec or callable
+                      (it must be picklable to run in the workers), see `JsonlQuery` (default: None)
+        :param dedup_key: if defined, keep only the first document of every value of these keys or
+                          deep_get paths (before `fields`), see `dedup.DedupFilter` (default: None)
+        :param dedup_spill_dir: if defined with `dedup_key`, spill the seen keys to disk in this directory
+                                when they are too many for the memory (default: None)
+        :return: the generator of lists of json objects
+        """
+        if batch_size < 1:
+            raise ValueError(
+                f"Jsonl.iter_batches expects batch_size>=1. Value provided batch_size={batch_size}"
+            )
+
+        # 1. define the documents iterator
+        documents = cls.iter_read(path,
+                                  mapping_class=mapping_class,
+                                  offset=offset,
+                                  limit=limit,
+                                  tqdm_kwargs=tqdm_kwargs,
+                                  use_index=use_index,
+                                  codec=codec,
+                                  fields=fields,
+                                  where=where,
+                                  dedup_key=dedup_key,
+                                  dedup_spill_dir=dedup_spill_dir)
+        # 2. yield slices of the iterator until it is exhausted
+        batch = list(islice(documents, batch_size))
+        while batch:
+            yield batch
+            batch = list(islice(documents, batch_size))
+
+    @classmethod
+    def read(cls,
+             path: str,
+             mapping_class: Optional[T] = None,
+             offset: int = 0,
+             limit: Optional[int] = None,
+             tqdm_kwargs: Optional[dict] = None,
+             use_index: bool = False,
+             codec: str = "auto",
+             fields: Optional[list] = None,
+             where: Optional[Union[dict, Callable]] = None,
+             dedup_key: Optional[list] = None,
+             dedup_spill_dir: Optional[str] = None) -> list[T | dict]:
+        """read a json line file
+        if provided offset and/or limit, this method jumps the first `offset` lines
+        and only return (at most) `limit` number of objects mapping to a given class `mapping_class`
+        if provided.
+
+        if you don't need the whole list in memory, use `iter_read` instead.
+        for many random reads of a local file, use `jsonl_reader.JsonlReader` instead.
 
+        :param path: path to the file to be read
+        :param mapping_class: class to apply to every read line (default: None)
+        :param offset: skip the first `offset` lines (default: 0)
+        :param limit: if provided, return at most `limit` objects (default: None)
+        :param tqdm_kwargs: if provided (at least {}) define a tqdm progress bar with those parameters (default: None)
+        :param use_index: if True, seek to `offset` with the sidecar line index, see `build_index` (default: False)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param fields: if defined, return only these keys or deep_get paths, see `JsonlQuery` (default: None)
+        :param where: if defined, keep only the documents matching this {"path": value} spec or callable
+                      (it must be picklable to run in the workers), see `JsonlQuery` (default: None)
+        :param dedup_key: if defined, keep only the first document of every value of these keys or
+                          deep_get paths (before `fields`), see `dedup.DedupFilter` (default: None)
+        :param dedup_spill_dir: if defined with `dedup_key`, spill the seen keys to disk in this directory
+                                when they are too many for the memory (default: None)
+        :return: the list of json objects
+        """
+        data = list(
+            cls.iter_read(path,
+                          mapping_class=mapping_class,
+                          offset=offset,
+                          limit=limit,
+                          tqdm_kwargs=tqdm_kwargs,
+                          use_index=use_index,
+                          codec=codec,
+                          fields=fields,
+                          where=where,
+                          dedup_key=dedup_key,
+                          dedup_spill_dir=dedup_spill_dir))
         return data
 
     @classmethod
     def write(cls,
               path: str,
-              data: list,
+              data: Iterable,
               append_mode: bool = False,
-              tqdm_kwargs: Optional[dict] = None) -> int:
+              tqdm_kwargs: Optional[dict] = None,
+              codec: str = "auto",
+              buffer_size: int = 1 << 20,
+              dedup_key: Optional[list] = None,
+              dedup_spill_dir: Optional[str] = None) -> int:
         """write a json line file
         converting every dict in data to a string and send it to the file.
+        `data` could be any iterable (a list, a generator, ...), the lines are
+        accumulated in memory and sent to the file in blocks of at least `buffer_size`
+        characters, so the memory is bounded by the buffer and not by the data.
+
 
         if append_mode is True and the path exists, the data will be appended to the end
         otherwise the file will be replaced with the content in data.
@@ -151,13 +372,20 @@ class Jsonl:
         if provide tqdm_kwargs, a progress bar will be displayed.
 
         :param path: the file to be writen
-        :param data: the list of dicts to be saved to the file
+        :param data: the iterable of dicts to be saved to the file, a single dict is written as one line
         :param append_mode: flag to set append mode (default: False)
         :param tqdm_kwargs:
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param buffer_size: the number of characters to accumulate before writing (default: 1M)
+        :param dedup_key: if defined, write only the first object of every value of these keys or
+                          deep_get paths, see `dedup.DedupFilter` (default: None)
+        :param dedup_spill_dir: if defined with `dedup_key`, spill the seen keys to disk in this directory
+                                when they are too many for the memory (default: None)
         :return: the number of objects written
         """
-        # 1. compute the number of objects
-        n_data = len(data)
+        # 1. compute the number of objects if known, a dict or a str is a single object
+        data = [data] if isinstance(data, (dict, str)) else data
+        n_data = len(data) if isinstance(data, Sized) else None
         # 2. define the tqdm arguments if needed
         tqdm_write_kwargs = {
             **{
@@ -169,61 +397,133 @@ class Jsonl:
 
         # *** create directory if necessary ***
         create_dir_fn = lambda x: os.makedirs(
-            os.path.dirname(x), exist_ok=True) if os.path.abspath(
-                path).startswith('/') else ""
+            os.path.dirname(x), exist_ok=True
+        ) if "://" not in x and os.path.abspath(x).startswith('/') else ""
         create_dir_fn(path)
 
         # 3. open the file if writing or append mode
-        with smart_open.open(path, mode="w" if not append_mode else "a") as fp:
-            # 3.1 define the iterator (tqdm(data) or data)
+        with smart_open.open(
+                path, mode="w" if not append_mode else "a") as fp, DedupFilter(
+                    dedup_key, dedup_spill_dir) as dedup_filter:
+            # 3.1 define the iterator (tqdm(data) or data) without the duplicates
             data_iterator = tqdm(
                 data, **
                 tqdm_write_kwargs) if tqdm_write_kwargs is not None else data
+            data_iterator = (x for x in data_iterator if dedup_filter.is_new(x)
+                             ) if dedup_key is not None else data_iterator
             # 3.2  in writing mode new line prefix should be "", in append mode new line should be "\n"
             nl_prefix = "\n" if append_mode else ""
-            # 3.3 iterate over all objects
+            # 3.3 iterate over all objects filling the buffer
+            n_data, buffer, buffer_length = 0, [], 0
             for obj in data_iterator:
                 # parse object as a string
-                line = nl_prefix + jsons.dumps(obj)
-                # write a new line
-                fp.write(line)
+                line = nl_prefix + dumps(obj, codec)
+                buffer.append(line)
+                buffer_length += len(line)
+                n_data += 1
                 # new line should be "\n"
                 nl_prefix = "\n"
+                # 3.4 write the buffer when it is full
+                if buffer_length >= buffer_size:
+                    fp.write("".join(buffer))
+                    buffer.clear()
+                    buffer_length = 0
+            # 3.5 write the remaining lines
+            fp.write("".join(buffer))
 
         # return the number of objects
         return n_data
 
     @classmethod
     def parallel_read(
-            cls,
-            path: str,
-            mapping_class: Optional[Type[T]] = None,
-            offset: int = 0,
-            limit: Optional[int] = None,
-            workers: Optional[int] = None,
-            tqdm_kwargs: Optional[dict] = None) -> Union[list[T], list[dict]]:
+        cls,
+        path: str,
+        mapping_class: Optional[Type[T]] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        workers: Optional[int] = None,
+        tqdm_kwargs: Optional[dict] = None,
+        mode: str = "lines",
+        chunk_size: int = 10000,
+        use_index: bool = False,
+        codec: str = "auto",
+        fields: Optional[list] = None,
+        where: Optional[Union[dict, Callable]] = None
+    ) -> Union[list[T], list[dict]]:
         """
         read a jsonl in parallel
         to optimize this process we divide it in two main steps:
         1. read the file line by line as a text (to not overload read process)
         2. parse content in parallel (parsing is the most expensive task)
         if workers is not defined will use the number of cpus in your computer
+
+        the `mode` parameter defines how the work is split among the workers:
+        - "lines": read all the lines and send one line per task (default)
+        - "chunks": stream chunks of `chunk_size` lines to the workers, see `parallel_iter_read`
+        - "byte_ranges": every worker seeks and parses its own byte range of the file,
+          only for uncompressed files and without offset/limit
+        - "gzip_members": every worker decompresses and parses one gzip member of the file,
+          see `parallel_write(gzip_members=True)`, without offset/limit
+
         :param path: the file to be read
         :param mapping_class: the output class (if defined)
         :param offset: read the file starting at this line (if defined)
         :param limit: read up to this number of lines
         :param workers: the number of parallel jobs
         :param tqdm_kwargs: if defined, this dictionary will be passed to tqdm when read the file
+        :param mode: the parallel strategy, one of PARALLEL_READ_MODES (default: "lines")
+        :param chunk_size: number of lines per task in "chunks" mode (default: 10000)
+        :param use_index: if True, seek to `offset` with the sidecar line index, see `build_index` (default: False)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param fields: if defined, return only these keys or deep_get paths, see `JsonlQuery` (default: None)
+        :param where: if defined, keep only the documents matching this {"path": value} spec or callable
+                      (it must be picklable to run in the workers), see `JsonlQuery` (default: None)
         :return: the list of documents parsed as dictionary or the mapping class
         """
+        if mode not in cls.PARALLEL_READ_MODES:
+            raise ValueError(
+                f"Jsonl.parallel_read expects mode in {cls.PARALLEL_READ_MODES}. Value provided mode='{mode}'"
+            )
+        if mode == "chunks":
+            return list(
+                cls.parallel_iter_read(path,
+                                       mapping_class=mapping_class,
+                                       offset=offset,
+                                       limit=limit,
+                                       workers=workers,
+                                       chunk_size=chunk_size,
+                                       tqdm_kwargs=tqdm_kwargs,
+                                       use_index=use_index,
+                                       codec=codec,
+                                       fields=fields,
+                                       where=where))
+        if mode in ("byte_ranges", "gzip_members") and (offset
+                                                        or limit is not None):
+            raise ValueError(
+                f"Jsonl.parallel_read mode='{mode}' doesn't support offset or limit"
+            )
+        if mode == "gzip_members":
+            return read_gzip_members(
+                path,
+                query=JsonlQuery(fields, mapping_class, codec, where=where),
+                workers=workers if workers is not None else cpu_count(),
+                tqdm_kwargs=tqdm_kwargs)
+        if mode == "byte_ranges":
+            return cls._parallel_read_byte_ranges(path,
+                                                  mapping_class=mapping_class,
+                                                  workers=workers,
+                                                  tqdm_kwargs=tqdm_kwargs,
+                                                  codec=codec,
+                                                  fields=fields,
+                                                  where=where)
 
         # define the number of workers to be used
         workers = workers if workers is not None else cpu_count()
+        query = JsonlQuery(fields, mapping_class, codec, where=where)
 
         # 1. read the file in plain text
-        with smart_open.open(path) as fp:
-            # a. skip first `offset` lines
-            _ = [_ for _, _ in zip(range(offset), fp)]
+        # a. skip first `offset` lines
+        with _open_at_line(path, offset=offset, use_index=use_index) as fp:
             # b. read up to `limit` lines
             limit_it = count() if limit is None else range(limit)
             zip_it = zip(limit_it, fp)
@@ -246,6 +546,7 @@ class Jsonl:
         # 2. parse each line in parallel
         # a. create the list of parameters
         parameters = [(line, mapping_class) for line in lines]
+        parse_fn = partial(_jsonl_parse_one_line, codec=codec, query=query)
         with Pool(workers) as pool:
             # b. create a default tqdm kwargs
             tqdm_kwargs = {
@@ -259,101 +560,356 @@ class Jsonl:
             #    or use the traditional map function without tqdm
             if tqdm_kwargs is not None:
                 list_of_documents = list(
-                    tqdm(pool.imap(_jsonl_parse_one_line, parameters),
-                         **tqdm_kwargs))
+                    tqdm(pool.imap(parse_fn, parameters), **tqdm_kwargs))
             else:
-                list_of_documents = pool.map(_jsonl_parse_one_line, parameters)
+                list_of_documents = pool.map(parse_fn, parameters)
 
-        # 3. return the list of documents
-        return list_of_documents
+        # 3. return the list of documents without the dropped ones
+        return [x for x in list_of_documents if x is not Dropped]
 
     @classmethod
-    def async_read(cls,
-                   paths: list[str],
-                   workers: Optional[int] = None,
-                   tqdm_kwargs: Optional[dict] = None) -> list[dict]:
-        """read a list of paths asynchronously"""
-        # define the number of workers to be used
+    def _parallel_read_byte_ranges(
+        cls,
+        path: str,
+        mapping_class: Optional[Type[T]] = None,
+        workers: Optional[int] = None,
+        tqdm_kwargs: Optional[dict] = None,
+        codec: str = "auto",
+        fields: Optional[list] = None,
+        where: Optional[Union[dict, Callable]] = None
+    ) -> Union[list[T], list[dict]]:
+        """read an uncompressed jsonl in parallel splitting the file in byte ranges
+        no line is read by the parent process, every worker opens the file, seeks to the
+        beginning of its range, aligns to the next new line and parses its shard.
+
+        :param path: the file to be read (local or gs://)
+        :param mapping_class: the output class (if defined)
+        :param workers: the number of parallel jobs, if None use the number of cpus (default: None)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar with the parsed shards
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param fields: if defined, return only these keys or deep_get paths, see `JsonlQuery` (default: None)
+        :param where: if defined, keep only the documents matching this {"path": value} spec or callable
+                      (it must be picklable to run in the workers), see `JsonlQuery` (default: None)
+        :return: the list of documents parsed as dictionary or the mapping class
+        """
+        if is_compressed(path):
+            raise ValueError(
+                f"Jsonl.parallel_read mode='byte_ranges' can't seek in the compressed file '{path}'"
+            )
         workers = workers if workers is not None else cpu_count()
+        query = JsonlQuery(fields, mapping_class, codec, where=where)
 
-        # A.1. read all documents at once
-        raw_contents = GsAsync.read(paths=paths, tqdm_kwargs=tqdm_kwargs)
+        # 1. split the file in (a few more) ranges than workers to balance the load
+        size = file_stat(path)["size"]
+        if size == 0:
+            return []
+        ranges = split_range_ab(0, size, min(size, 4 * workers))
+        parameters = [(path, a, b, mapping_class) for a, b in ranges]
 
-        # A.2. define tqdm for split raw contents
-        tqdm_kwargs_tmp = {
+        # 2. parse every range in parallel and concatenate the documents in order
+        tqdm_kwargs = {
             **{
-                "total": len(raw_contents),
-                "desc": f"split contents at {workers}x"
+                "total": len(parameters),
+                "desc": f"parsing byte ranges at {workers}x"
             },
             **tqdm_kwargs
         } if tqdm_kwargs is not None else None
-
         with Pool(workers) as pool:
-            if tqdm_kwargs_tmp is not None:
-                list_of_lines = list(
-                    tqdm(pool.imap(_split_str, raw_contents),
-                         **tqdm_kwargs_tmp))
-            else:
-                list_of_lines = pool.map(_split_str, raw_contents)
+            list_of_documents = pool.imap(
+                partial(_jsonl_parse_byte_range, codec=codec, query=query),
+                parameters)
+            list_of_documents = tqdm(
+                list_of_documents, **
+                tqdm_kwargs) if tqdm_kwargs is not None else list_of_documents
+            documents = [x for xs in list_of_documents for x in xs]
+
+        return documents
+
+    @classmethod
+    def parallel_iter_read(
+            cls,
+            path: str,
+            mapping_class: Optional[Type[T]] = None,
+            offset: int = 0,
+            limit: Optional[int] = None,
+            workers: Optional[int] = None,
+            chunk_size: int = 10000,
+            tqdm_kwargs: Optional[dict] = None,
+            use_index: bool = False,
+            codec: str = "auto",
+            fields: Optional[list] = None,
+            where: Optional[Union[dict,
+                                  Callable]] = None) -> Iterator[T | dict]:
+        """read a jsonl in parallel as a pipeline
+        the file is read in chunks of `chunk_size` lines, every chunk is sent to the workers
+        as one single string and the workers parse the whole chunk at once.
+        the documents are yielded in the same order as the file and only a few chunks
+        per worker are in flight at any time, so the memory is bounded by the chunk size
+        and not by the file size.
 
-        # A.3 define tqm for parse the contents
-        tqdm_kwargs_tmp = {
+        :param path: the file to be read
+        :param mapping_class: the output class (if defined)
+        :param offset: read the file starting at this line (default: 0)
+        :param limit: read up to this number of lines (default: None)
+        :param workers: the number of parallel jobs, if None use the number of cpus (default: None)
+        :param chunk_size: the number of lines sent to a worker per task (default: 10000)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar with the parsed documents
+        :param use_index: if True, seek to `offset` with the sidecar line index, see `build_index` (default: False)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param fields: if defined, return only these keys or deep_get paths, see `JsonlQuery` (default: None)
+        :param where: if defined, keep only the documents matching this {"path": value} spec or callable
+                      (it must be picklable to run in the workers), see `JsonlQuery` (default: None)
+        :return: the generator of documents parsed as dictionary or the mapping class
+        """
+        if chunk_size < 1:
+            raise ValueError(
+                f"Jsonl.parallel_iter_read expects chunk_size>=1. Value provided chunk_size={chunk_size}"
+            )
+        # define the number of workers to be used
+        workers = workers if workers is not None else cpu_count()
+        query = JsonlQuery(fields, mapping_class, codec, where=where)
+        tqdm_kwargs = {
             **{
-                "total": len(list_of_lines),
-                "desc": f"parsing documents at {workers}x"
+                "total": limit,
+                "desc": f"parsing chunks at {workers}x"
             },
             **tqdm_kwargs
         } if tqdm_kwargs is not None else None
+        pbar = tqdm(**tqdm_kwargs) if tqdm_kwargs is not None else None
 
-        with Pool(workers) as pool:
-            if tqdm_kwargs_tmp is not None:
-                list_of_documents = list(
-                    tqdm(pool.imap(_parse_documents, list_of_lines),
-                         **tqdm_kwargs_tmp))
-            else:
-                list_of_documents = pool.map(_parse_documents, list_of_lines)
+        with _open_at_line(path, offset=offset,
+                           use_index=use_index) as fp, Pool(workers) as pool:
+            # 1. skip first `offset` lines and define the limited line iterator
+            limit_it = count() if limit is None else range(limit)
+            lines_it = (line for _, line in zip(limit_it, fp))
+
+            # 2. build the chunk iterator, one string per chunk
+            chunks_it = iter(lambda: "".join(islice(lines_it, chunk_size)), "")
+            parameters = ((chunk, mapping_class) for chunk in chunks_it)
+
+            # 3. parse the chunks in parallel keeping the order
+            parse_fn = partial(_jsonl_parse_chunk, codec=codec, query=query)
+            for documents in _imap_bounded(pool, parse_fn, parameters,
+                                           2 * workers):
+                _ = pbar.update(len(documents)) if pbar is not None else None
+                yield from documents
+
+    @classmethod
+    def read_columns(cls,
+                     path: str,
+                     columns: list,
+                     dtypes: Optional[dict] = None,
+                     where: Optional[Union[dict, Callable]] = None,
+                     workers: Optional[int] = None,
+                     chunk_size: int = 10000,
+                     tqdm_kwargs: Optional[dict] = None,
+                     codec: str = "auto") -> dict:
+        """read some fields of a json line file as typed columns
+        the file is streamed (in parallel if `workers` is defined) projecting only the
+        requested columns and the values are appended to typed buffers, see `jsonl_columns`.
 
-        return list_of_documents
+        :param path: the file to be read
+        :param columns: the keys or deep_get paths to read, see `JsonlQuery`
+        :param dtypes: the dtype of some columns by column name, the others are inferred,
+                       a value that doesn't fit in its provided dtype raises ValueError (default: None)
+        :param where: if defined, keep only the documents matching this spec or callable (default: None)
+        :param workers: if defined, parse the file with `parallel_iter_read` using this number of jobs (default: None)
+        :param chunk_size: the number of lines sent to a worker per task (default: 10000)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar with the read documents (default: None)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :return: a dictionary column name -> numpy masked array or StringColumn
+        """
+        if workers is not None:
+            rows = cls.parallel_iter_read(path,
+                                          workers=workers,
+                                          chunk_size=chunk_size,
+                                          tqdm_kwargs=tqdm_kwargs,
+                                          codec=codec,
+                                          fields=columns,
+                                          where=where)
+        else:
+            rows = cls.iter_read(path,
+                                 tqdm_kwargs=tqdm_kwargs,
+                                 codec=codec,
+                                 fields=columns,
+                                 where=where)
+        keys = JsonlQuery(fields=columns).keys
+        return build_columns(rows, keys, dtypes)
+
+    @classmethod
+    def sort(cls,
+             path: str,
+             out_path: str,
+             key: list,
+             workers: Optional[int] = None,
+             memory_limit: int = 1 << 30,
+             reverse: bool = False,
+             tmp_dir: Optional[str] = None,
+             tqdm_kwargs: Optional[dict] = None,
+             codec: str = "auto",
+             max_open_runs: int = 128) -> int:
+        """sort a json line file by key with an external memory merge sort
+        the file is split in runs sorted in parallel and spilled to temporary compressed
+        files, then the runs are merged while the output is written, see `jsonl_sort`.
+        the sort is stable and the missing key values go last (first if `reverse`).
+
+        :param path: the file to be sorted
+        :param out_path: the sorted file (it can't be the input file)
+        :param key: the keys or deep_get paths to sort by, their values must be comparable
+        :param workers: the number of parallel jobs, if None use the number of cpus (default: None)
+        :param memory_limit: the number of bytes of lines held by all the runs in memory,
+                             the decoded documents take a few times more (default: 1GB)
+        :param reverse: if True, sort in descending order (default: False)
+        :param tmp_dir: the directory of the temporary runs, None for the system one (default: None)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar with the merged documents
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param max_open_runs: the maximum number of run files open at once, more runs are
+                              merged in many passes (default: 128)
+        :return: the number of sorted documents
+        """
+        if os.path.abspath(path) == os.path.abspath(out_path):
+            raise ValueError(
+                f"Jsonl.sort expects an out_path different to the input path. Value provided out_path='{out_path}'"
+            )
+        workers = workers if workers is not None else cpu_count()
+        return sort_file(path,
+                         out_path,
+                         JsonlQuery(fields=key).paths,
+                         workers=workers,
+                         run_size=max(1, memory_limit // (workers + 1)),
+                         reverse=reverse,
+                         tmp_dir=tmp_dir,
+                         codec=codec,
+                         tqdm_kwargs=tqdm_kwargs,
+                         max_open_runs=max_open_runs)
+
+    @classmethod
+    def process(cls,
+                path: str,
+                process_fn: Callable[[int, list], Any],
+                checkpoint_path: Optional[str] = None,
+                mapping_class: Optional[Type[T]] = None,
+                workers: Optional[int] = None,
+                chunk_size: int = 10000,
+                tqdm_kwargs: Optional[dict] = None,
+                codec: str = "auto",
+                fields: Optional[list] = None,
+                where: Optional[Union[dict, Callable]] = None) -> int:
+        """process a json line file in numbered chunks that can be resumed after a failure
+        every chunk of `chunk_size` lines is decoded and passed to `process_fn(chunk_id, documents)`
+        in the workers, the completed chunks are committed in order to a checkpoint file
+        and running the same call again resumes after the last committed chunk,
+        see `jsonl_process`.
+
+        :param path: the file to be processed
+        :param process_fn: the picklable processing function of the chunk id and its list of documents,
+                   it should be idempotent by chunk because the chunks in flight are processed again
+        :param checkpoint_path: the checkpoint file, if None use `path + ".ckpt"` (default: None)
+        :param mapping_class: the documents class (if defined)
+        :param workers: the number of parallel jobs, if None use the number of cpus (default: None)
+        :param chunk_size: the number of lines per chunk, it can't change between runs (default: 10000)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar with the processed documents
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param fields: if defined, pass only these keys or deep_get paths, see `JsonlQuery` (default: None)
+        :param where: if defined, pass only the documents matching this spec or callable (default: None)
+        :return: the number of processed documents, including the ones of previous runs
+        """
+        if chunk_size < 1:
+            raise ValueError(
+                f"Jsonl.process expects chunk_size>=1. Value provided chunk_size={chunk_size}"
+            )
+        workers = workers if workers is not None else cpu_count()
+        query = JsonlQuery(fields, mapping_class, codec, where=where)
+        return process_file(path,
+                            process_fn,
+                            query,
+                            checkpoint_path=checkpoint_path,
+                            chunk_size=chunk_size,
+                            workers=workers,
+                            tqdm_kwargs=tqdm_kwargs)
 
     @classmethod
     def parallel_write(cls,
                        path: str,
-                       data: list,
+                       data: Iterable,
                        workers: Optional[int] = None,
-                       tqdm_kwargs: Optional[dict] = None) -> int:
-        """write in parallel"""
+                       tqdm_kwargs: Optional[dict] = None,
+                       codec: str = "auto",
+                       chunk_size: int = 10000,
+                       gzip_members: bool = False,
+                       level: Optional[int] = None) -> int:
+        """write in parallel as a pipeline
+        the data is split in chunks of `chunk_size` objects, the workers serialize
+        every chunk to a string and the parent writes the chunks to the file in order
+        as soon as they arrive. only a few chunks per worker are in flight at any time,
+        so the memory is bounded by the chunk size and not by the data.
+        with `gzip_members=True` (only for .gz paths) the workers also compress every chunk
+        as an independent gzip member and a member index is saved next to the file,
+        so it can be read in parallel with `parallel_read(mode="gzip_members")`.
+
+        :param path: the file to be written
+        :param data: any iterable of objects, a dict (or any other object) is written as a single line
+        :param workers: the number of parallel jobs, if None use the number of cpus (default: None)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar with the written objects
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param chunk_size: the number of objects serialized by a worker per task (default: 10000)
+        :param gzip_members: if True, compress the chunks in parallel as gzip members (default: False)
+        :param level: the compression level of the gzip members from 0 to 9,
+                      None for `COMPRESSION_LEVELS[".gz"]` (default: None)
+        :return: the number of objects written
+        """
+        if chunk_size < 1:
+            raise ValueError(
+                f"Jsonl.parallel_write expects chunk_size>=1. Value provided chunk_size={chunk_size}"
+            )
+        if gzip_members and not path.endswith(".gz"):
+            raise ValueError(
+                f"Jsonl.parallel_write expects a .gz path with gzip_members=True. Value provided path='{path}'"
+            )
         workers = workers if workers is not None else cpu_count()
-        data = data if isinstance(data, list) else [data]
-        n = len(data)
+        # a dict or a str is a single object, any other iterable is a sequence of objects
+        data = data if isinstance(
+            data, Iterable) and not isinstance(data, (dict, str)) else [data]
 
-        with Pool(workers) as pool:
-            # b. create a default tqdm kwargs
-            tqdm_kwargs = {
-                **{
-                    "total": n,
-                    "desc": f"dumps at {workers}x"
-                },
-                **tqdm_kwargs
-            } if tqdm_kwargs is not None else None
-            # c. if pass tqdm kwargs use the imap function in conjunction with tqdm
-            #    or use the traditional map function without tqdm
-            if tqdm_kwargs is not None:
-                lines = list(
-                    tqdm(pool.imap(_jsonl_dumps_one_object, data),
-                         **tqdm_kwargs))
-            else:
-                lines = pool.map(_jsonl_dumps_one_object, data)
+        # a. create a default tqdm kwargs
+        tqdm_kwargs = {
+            **{
+                "total": len(data) if isinstance(data, Sized) else None,
+                "desc": f"dumps at {workers}x"
+            },
+            **tqdm_kwargs
+        } if tqdm_kwargs is not None else None
+        pbar = tqdm(**tqdm_kwargs) if tqdm_kwargs is not None else None
 
-            # *** create directory if necessary ***
-            create_dir_fn = lambda x: os.makedirs(
-                os.path.dirname(x), exist_ok=True) if os.path.abspath(
-                    path).startswith('/') else ""
-            create_dir_fn(path)
+        # *** create directory if necessary ***
+        create_dir_fn = lambda x: os.makedirs(
+            os.path.dirname(x), exist_ok=True
+        ) if "://" not in x and os.path.abspath(x).startswith('/') else ""
+        create_dir_fn(path)
 
-            msg = f"writting content to '{path}'"
-            logging.info(msg)
-            content = "\n".join(lines)
-            with smart_open.open(path, "w") as fp:
-                fp.write(content)
+        msg = f"writting content to '{path}'"
+        logging.info(msg)
+
+        # b. split the data in chunks of objects
+        data_it = iter(data)
+        chunks_it = iter(lambda: list(islice(data_it, chunk_size)), [])
+        if gzip_members:
+            return write_gzip_members(path,
+                                      chunks_it,
+                                      workers,
+                                      pbar=pbar,
+                                      codec=codec,
+                                      level=level)
+        dumps_fn = partial(_jsonl_dumps_chunk, codec=codec)
+
+        # c. serialize the chunks in parallel and write them in order
+        n, nl_prefix = 0, ""
+        with Pool(workers) as pool, smart_open.open(path, "w") as fp:
+            for n_chunk, content in _imap_bounded(pool, dumps_fn, chunks_it,
+                                                  2 * workers):
+                fp.write(nl_prefix + content)
+                nl_prefix = "\n"
+                n += n_chunk
+                _ = pbar.update(n_chunk) if pbar is not None else None
 
-            return len(content)
+        return n
@@ -0,0 +1,140 @@
+"""json codecs used to encode and decode json lines
+the codec is selected by name:
+- "auto": decode with the fastest installed backend (orjson > ujson > json),
+          encode with json to keep the same output as previous versions
+- "orjson": orjson backend (compact output), if installed
+- "ujson": ujson backend (compact output), if installed
+- "json": python standard library
+- "jsons": jsons library (the slowest, but able to map any class)
+
+when a `mapping_class` is provided the decoded document is mapped to it with a decoder
+compiled once per class (same result as jsons, see `jsonl_mapping`), except with the
+"jsons" codec that maps every document through jsons reflection.
+objects not supported by a backend (dataclasses, dates, ...) are encoded with jsons.
+orjson silently decodes the integers out of the 64 bits range as floats, so the lines with
+a run of 19 or more digits whose document has floats out of that range are decoded again
+with json to keep the exact integers (the digits check costs about half an orjson parse).
+"""
+import importlib
+import json
+from types import ModuleType
+from typing import Any, Optional, TypeVar
+
+import jsons
+
+from computing_toolbox.utils.jsonl_mapping import load
+
+T = TypeVar("T")
+
+
+def optional_import(name: str) -> Optional[ModuleType]:
+    """import a module if it is installed
+
+    :param name: the module name
+    :return: the module or None if it can't be imported
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+orjson = optional_import("orjson")
+ujson = optional_import("ujson")
+
+# valid codec names
+CODECS: tuple = ("auto", "orjson", "ujson", "json", "jsons")
+# orjson decodes the integers out of [-INT64_LIMIT, INT64_LIMIT) (and the uint64 range) as floats
+INT64_LIMIT: float = 2.0**63
+# translation of the digits to "0", the integers out of the 64 bits range are runs of LONG_DIGITS
+DIGITS_TABLE: bytes = bytes.maketrans(b"0123456789", b"0" * 10)
+LONG_DIGITS: bytes = b"0" * 19
+
+
+def resolve_codec(codec: str = "auto") -> str:
+    """get the backend name used to decode with a given codec
+
+    :param codec: the codec name, one of CODECS (default: "auto")
+    :return: the backend name
+    """
+    if codec not in CODECS:
+        raise ValueError(
+            f"jsonl codec expects a value in {CODECS}. Value provided codec='{codec}'"
+        )
+    if codec == "auto":
+        return "orjson" if orjson else "ujson" if ujson else "json"
+    if codec in ("orjson", "ujson") and not globals()[codec]:
+        raise ValueError(f"jsonl codec '{codec}' is not installed")
+    return codec
+
+
+def has_big_float(value: Any) -> bool:
+    """test if a decoded value has floats out of the 64 bits integers range
+
+    :param value: the decoded document (or any value inside it)
+    :return: True if any float of the value is not in (-INT64_LIMIT, INT64_LIMIT)
+    """
+    if isinstance(value, float):
+        return not -INT64_LIMIT < value < INT64_LIMIT
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, list):
+        return False
+    return any(has_big_float(x) for x in value)
+
+
+def loads(line: str | bytes,
+          mapping_class: Optional[T] = None,
+          codec: str = "auto") -> T | dict:
+    """decode one json line
+
+    :param line: the json string
+    :param mapping_class: if defined, map the document to this class, see `jsonl_mapping` (default: None)
+    :param codec: the codec name, one of CODECS (default: "auto")
+    :return: the document as a dictionary or as a mapping class object
+    """
+    backend = resolve_codec(codec)
+    if backend == "jsons":
+        line = line.decode("utf8") if isinstance(line, bytes) else line
+        return jsons.loads(line, mapping_class)
+    if backend == "json":
+        document = json.loads(line)
+    else:
+        try:
+            document = globals()[backend].loads(line)
+        except ValueError:
+            # fast backends reject some valid python json values (NaN, ...)
+            document = json.loads(line)
+        else:
+            # orjson turns the integers out of the 64 bits range into floats,
+            # the digits translation (inlined) is much cheaper than a regex search
+            if backend == "orjson" and LONG_DIGITS in (
+                    line.encode("utf8") if isinstance(line, str) else
+                    line).translate(DIGITS_TABLE) and has_big_float(document):
+                document = json.loads(line)
+    return load(document, mapping_class)
+
+
+def dumps(obj, codec: str = "auto") -> str:
+    """encode one object as a json line
+
+    :param obj: the object to be encoded
+    :param codec: the codec name, one of CODECS (default: "auto")
+    :return: the json string
+    """
+    backend = resolve_codec(codec) if codec != "auto" else "json"
+    if backend == "jsons":
+        return jsons.dumps(obj)
+    if backend == "json":
+        return json.dumps(obj, default=jsons.dump)
+    try:
+        if backend == "orjson":
+            return orjson.dumps(obj,
+                                default=jsons.dump,
+                                option=orjson.OPT_NON_STR_KEYS
+                                | orjson.OPT_PASSTHROUGH_DATETIME
+                                | orjson.OPT_PASSTHROUGH_DATACLASS).decode()
+        return ujson.dumps(obj, default=jsons.dump)
+    except (TypeError, OverflowError):
+        # fall back for objects the fast backends can't handle
+        return json.dumps(obj, default=jsons.dump)
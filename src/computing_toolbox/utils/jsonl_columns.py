@@ -0,0 +1,221 @@
+"""columnar storage for json line documents
+instead of a list of dictionaries, every column is stored in a typed buffer:
+- numeric and boolean columns in numpy arrays (masked where the value is missing)
+- string columns as one utf8 bytes buffer plus an offsets array (arrow style)
+- any other value (lists, dictionaries, mixed types) in numpy object arrays
+
+the buffers grow by doubling their capacity, so appending a value is O(1) amortized
+and no intermediate dictionary per document is kept in memory.
+"""
+from typing import Any, Iterable, Optional, Union
+
+import numpy as np
+
+# python types mapped to the storage dtype when the dtype is inferred
+INFERRED_DTYPES: dict = {
+    bool: np.dtype(bool),
+    int: np.dtype(np.int64),
+    float: np.dtype(np.float64),
+    str: "str"
+}
+
+
+class GrowableArray:
+    """numpy array with amortized O(1) append"""
+
+    def __init__(self, dtype: Any, capacity: int = 1024):
+        """growable array
+
+        :param dtype: the numpy dtype of the values
+        :param capacity: the initial capacity (default: 1024)
+        """
+        self._values = np.empty(max(capacity, 1), dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, k):
+        return self._values[:self._size][k]
+
+    def append(self, value: Any):
+        """append one value doubling the capacity when the buffer is full"""
+        if self._size == len(self._values):
+            values = np.empty(2 * len(self._values), dtype=self._values.dtype)
+            values[:self._size] = self._values[:self._size]
+            self._values = values
+        self._values[self._size] = value
+        self._size += 1
+
+    def astype(self, dtype: Any) -> "GrowableArray":
+        """convert the values to another dtype in place"""
+        self._values = self._values.astype(dtype)
+        return self
+
+    def to_numpy(self) -> np.ndarray:
+        """a compact copy of the values"""
+        return self._values[:self._size].copy()
+
+
+class StringColumn:
+    """utf8 strings stored in one bytes buffer, the string k is data[offsets[k]:offsets[k+1]]"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = GrowableArray(np.int64)
+        self.offsets.append(0)
+        self.valid = GrowableArray(bool)
+
+    def __len__(self) -> int:
+        return len(self.valid)
+
+    def append(self, value: Optional[str]):
+        """append one string, None is stored as a missing value"""
+        if value is not None:
+            self.data += value.encode("utf8")
+        self.offsets.append(len(self.data))
+        self.valid.append(value is not None)
+
+    def __getitem__(self, k: int) -> Optional[str]:
+        if not -len(self) <= k < len(self):
+            raise IndexError(f"StringColumn index {k} out of range")
+        k = k % len(self)
+        if not self.valid[k]:
+            return None
+        start, end = self.offsets[k:k + 2]
+        return self.data[start:end].decode("utf8")
+
+    def to_list(self) -> list[Optional[str]]:
+        """the column as a list of python strings"""
+        return [self[k] for k in range(len(self))]
+
+
+class ColumnBuilder:
+    """append the values of one column to its typed storage
+    if the dtype is not provided, it is inferred from the first not null value and
+    promoted when a value doesn't fit in it: int64 columns to float64 with a float, and
+    any other mismatch (bools mixed with numbers, strings mixed with other types, integers
+    out of the int64 range, ...) falls back to an object column that keeps the values as
+    they are. a provided dtype is never changed, a value that doesn't fit in it (i.e. a
+    bool in a numeric column or a number in a str column) raises ValueError.
+    """
+
+    def __init__(self, dtype: Any = None):
+        """column builder
+
+        :param dtype: a numpy dtype, int, float, bool, str or object, None to infer it (default: None)
+        """
+        self.dtype = None
+        self.explicit = dtype is not None
+        self.storage: Optional[Union[GrowableArray, StringColumn]] = None
+        self.valid = GrowableArray(bool)
+        self._set_dtype(dtype)
+
+    def _set_dtype(self, dtype: Any):
+        """create the storage and fill the missing values appended before"""
+        if dtype is None:
+            return
+        self.dtype = "str" if dtype in (str, "str") else np.dtype(dtype)
+        n_missing = len(self.valid)
+        if self.dtype == "str":
+            self.storage = StringColumn()
+            for _ in range(n_missing):
+                self.storage.append(None)
+        else:
+            self.storage = GrowableArray(self.dtype)
+            for _ in range(n_missing):
+                self.storage.append(self._missing_value())
+
+    def _missing_value(self) -> Any:
+        """the value stored in place of a missing one"""
+        return None if self.dtype == np.dtype(object) else np.zeros(
+            1, dtype=self.dtype)[0]
+
+    def append(self, value: Any):
+        """append one value, None is a missing value"""
+        if value is not None and self.dtype is None:
+            self._set_dtype(INFERRED_DTYPES.get(type(value), object))
+        if self.dtype is None:
+            self.valid.append(False)
+            return
+        if value is not None and not self._fits(value):
+            self._promote(value)
+        if isinstance(self.storage, StringColumn):
+            self.storage.append(value)
+        else:
+            self.storage.append(
+                value if value is not None else self._missing_value())
+        self.valid.append(value is not None)
+
+    def _fits(self, value: Any) -> bool:
+        """test if a not null value is stored exactly with the current dtype"""
+        if isinstance(self.storage, StringColumn):
+            return isinstance(value, str)
+        kind = self.dtype.kind
+        if kind == "b":
+            return isinstance(value, bool)
+        if kind in "iuf" and isinstance(value, bool):
+            # numpy would store the bools as 1 and 0
+            return False
+        if kind in "iu":
+            info = np.iinfo(self.dtype)
+            return isinstance(value, int) and info.min <= value <= info.max
+        if kind == "f":
+            limit = np.finfo(self.dtype).max
+            return isinstance(
+                value,
+                float) or isinstance(value, int) and -limit <= value <= limit
+        # object columns and other provided dtypes are converted by numpy
+        return True
+
+    def _promote(self, value: Any):
+        """change the dtype of an inferred column to store `value`, a provided dtype raises an error"""
+        if self.explicit:
+            raise ValueError(
+                f"ColumnBuilder expects values of dtype {self.dtype}. Value provided value={value!r}"
+            )
+        if isinstance(self.storage, StringColumn):
+            # the strings (and missing values) are moved to an object column
+            strings = self.storage.to_list()
+            self.dtype = np.dtype(object)
+            self.storage = GrowableArray(self.dtype, len(strings))
+            for string in strings:
+                self.storage.append(string)
+            return
+        if isinstance(value, float) and self.dtype.kind in "iu":
+            dtype = np.dtype(np.float64)
+        else:
+            dtype = np.dtype(object)
+        self.storage.astype(dtype)
+        self.dtype = dtype
+
+    def build(self) -> Union[np.ma.MaskedArray, StringColumn]:
+        """the final column
+
+        :return: a StringColumn or a numpy masked array, masked where the value is missing
+        """
+        if self.dtype is None:
+            # only missing values
+            self._set_dtype(np.float64)
+        if isinstance(self.storage, StringColumn):
+            return self.storage
+        return np.ma.MaskedArray(self.storage.to_numpy(),
+                                 mask=~self.valid.to_numpy())
+
+
+def build_columns(rows: Iterable[dict],
+                  keys: list[str],
+                  dtypes: Optional[dict] = None) -> dict:
+    """store the values of many rows by column
+
+    :param rows: the rows as dictionaries
+    :param keys: the column names
+    :param dtypes: the dtype of some columns, the others are inferred (default: None)
+    :return: a dictionary column name -> numpy masked array or StringColumn
+    """
+    dtypes = dtypes if dtypes is not None else {}
+    builders = {key: ColumnBuilder(dtypes.get(key)) for key in keys}
+    for row in rows:
+        for key, builder in builders.items():
+            builder.append(row.get(key))
+    return {key: builder.build() for key, builder in builders.items()}
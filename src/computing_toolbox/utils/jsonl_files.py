@@ -0,0 +1,491 @@
+"""json line operations over many files
+reading many paths or glob patterns at once (also from a running event loop)
+and writing sharded outputs, `Jsonl` inherits these methods
+"""
+import asyncio
+import fnmatch
+import os
+import re
+
+import logging
+from concurrent.futures import Executor
+from contextlib import ExitStack, nullcontext
+from functools import partial
+from multiprocessing import cpu_count, Pool
+from itertools import islice
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional, Sized, Type, TypeVar, Union
+
+from tqdm import tqdm
+
+from computing_toolbox.gcp.gs import Gs
+from computing_toolbox.gcp.gs_async import GsAsync
+from computing_toolbox.utils.compression import COMPRESSION_LEVELS
+from computing_toolbox.utils.jsonl_partition import partition_files
+from computing_toolbox.utils.jsonl_query import JsonlQuery
+from computing_toolbox.utils.lazy_pool import LazyPool
+from computing_toolbox.utils.lsr import lsr
+from computing_toolbox.utils.jsonl_workers import _imap_bounded, _iter_line_chunks, _iter_shards, \
+    _jsonl_parse_chunk, _jsonl_parse_shared, _read_documents, _read_text, _shared_memory_block, _write_shard
+
+T = TypeVar("T")
+
+
+def _glob_match(path_parts: list[str], pattern_parts: list[str]) -> bool:
+    """match the segments of a path with the segments of a glob pattern, `**` matches any number of segments"""
+    if not pattern_parts:
+        return not path_parts
+    if pattern_parts[0] == "**":
+        return any(
+            _glob_match(path_parts[k:], pattern_parts[1:])
+            for k in range(len(path_parts) + 1))
+    return bool(path_parts) and fnmatch.fnmatchcase(
+        path_parts[0], pattern_parts[0]) and _glob_match(
+            path_parts[1:], pattern_parts[1:])
+
+
+class JsonlFiles:
+    """json line operations over many local or gs:// files"""
+
+    # name of the files written by write_sharded
+    SHARD_TEMPLATE: str = "{prefix}-{index:05d}-of-{n_shards:05d}{suffix}"
+
+    @classmethod
+    def async_read(cls,
+                   paths: list[str],
+                   workers: Optional[int] = None,
+                   tqdm_kwargs: Optional[dict] = None,
+                   codec: str = "auto",
+                   pool: Optional[LazyPool] = None,
+                   shared_memory: bool = False) -> list[dict]:
+        """read a list of paths asynchronously
+        the contents are downloaded with GsAsync and every content is split and parsed
+        by a single task of the process pool.
+        with `shared_memory=True` the downloaded bytes are copied once into a shared memory
+        block and the workers only receive (name, offset, length) descriptors, avoiding
+        to pickle big contents to the processes.
+        it calls `asyncio.run`, inside a running event loop use `await Jsonl.aread(paths)`.
+
+        :param paths: the list of paths
+        :param workers: the number of parallel jobs, if None use the number of cpus (default: None)
+        :param tqdm_kwargs: if defined, at least {}, display the progress bars (default: None)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param pool: a LazyPool shared between calls, if None a new pool is used and closed (default: None)
+        :param shared_memory: if True send the contents to the workers through shared memory (default: False)
+        :return: the list of documents of every path
+        """
+        # A.1. read all documents at once
+        raw_contents = GsAsync.read(paths=paths,
+                                    tqdm_kwargs=tqdm_kwargs,
+                                    decode=not shared_memory)
+
+        with ExitStack() as stack:
+            # A.2 define the tasks: one content (or its shared memory descriptor) per task
+            if shared_memory:
+                descriptors = stack.enter_context(
+                    _shared_memory_block(raw_contents))
+                raw_contents.clear()
+                tasks = [(*x, None) for x in descriptors]
+                parse_fn = partial(_jsonl_parse_shared, codec=codec)
+            else:
+                tasks = [(content or "", None) for content in raw_contents]
+                parse_fn = partial(_jsonl_parse_chunk, codec=codec)
+
+            # A.3 split and parse every content in one task using the given pool or a new one
+            lazy_pool = stack.enter_context(
+                nullcontext(pool) if pool is not None else LazyPool(workers))
+            tqdm_kwargs_tmp = {
+                **{
+                    "total": len(tasks),
+                    "desc": f"parsing documents at {lazy_pool.workers}x"
+                },
+                **tqdm_kwargs
+            } if tqdm_kwargs is not None else None
+            if tqdm_kwargs_tmp is not None:
+                list_of_documents = list(
+                    tqdm(lazy_pool.imap(parse_fn, tasks), **tqdm_kwargs_tmp))
+            else:
+                list_of_documents = lazy_pool.map(parse_fn, tasks)
+
+        return list_of_documents
+
+    @classmethod
+    async def _aread_contents(cls, paths: list[str],
+                              batch_size: int) -> list[str]:
+        """download the gs:// paths with the GsAsync coroutines and read the local files in threads"""
+        gs_paths = [x for x in paths if x.startswith("gs://")]
+        local_paths = [x for x in paths if not x.startswith("gs://")]
+        gs_contents, local_contents = await asyncio.gather(
+            GsAsync.aread(gs_paths, batch_size=batch_size),
+            asyncio.gather(*(asyncio.to_thread(_read_text, x)
+                             for x in local_paths)))
+        contents = {
+            **dict(zip(gs_paths, gs_contents)),
+            **dict(zip(local_paths, local_contents))
+        }
+        for path in gs_paths:
+            if contents[path] is None:
+                raise OSError(f"Jsonl.aread can't read '{path}'")
+        return [contents[x] for x in paths]
+
+    @classmethod
+    async def aread(
+            cls,
+            paths: list[str],
+            mapping_class: Optional[Type[T]] = None,
+            executor: Optional[Executor] = None,
+            batch_size: int = 10,
+            codec: str = "auto",
+            fields: Optional[list] = None,
+            where: Optional[Union[dict, Callable]] = None) -> list[list]:
+        """read a list of paths inside a running event loop, i.e. `await Jsonl.aread(paths)`
+        the paths are downloaded in batches with the GsAsync coroutines (local files are read
+        in threads) and every content is parsed in the executor while the next batch is
+        downloaded, so the network and the parsing overlap without blocking the loop.
+        the default executor of the loop is a thread pool, use a `ProcessPoolExecutor`
+        to parse in parallel (then `where` must be picklable).
+
+        :param paths: the list of paths (local or gs://, plain or compressed)
+        :param mapping_class: the class to map the documents to, None for dictionaries (default: None)
+        :param executor: the executor parsing the contents, None for the loop default (default: None)
+        :param batch_size: the number of paths downloaded at once (default: 10)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param fields: if defined, return only these keys or deep_get paths, see `JsonlQuery` (default: None)
+        :param where: if defined, keep only the documents matching this {"path": value} spec or callable,
+                      see `JsonlQuery` (default: None)
+        :return: the list of documents of every path
+        """
+        loop = asyncio.get_running_loop()
+        query = JsonlQuery(fields, mapping_class, codec, where=where)
+        parse_fn = partial(_jsonl_parse_chunk, query=query)
+
+        # 1. download one batch at a time, the previous batches are being parsed
+        futures = []
+        for k in range(0, len(paths), batch_size):
+            contents = await cls._aread_contents(paths[k:k + batch_size],
+                                                 batch_size)
+            futures += [
+                loop.run_in_executor(executor, parse_fn, (content, None))
+                for content in contents
+            ]
+
+        # 2. wait for the parsed documents
+        return list(await asyncio.gather(*futures))
+
+    @classmethod
+    async def aiter(
+        cls,
+        path: str,
+        mapping_class: Optional[Type[T]] = None,
+        executor: Optional[Executor] = None,
+        chunk_size: int = 10000,
+        codec: str = "auto",
+        fields: Optional[list] = None,
+        where: Optional[Union[dict, Callable]] = None
+    ) -> AsyncIterator[Union[T, dict]]:
+        """iterate the documents of a file inside a running event loop, i.e.
+        `async for document in Jsonl.aiter(path)`.
+        the file (local or gs://) is streamed by smart_open in a thread, `chunk_size` lines
+        at a time, and the lines are parsed in chunks in the executor: the next chunk is
+        read and parsed while the documents of the current one are consumed, so at most
+        two chunks are in memory. the file is closed when the consumer stops early.
+
+        :param path: the file (local or gs://, plain or compressed)
+        :param mapping_class: the class to map the documents to, None for dictionaries (default: None)
+        :param executor: the executor parsing the chunks, None for the loop default (default: None)
+        :param chunk_size: the number of lines parsed per task (default: 10000)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param fields: if defined, return only these keys or deep_get paths, see `JsonlQuery` (default: None)
+        :param where: if defined, keep only the documents matching this {"path": value} spec or callable,
+                      see `JsonlQuery` (default: None)
+        :return: the async generator of documents
+        """
+        loop = asyncio.get_running_loop()
+        query = JsonlQuery(fields, mapping_class, codec, where=where)
+        chunks_it = _iter_line_chunks(path, chunk_size)
+
+        # 1. read the next chunk and parse it while yielding the current one
+        pending = None
+        try:
+            while True:
+                lines = await asyncio.to_thread(next, chunks_it, None)
+                future = loop.run_in_executor(
+                    executor, query.decode_lines,
+                    lines) if lines is not None else None
+                if pending is not None:
+                    for document in await pending:
+                        yield document
+                if future is None:
+                    return
+                pending = future
+        finally:
+            # 2. release the file when the consumer stops early
+            chunks_it.close()
+
+    @classmethod
+    def glob(cls,
+             pattern_or_prefix: str,
+             re_filter: str = r".*",
+             tqdm_kwargs: Optional[dict] = None) -> list[str]:
+        """list the files (local or gs://) matching a glob pattern or starting with a prefix
+        as in `glob`, the wildcards `*`, `?` and `[...]` match inside one path segment and
+        `**` matches any number of segments, i.e. 'data/*.jsonl' doesn't match 'data/sub/a.jsonl'.
+        local patterns are normalized as the listed paths, i.e. './data/*.jsonl' -> 'data/*.jsonl'.
+
+        :param pattern_or_prefix: a glob pattern, i.e. 'gs://bucket/export/part-*.jsonl.gz',
+                                  or a path prefix, i.e. 'gs://bucket/export/part-'
+        :param re_filter: an extra regular expression the paths must match (default: r".*")
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar while listing (default: None)
+        :return: the sorted list of paths
+        """
+        # 1. normalize the local pattern keeping a trailing separator, the prefix is the path before the first wildcard
+        if not pattern_or_prefix.startswith("gs://"):
+            trailing = os.sep if pattern_or_prefix.endswith(os.sep) else ""
+            pattern_or_prefix = os.path.normpath(pattern_or_prefix) + trailing
+        prefix = re.split(r"[*?\[]", pattern_or_prefix, maxsplit=1)[0]
+        pattern_parts = pattern_or_prefix.split("/")
+
+        # 2. list the candidates
+        if prefix.startswith("gs://"):
+            paths_it = Gs.list_files(prefix,
+                                     re_filter=re_filter,
+                                     tqdm_kwargs=tqdm_kwargs)
+        else:
+            root = prefix if os.path.isdir(prefix) else os.path.dirname(prefix)
+            paths_it = (os.path.normpath(x) for x in lsr(
+                root or ".", re_filter=re_filter, tqdm_kwargs=tqdm_kwargs)
+                        if os.path.isfile(x))
+
+        # 3. keep the paths matching the pattern, or starting with the prefix
+        if prefix == pattern_or_prefix:
+            return sorted(x for x in paths_it if x.startswith(prefix))
+        return sorted(x for x in paths_it
+                      if _glob_match(x.split("/"), pattern_parts))
+
+    @classmethod
+    def read_glob(cls,
+                  pattern_or_prefix: str,
+                  re_filter: str = r".*",
+                  mapping_class: Optional[Type[T]] = None,
+                  workers: Optional[int] = None,
+                  with_path: bool = False,
+                  tqdm_kwargs: Optional[dict] = None,
+                  codec: str = "auto") -> Iterator[Union[T, dict, tuple]]:
+        """read all the files matching a glob pattern or a prefix as one stream of documents
+        gs:// files are downloaded concurrently with GsAsync, `workers` files at a time,
+        and parsed by a process pool while the next files are downloaded.
+        at most 2*`workers` files are held in memory at any time.
+
+        :param pattern_or_prefix: a glob pattern or a path prefix, see `JsonlFiles.glob`
+        :param re_filter: an extra regular expression the paths must match (default: r".*")
+        :param mapping_class: the class to map the documents to, None for dictionaries (default: None)
+        :param workers: the number of parallel jobs, if None use the number of cpus (default: None)
+        :param with_path: if True, yield (path, document) tuples (default: False)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar with the files read (default: None)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :return: an iterator over the documents of all files in path order
+        """
+        workers = workers if workers is not None else cpu_count()
+        paths = cls.glob(pattern_or_prefix, re_filter=re_filter)
+        tqdm_kwargs = {
+            **{
+                "total": len(paths),
+                "desc": f"read_glob('{pattern_or_prefix}') at {workers}x"
+            },
+            **tqdm_kwargs
+        } if tqdm_kwargs is not None else None
+        pbar = tqdm(**tqdm_kwargs) if tqdm_kwargs is not None else None
+
+        # 1. download the files lazily and parse them in order
+        tasks_it = ((path, content, mapping_class)
+                    for path, content in cls._iter_contents(paths, workers))
+        parse_fn = partial(_read_documents, codec=codec)
+        with Pool(workers) as pool:
+            for path, documents in _imap_bounded(pool, parse_fn, tasks_it,
+                                                 workers):
+                _ = pbar.update() if pbar is not None else None
+                # 2. stream the documents
+                if with_path:
+                    yield from ((path, document) for document in documents)
+                else:
+                    yield from documents
+
+    @classmethod
+    def _iter_contents(cls, paths: list[str],
+                       batch_size: int) -> Iterator[tuple[str, Optional[str]]]:
+        """download gs:// paths in batches with GsAsync, local files are read by the workers (content=None)"""
+        for k in range(0, len(paths), batch_size):
+            batch = paths[k:k + batch_size]
+            gs_batch = [x for x in batch if x.startswith("gs://")]
+            gs_contents = dict(
+                zip(gs_batch, GsAsync.read(
+                    gs_batch, batch_size=batch_size))) if gs_batch else {}
+            for path in batch:
+                content = gs_contents.get(path)
+                if path in gs_contents and content is None:
+                    raise OSError(f"Jsonl.read_glob can't read '{path}'")
+                yield path, content
+
+    @classmethod
+    def write_sharded(cls,
+                      prefix: str,
+                      data: Iterable,
+                      max_records: Optional[int] = None,
+                      max_bytes: Optional[int] = None,
+                      workers: Optional[int] = None,
+                      tqdm_kwargs: Optional[dict] = None,
+                      codec: str = "auto",
+                      suffix: str = ".jsonl.gz") -> list[str]:
+        """write the data in many files (shards) named `prefix-00000-of-NNNNN.jsonl.gz`
+        a new shard is started when the current one reaches `max_records` objects or
+        `max_bytes` (uncompressed) bytes. the shards are compressed and written concurrently
+        by a process pool (local files) or uploaded asynchronously with GsAsync (gs:// files).
+        every shard is written with a temporary name and renamed once the number
+        of shards is known.
+
+        :param prefix: the path prefix of the shards, i.e. 'gs://bucket/dir/part'
+        :param data: any iterable of objects, a dict (or any other object) is written as a single line
+        :param max_records: the max number of objects per shard, None means no limit (default: None)
+        :param max_bytes: the max number of uncompressed bytes per shard, None means no limit (default: None)
+        :param workers: the number of shards written at the same time, if None use the number of cpus (default: None)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar with the written objects
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param suffix: the shard file extension, it defines the compression (default: ".jsonl.gz")
+        :return: the list of shard paths
+        """
+        for name, value in (("max_records", max_records), ("max_bytes",
+                                                           max_bytes)):
+            if value is not None and value < 1:
+                raise ValueError(
+                    f"Jsonl.write_sharded expects {name}>=1 or None. Value provided {name}={value}"
+                )
+        workers = workers if workers is not None else cpu_count()
+        # a dict or a str is a single object, any other iterable is a sequence of objects
+        data = data if isinstance(
+            data, Iterable) and not isinstance(data, (dict, str)) else [data]
+        tqdm_kwargs = {
+            **{
+                "total": len(data) if isinstance(data, Sized) else None,
+                "desc": f"sharded write at {workers}x"
+            },
+            **tqdm_kwargs
+        } if tqdm_kwargs is not None else None
+        pbar = tqdm(**tqdm_kwargs) if tqdm_kwargs is not None else None
+
+        # 1. group the objects in shards with a temporary name
+        shards_it = _iter_shards(iter(data), max_records, max_bytes, codec)
+        tasks_it = ((f"{prefix}-{k:05d}.tmp{suffix}", n_lines, content)
+                    for k, (n_lines, content) in enumerate(shards_it))
+
+        # 2. write the shards
+        is_gs = prefix.startswith("gs://")
+        if not is_gs and os.path.dirname(prefix):
+            os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        msg = f"writting shards to '{prefix}-*{suffix}'"
+        logging.info(msg)
+        write_fn = cls._write_shards_gs if is_gs else cls._write_shards_local
+        tmp_paths = write_fn(tasks_it, workers, pbar)
+
+        # 3. rename the shards with the final number of shards
+        rename_fn = Gs.rename if is_gs else os.replace
+        paths = []
+        for k, tmp_path in enumerate(tmp_paths):
+            path = cls.SHARD_TEMPLATE.format(prefix=prefix,
+                                             index=k,
+                                             n_shards=len(tmp_paths),
+                                             suffix=suffix)
+            rename_fn(tmp_path, path)
+            paths.append(path)
+        return paths
+
+    @classmethod
+    def partition(cls,
+                  path_or_paths: Union[str, list[str]],
+                  out_prefix: str,
+                  key: list,
+                  n_partitions: int,
+                  workers: Optional[int] = None,
+                  memory_limit: int = 1 << 28,
+                  chunk_size: int = 10000,
+                  tqdm_kwargs: Optional[dict] = None,
+                  codec: str = "auto",
+                  suffix: str = ".jsonl.gz") -> list[str]:
+        """split the documents of one or many files in `n_partitions` files by the hash of their key
+        the document goes to the partition `hash(key) % n_partitions`, with a hash stable across
+        processes and runs, so the same key always lands in the same partition file
+        `out_prefix-00000-of-NNNNN.jsonl.gz`. the lines are streamed and written by buffered
+        writers that flush every partition when it reaches `memory_limit / n_partitions`
+        characters, see `jsonl_partition`. the gs:// partitions also buffer their upload
+        parts, so half of `memory_limit` is left for them (at least 256KB per partition).
+
+        :param path_or_paths: the file or list of files to be partitioned
+        :param out_prefix: the path prefix of the partitions, i.e. 'gs://bucket/dir/part'
+        :param key: the keys or deep_get paths of the partition key
+        :param n_partitions: the number of partitions
+        :param workers: the number of parallel jobs decoding lines, if None use the number of cpus (default: None)
+        :param memory_limit: the number of characters buffered by all the partitions (default: 256M)
+        :param chunk_size: the number of lines sent to a worker per task (default: 10000)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar with the partitioned chunks
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param suffix: the partition file extension, it defines the compression (default: ".jsonl.gz")
+        :return: the list of partition paths
+        """
+        if n_partitions < 1:
+            raise ValueError(
+                f"Jsonl.partition expects n_partitions>=1. Value provided n_partitions={n_partitions}"
+            )
+        workers = workers if workers is not None else cpu_count()
+        input_paths = [path_or_paths] if isinstance(path_or_paths,
+                                                    str) else path_or_paths
+        if not out_prefix.startswith("gs://") and os.path.dirname(out_prefix):
+            os.makedirs(os.path.dirname(out_prefix), exist_ok=True)
+        out_paths = [
+            cls.SHARD_TEMPLATE.format(prefix=out_prefix,
+                                      index=k,
+                                      n_shards=n_partitions,
+                                      suffix=suffix)
+            for k in range(n_partitions)
+        ]
+        # the gs:// partitions buffer the lines and an upload part of the same size
+        n_buffers = 2 * n_partitions if out_prefix.startswith(
+            "gs://") else n_partitions
+        partition_files(input_paths,
+                        out_paths,
+                        JsonlQuery(fields=key).paths,
+                        workers=workers,
+                        chunk_size=chunk_size,
+                        flush_size=max(1, memory_limit // n_buffers),
+                        codec=codec,
+                        tqdm_kwargs=tqdm_kwargs)
+        return out_paths
+
+    @classmethod
+    def _write_shards_local(cls, tasks_it: Iterator, workers: int,
+                            pbar: Optional[tqdm]) -> list[str]:
+        """write (path, n_lines, content) shards with a process pool"""
+        paths = []
+        # pass the levels, the workers could not see the changes of COMPRESSION_LEVELS
+        write_fn = partial(_write_shard, levels=dict(COMPRESSION_LEVELS))
+        with Pool(workers) as pool:
+            for path, n_lines in _imap_bounded(pool, write_fn, tasks_it,
+                                               2 * workers):
+                paths.append(path)
+                _ = pbar.update(n_lines) if pbar is not None else None
+        return paths
+
+    @classmethod
+    def _write_shards_gs(cls, tasks_it: Iterator, workers: int,
+                         pbar: Optional[tqdm]) -> list[str]:
+        """upload (path, n_lines, content) shards with GsAsync, `workers` at a time"""
+        paths = []
+        for batch in iter(lambda: list(islice(tasks_it, workers)), []):
+            batch_paths = [path for path, _, _ in batch]
+            responses = GsAsync.write(batch_paths,
+                                      [content for _, _, content in batch],
+                                      batch_size=workers)
+            for path, response in zip(batch_paths, responses):
+                if response is None:
+                    raise OSError(f"Jsonl.write_sharded can't write '{path}'")
+            paths += batch_paths
+            _ = pbar.update(sum(
+                n for _, n, _ in batch)) if pbar is not None else None
+        return paths
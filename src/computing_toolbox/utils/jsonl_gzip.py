@@ -0,0 +1,175 @@
+"""multi-member gzip json line files
+a gzip file can be a concatenation of independently compressed gzip members
+(it is still a valid gzip file for any reader). writing the file as many members
+allows to compress the members in parallel, and storing the member offsets in a
+sidecar index (`path + ".gzi"`) allows to decompress and parse them in parallel.
+"""
+import gzip
+import zlib
+from functools import partial
+from multiprocessing import Pool
+from typing import Iterator, Optional
+
+import smart_open
+from smart_open.compression import NO_COMPRESSION
+from tqdm import tqdm
+
+from computing_toolbox.utils.compression import COMPRESSION_LEVELS
+from computing_toolbox.utils.jsonl_codec import dumps
+from computing_toolbox.utils.jsonl_query import JsonlQuery
+from computing_toolbox.utils.jsonl_workers import _imap_bounded
+from computing_toolbox.utils.sidecar import Sidecar, file_stat
+
+
+def _compress_member(args,
+                     codec: str = "auto",
+                     level: Optional[int] = None) -> tuple[int, bytes]:
+    """dumps a chunk of objects and compress it as one gzip member"""
+    objects = args
+    content = "".join(dumps(x, codec) + "\n" for x in objects)
+    level = level if level is not None else COMPRESSION_LEVELS[".gz"]
+    return len(objects), gzip.compress(content.encode("utf8"),
+                                       compresslevel=level)
+
+
+def _parse_member(args, query: JsonlQuery) -> list:
+    """decompress and parse one gzip member of a file"""
+    path, offset, length = args
+    with smart_open.open(path, "rb", compression=NO_COMPRESSION) as fp:
+        fp.seek(offset)
+        member = fp.read(length)
+    text = gzip.decompress(member).decode("utf8")
+    return query.decode_lines(text.split("\n"))
+
+
+class GzipMemberIndex(Sidecar):
+    """offsets and lengths of the gzip members of a file
+
+    example:
+        index = GzipMemberIndex.get("/path/to/file.jsonl.gz")
+        for offset, length in index.members:
+            ...
+    """
+
+    # sidecar file extension
+    EXTENSION: str = ".gzi"
+    # version of the sidecar file format
+    VERSION: int = 1
+
+    def __init__(self, path: str, size: int, mtime: float,
+                 members: list[list[int]]):
+        """gzip member index
+
+        :param path: the indexed file
+        :param size: the indexed file size in bytes
+        :param mtime: the indexed file modification time
+        :param members: the [offset, length] in bytes of every member
+        """
+        super().__init__(path, size, mtime)
+        self.members = members
+
+    @classmethod
+    def build(cls, path: str, buffer_size: int = 1 << 20) -> "GzipMemberIndex":
+        """scan (decompressing once) the file to find its members (it is not saved)
+
+        :param path: the gzip file (local or gs://)
+        :param buffer_size: the number of bytes read at once (default: 1MB)
+        :return: the index
+        """
+        if not path.endswith(".gz"):
+            raise ValueError(
+                f"GzipMemberIndex.build expects a .gz file. Value provided path='{path}'"
+            )
+        stat = file_stat(path)
+        members, start, position = [], 0, 0
+        decompressor = zlib.decompressobj(wbits=31)
+        with smart_open.open(path, "rb", compression=NO_COMPRESSION) as fp:
+            for data in iter(lambda: fp.read(buffer_size), b""):
+                while data:
+                    _ = decompressor.decompress(data)
+                    if not decompressor.eof:
+                        position += len(data)
+                        break
+                    # a member ends here, the next one starts with the unused data
+                    position += len(data) - len(decompressor.unused_data)
+                    members.append([start, position - start])
+                    start = position
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(wbits=31)
+        return cls(path, stat["size"], stat["mtime"], members)
+
+    def to_dict(self) -> dict:
+        """the fields of the index file"""
+        return {"members": self.members}
+
+    @classmethod
+    def from_dict(cls, path: str, data: dict) -> "GzipMemberIndex":
+        """build the index of `path` from the content of its file"""
+        return cls(path, data["size"], data["mtime"], data["members"])
+
+
+def write_gzip_members(path: str,
+                       chunks_it: Iterator[list],
+                       workers: int,
+                       pbar: Optional[tqdm] = None,
+                       codec: str = "auto",
+                       level: Optional[int] = None) -> int:
+    """compress every chunk of objects as a gzip member in parallel and write them in order
+
+    :param path: the .gz file to be written (local or gs://)
+    :param chunks_it: the iterator of chunks (lists) of objects
+    :param workers: the number of parallel jobs
+    :param pbar: if defined, the progress bar updated with the written objects (default: None)
+    :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+    :param level: the gzip compression level from 0 to 9, None for `COMPRESSION_LEVELS[".gz"]` (default: None)
+    :return: the number of objects written
+    """
+    # resolve the level here, the workers could not see the changes of COMPRESSION_LEVELS
+    level = level if level is not None else COMPRESSION_LEVELS[".gz"]
+    n, members, position = 0, [], 0
+    compress_fn = partial(_compress_member, codec=codec, level=level)
+    with Pool(workers) as pool, smart_open.open(
+            path, "wb", compression=NO_COMPRESSION) as fp:
+        for n_chunk, member in _imap_bounded(pool, compress_fn, chunks_it,
+                                             2 * workers):
+            fp.write(member)
+            members.append([position, len(member)])
+            position += len(member)
+            n += n_chunk
+            _ = pbar.update(n_chunk) if pbar is not None else None
+
+    # save the member index with the signature of the written file
+    stat = file_stat(path)
+    GzipMemberIndex(path, stat["size"], stat["mtime"], members).save()
+    return n
+
+
+def read_gzip_members(path: str,
+                      query: JsonlQuery,
+                      workers: int,
+                      tqdm_kwargs: Optional[dict] = None) -> list:
+    """decompress and parse the gzip members of a file in parallel
+
+    :param path: the gzip file (local or gs://)
+    :param query: the query used to decode the lines
+    :param workers: the number of parallel jobs
+    :param tqdm_kwargs: if defined, at least {}, display a progress bar with the parsed members (default: None)
+    :return: the list of documents in file order
+    """
+    index = GzipMemberIndex.get(path)
+    parameters = [(path, offset, length) for offset, length in index.members]
+    tqdm_kwargs = {
+        **{
+            "total": len(parameters),
+            "desc": f"parsing gzip members at {workers}x"
+        },
+        **tqdm_kwargs
+    } if tqdm_kwargs is not None else None
+    with Pool(workers) as pool:
+        list_of_documents = pool.imap(partial(_parse_member, query=query),
+                                      parameters)
+        list_of_documents = tqdm(
+            list_of_documents, **
+            tqdm_kwargs) if tqdm_kwargs is not None else list_of_documents
+        documents = [x for xs in list_of_documents for x in xs]
+    return documents
@@ -0,0 +1,132 @@
+"""sparse line index for json line files
+store the byte offset of every `every` lines in a sidecar file (`path + ".idx"`)
+so reading at a given line offset can seek near the line instead of scanning
+the whole prefix of the file.
+"""
+from itertools import count
+from typing import Optional
+
+import smart_open
+from smart_open.compression import NO_COMPRESSION, get_supported_extensions
+from tqdm import tqdm
+
+from computing_toolbox.utils.compression import get_extension
+from computing_toolbox.utils.sidecar import Sidecar, file_stat
+
+
+def is_compressed(path: str) -> bool:
+    """test if smart_open will decompress the path given its extension
+
+    :param path: the file path
+    :return: True if the extension is a compression extension
+    """
+    return get_extension(path) in get_supported_extensions()
+
+
+class JsonlIndex(Sidecar):
+    """sparse index with the byte offset of every `every` lines of an uncompressed jsonl file
+
+    example:
+        index = JsonlIndex.build("/path/to/file.jsonl", every=1000).save()
+        position, skip = index.locate(123456)
+    the line 123456 starts after skipping `skip` lines from the byte `position`.
+    """
+
+    # sidecar file extension
+    EXTENSION: str = ".idx"
+    # version of the sidecar file format
+    VERSION: int = 1
+
+    def __init__(self, path: str, every: int, size: int, mtime: float,
+                 n_lines: int, offsets: list[int]):
+        """sparse line index
+
+        :param path: the indexed file
+        :param every: the number of lines between two offsets
+        :param size: the indexed file size in bytes
+        :param mtime: the indexed file modification time
+        :param n_lines: the number of lines in the indexed file
+        :param offsets: offsets[k] is the byte offset of the line k*every
+        """
+        super().__init__(path, size, mtime)
+        self.every = every
+        self.n_lines = n_lines
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls,
+              path: str,
+              every: int = 1000,
+              tqdm_kwargs: Optional[dict] = None) -> "JsonlIndex":
+        """scan the file once and build its index (it is not saved)
+
+        :param path: the uncompressed jsonl file (local or gs://)
+        :param every: store the byte offset every this number of lines (default: 1000)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar (default: None)
+        :return: the index
+        """
+        if every < 1:
+            raise ValueError(
+                f"JsonlIndex.build expects every>=1. Value provided every={every}"
+            )
+        if is_compressed(path):
+            raise ValueError(
+                f"JsonlIndex.build can't index the compressed file '{path}'")
+
+        # 1. get the file signature before reading it
+        stat = file_stat(path)
+        tqdm_kwargs = {
+            **{
+                "desc": f"jsonl_index('{path}')"
+            },
+            **tqdm_kwargs
+        } if tqdm_kwargs is not None else None
+
+        # 2. walk over the lines saving the offset of every `every` lines
+        offsets = []
+        position, n_lines = 0, 0
+        with smart_open.open(path, "rb", compression=NO_COMPRESSION) as fp:
+            lines_it = tqdm(zip(count(), fp), **
+                            tqdm_kwargs) if tqdm_kwargs is not None else zip(
+                                count(), fp)
+            for n_lines, line in lines_it:
+                if n_lines % every == 0:
+                    offsets.append(position)
+                position += len(line)
+            n_lines = n_lines + 1 if offsets else 0
+
+        return cls(path=path,
+                   every=every,
+                   size=stat["size"],
+                   mtime=stat["mtime"],
+                   n_lines=n_lines,
+                   offsets=offsets)
+
+    def to_dict(self) -> dict:
+        """the fields of the index file"""
+        return {
+            "every": self.every,
+            "n_lines": self.n_lines,
+            "offsets": self.offsets
+        }
+
+    @classmethod
+    def from_dict(cls, path: str, data: dict) -> "JsonlIndex":
+        """build the index of `path` from the content of its file"""
+        return cls(path=path,
+                   every=data["every"],
+                   size=data["size"],
+                   mtime=data["mtime"],
+                   n_lines=data["n_lines"],
+                   offsets=data["offsets"])
+
+    def locate(self, line: int) -> tuple[int, int]:
+        """locate a line in the file
+
+        :param line: the line number (starting at 0)
+        :return: the byte offset to seek and the number of lines to skip from there
+        """
+        if line >= self.n_lines:
+            return self.size, 0
+        k = line // self.every
+        return self.offsets[k], line - k * self.every
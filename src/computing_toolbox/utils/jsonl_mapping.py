@@ -0,0 +1,172 @@
+"""compiled decoders to map json documents to classes
+`jsons.load(document, cls)` inspects the signature and the type hints of `cls` through
+reflection for every document. here the dataclasses and `__slots__` classes are
+inspected once and a specialized decoder is compiled (and cached by class) with one
+converter per constructor argument:
+- primitives (str, int, float, bool) are kept when they already have the right type
+- Optional[X], list[X] and dict[str, X] decode their items with the converter of X
+- untyped values, Any, bare list and dict are kept as they are
+- nested dataclasses and `__slots__` classes use their own compiled decoder
+- any other type (datetime, Enum, Union, tuple, ...) is delegated to `jsons.load`
+
+the result is the same as `jsons.load`: the missing arguments take their defaults and
+the keys out of the signature are set as attributes. when a document doesn't fit the
+fast path (a missing required argument, a value of another type, a constructor
+error, ...) it is decoded again with `jsons.load`, so the errors are also the same.
+"""
+import dataclasses
+import inspect
+import types
+from typing import Any, Callable, Optional, Union, get_args, get_origin, get_type_hints
+
+import jsons
+
+# compiled decoders by class
+_DECODERS: dict = {}
+# key used by jsons to store type hints in the documents
+META_KEY: str = "-meta"
+
+
+def _identity(value: Any) -> Any:
+    """keep the value as it is"""
+    return value
+
+
+def _is_compilable(cls: Any) -> bool:
+    """test if a class is decoded by a compiled object decoder"""
+    return inspect.isclass(cls) and (dataclasses.is_dataclass(cls)
+                                     or "__slots__" in vars(cls))
+
+
+def _instance_decoder(hint: Any, container: type) -> Callable[[Any], Any]:
+    """converter that keeps the values of the right type and delegates the others to jsons"""
+    return lambda v: v if isinstance(v, container) else jsons.load(v, hint)
+
+
+def _container_decoder(hint: Any, origin: type,
+                       args: tuple) -> Callable[[Any], Any]:
+    """converter of the typed lists and dictionaries with string keys"""
+    if origin is list:
+        item = _type_decoder(args[0])
+        return lambda v: [item(x) for x in v] if isinstance(
+            v, list) else jsons.load(v, hint)
+    if args[0] is str:
+        item = _type_decoder(args[1])
+        return lambda v: {
+            k: item(x)
+            for k, x in v.items()
+        } if isinstance(v, dict) and "-keys" not in v else jsons.load(v, hint)
+    return lambda v: jsons.load(v, hint)
+
+
+def _type_decoder(hint: Any) -> Callable[[Any], Any]:
+    """build the converter of the values with a given type hint"""
+    origin, args = get_origin(hint), get_args(hint)
+    if hint in (None, Any, inspect.Parameter.empty):
+        return _identity
+    if hint in (str, int, float, bool, list, dict) or (origin in (list, dict)
+                                                       and not args):
+        return _instance_decoder(hint, origin or hint)
+    if origin in (Union,
+                  types.UnionType) and len(args) == 2 and type(None) in args:
+        item = _type_decoder(args[0] if args[1] is type(None) else args[1])
+        return lambda v: None if v is None else item(v)
+    if origin in (list, dict):
+        return _container_decoder(hint, origin, args)
+    return compile_decoder(hint) if _is_compilable(hint) else (
+        lambda v: jsons.load(v, hint))
+
+
+class _ObjectDecoder:
+    """decoder of the documents of one class, compiled from its constructor signature"""
+
+    def __init__(self, cls: type):
+        """inspect the class and build one converter per constructor argument
+
+        :param cls: a dataclass or a `__slots__` class
+        """
+        self.cls = cls
+        self.arguments: list[tuple[str, Callable, bool]] = []
+        self.attributes: dict = {}
+        # register before compiling the arguments, so recursive classes find it
+        _DECODERS[cls] = self
+        hints = get_type_hints(cls.__init__)
+        for name, parameter in inspect.signature(
+                cls.__init__).parameters.items():
+            if name == "self" or parameter.kind in (
+                    inspect.Parameter.VAR_POSITIONAL,
+                    inspect.Parameter.VAR_KEYWORD):
+                continue
+            required = parameter.default is inspect.Parameter.empty
+            self.arguments.append(
+                (name, _type_decoder(hints.get(name)), required))
+        self.names = {name for name, _, _ in self.arguments}
+        self.class_hints = get_type_hints(cls)
+
+    def _attribute_decoder(self, name: str, value: Any) -> Callable:
+        """the converter of a key out of the signature, typed by the class annotations"""
+        key = (name, type(value))
+        if key not in self.attributes:
+            self.attributes[key] = _type_decoder(
+                self.class_hints.get(name, type(value)))
+        return self.attributes[key]
+
+    def _decode(self, document: dict) -> Any:
+        """the fast path, it raises an exception if the document doesn't fit it"""
+        kwargs = {}
+        for name, decoder, required in self.arguments:
+            if name in document:
+                kwargs[name] = decoder(document[name])
+            elif required:
+                raise KeyError(name)
+        instance = self.cls(**kwargs)
+        if len(document) > len(kwargs):
+            for name, value in document.items():
+                if name not in self.names:
+                    try:
+                        setattr(instance, name,
+                                self._attribute_decoder(name, value)(value))
+                    except AttributeError:
+                        pass
+        return instance
+
+    def __call__(self, document: Any) -> Any:
+        """decode one document with the same result as `jsons.load(document, cls)`"""
+        if not isinstance(document, dict) or META_KEY in document:
+            return jsons.load(document, self.cls)
+        try:
+            return self._decode(document)
+        except Exception:
+            # let jsons decide the value or raise its own error
+            return jsons.load(document, self.cls)
+
+
+def compile_decoder(cls: Any) -> Callable[[Any], Any]:
+    """get the cached compiled decoder of a class
+
+    :param cls: the mapping class
+    :return: a function document -> object, `jsons.load` for the classes that can't be compiled
+    """
+    decoder = _DECODERS.get(cls)
+    if decoder is not None:
+        return decoder
+    if not _is_compilable(cls):
+        decoder = _DECODERS[cls] = lambda document: jsons.load(document, cls)
+        return decoder
+    try:
+        return _ObjectDecoder(cls)
+    except (NameError, TypeError, ValueError):
+        # unresolved type hints or signature, use jsons
+        decoder = _DECODERS[cls] = lambda document: jsons.load(document, cls)
+        return decoder
+
+
+def load(document: Any, mapping_class: Optional[type] = None) -> Any:
+    """map a decoded json document to a class with its compiled decoder
+
+    :param document: the json document (dictionaries, lists and primitives)
+    :param mapping_class: the class, if None the document is returned as it is (default: None)
+    :return: the mapped object
+    """
+    return compile_decoder(mapping_class)(
+        document) if mapping_class is not None else document
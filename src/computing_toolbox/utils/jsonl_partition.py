@@ -0,0 +1,157 @@
+"""hash partitioning of json line files
+the lines of one or many files are streamed in chunks, the workers decode every line to
+get the partition `key_digest(key) % n_partitions` (stable across processes and runs)
+and return the lines grouped by partition, then the parent process appends them to the
+buffer of their partition, flushing a buffer to its file (local or gs://, compressed by
+extension) when it reaches `flush_size` characters. so the memory is bounded by
+`n_partitions * flush_size` plus the chunks in flight and not by the data.
+
+a gs:// writer also buffers the upload part of its resumable upload (50MB by default
+in smart_open), so the gs:// partitions are opened with a part of `flush_size` rounded
+up to a multiple of 256KB (`gcs_part_size`), and then the memory is bounded by
+`n_partitions * (flush_size + gcs_part_size(flush_size))`.
+"""
+from contextlib import ExitStack
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+from typing import Iterator, Optional
+
+import smart_open
+from tqdm import tqdm
+
+from computing_toolbox.utils.dedup import key_digest
+from computing_toolbox.utils.jsonl_codec import loads
+from computing_toolbox.utils.jsonl_workers import _imap_bounded
+
+# the parts of a gs:// resumable upload are a multiple of this size
+GCS_PART_UNIT: int = 1 << 18
+
+
+def gcs_part_size(flush_size: int) -> int:
+    """the upload part size of a gs:// partition: `flush_size` rounded up to a multiple of 256KB"""
+    return max(1, -(-flush_size // GCS_PART_UNIT)) * GCS_PART_UNIT
+
+
+def _open_partition(path: str, flush_size: int):
+    """open a partition file for writing, the gs:// uploads buffer parts of `gcs_part_size`"""
+    if path.startswith("gs://"):
+        return smart_open.open(
+            path,
+            "w",
+            transport_params={"min_part_size": gcs_part_size(flush_size)})
+    return smart_open.open(path, "w")
+
+
+def _partition_chunk(args,
+                     paths: list[list],
+                     n_partitions: int,
+                     codec: str = "auto") -> list[list[str]]:
+    """group the not empty lines of a chunk by partition"""
+    lines = args
+    partitions = [[] for _ in range(n_partitions)]
+    for line in lines:
+        line = line.rstrip("\n")
+        if line and not line.isspace():
+            document = loads(line, None, codec)
+            partitions[key_digest(document, paths) % n_partitions].append(line)
+    return partitions
+
+
+def _iter_chunks(input_paths: list[str], chunk_size: int) -> Iterator[list]:
+    """read the lines of many files in chunks of at most `chunk_size` lines"""
+    for path in input_paths:
+        with smart_open.open(path) as fp:
+            chunk = list(islice(fp, chunk_size))
+            while chunk:
+                yield chunk
+                chunk = list(islice(fp, chunk_size))
+
+
+class _PartitionWriter:
+    """buffered writer of one partition file"""
+
+    def __init__(self, fp, flush_size: int):
+        """partition writer
+
+        :param fp: the open text file
+        :param flush_size: the number of characters buffered before writing them
+        """
+        self.fp = fp
+        self.flush_size = flush_size
+        self.buffer: list[str] = []
+        self.buffer_length = 0
+        self.n_lines = 0
+
+    def write(self, lines: list[str]):
+        """append lines to the buffer and flush it if it is full"""
+        for line in lines:
+            self.buffer.append(line + "\n")
+            self.buffer_length += len(line) + 1
+        self.n_lines += len(lines)
+        if self.buffer_length >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """write the buffered lines"""
+        self.fp.write("".join(self.buffer))
+        self.buffer.clear()
+        self.buffer_length = 0
+
+
+def partition_files(input_paths: list[str],
+                    out_paths: list[str],
+                    paths: list[list],
+                    workers: int = 1,
+                    chunk_size: int = 10000,
+                    flush_size: int = 1 << 20,
+                    codec: str = "auto",
+                    tqdm_kwargs: Optional[dict] = None) -> list[int]:
+    """split the documents of many files in partitions by the hash of their key
+
+    :param input_paths: the files to be partitioned (local or gs://, plain or compressed)
+    :param out_paths: the file of every partition (local or gs://, plain or compressed)
+    :param paths: the deep_get paths of the key
+    :param workers: the number of parallel jobs decoding chunks (default: 1)
+    :param chunk_size: the number of lines sent to a worker per task (default: 10000)
+    :param flush_size: the number of characters buffered per partition before writing them,
+                       it also sets the upload part size of the gs:// partitions (default: 1M)
+    :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+    :param tqdm_kwargs: if defined, at least {}, display a progress bar with the partitioned chunks (default: None)
+    :return: the number of documents of every partition
+    """
+    tqdm_kwargs = {
+        **{
+            "desc": f"partitioning at {workers}x"
+        },
+        **tqdm_kwargs
+    } if tqdm_kwargs is not None else None
+    partition_fn = partial(_partition_chunk,
+                           paths=paths,
+                           n_partitions=len(out_paths),
+                           codec=codec)
+
+    with ExitStack() as stack:
+        # 1. open every partition file, the empty partitions are also written
+        writers = [
+            _PartitionWriter(
+                stack.enter_context(_open_partition(path, flush_size)),
+                flush_size) for path in out_paths
+        ]
+        pool = stack.enter_context(Pool(workers))
+
+        # 2. group the chunks in parallel and append the lines to their partition
+        partitions_it = _imap_bounded(pool, partition_fn,
+                                      _iter_chunks(input_paths, chunk_size),
+                                      2 * workers)
+        partitions_it = tqdm(
+            partitions_it, **
+            tqdm_kwargs) if tqdm_kwargs is not None else partitions_it
+        for partitions in partitions_it:
+            for writer, lines in zip(writers, partitions):
+                writer.write(lines)
+
+        # 3. write the remaining lines
+        for writer in writers:
+            writer.flush()
+    return [writer.n_lines for writer in writers]
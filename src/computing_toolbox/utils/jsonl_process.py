@@ -0,0 +1,223 @@
+"""checkpointed processing of json line files
+the file is processed in numbered chunks of lines, the chunks are processed in parallel
+and committed in file order to a small checkpoint file (`path + ".ckpt"` by default)
+with the byte offset where the next chunk starts. if the job dies, running it again
+seeks to that offset and resumes from the first chunk not committed.
+
+NOTE: the chunks in flight when the job died are processed again, so the processing
+function should be idempotent by chunk, i.e. write its output to a file named after
+the chunk id.
+"""
+from functools import partial
+from itertools import count, islice
+from multiprocessing import Pool
+from typing import Any, Callable, Iterator, Optional
+
+import smart_open
+from tqdm import tqdm
+
+from computing_toolbox.utils.jsonl_query import JsonlQuery
+from computing_toolbox.utils.jsonl_workers import _imap_bounded
+from computing_toolbox.utils.sidecar import Sidecar, file_stat
+
+
+def _process_chunk(args, process_fn: Callable[[int, list], Any],
+                   query: JsonlQuery) -> tuple[int, int, int, int]:
+    """decode the lines of one chunk and apply the processing function to its documents"""
+    chunk_id, start, end, lines = args
+    documents = query.decode_lines(lines)
+    process_fn(chunk_id, documents)
+    return chunk_id, start, end, len(documents)
+
+
+def _seek(fp, offset: int, buffer_size: int = 1 << 20):
+    """move a binary file to the byte offset, reading forward when it is not seekable"""
+    if fp.seekable():
+        fp.seek(offset)
+        return
+    while offset > 0:
+        data = fp.read(min(offset, buffer_size))
+        if not data:
+            return
+        offset -= len(data)
+
+
+def _iter_chunks(fp, chunk_id: int, offset: int,
+                 chunk_size: int) -> Iterator[tuple[int, int, int, list]]:
+    """split the lines of a binary file in numbered chunks with their byte range
+
+    :param fp: the binary file positioned at `offset`
+    :param chunk_id: the id of the first chunk
+    :param offset: the byte offset of the first chunk
+    :param chunk_size: the number of lines per chunk
+    :return: the generator of (chunk_id, start, end, lines)
+    """
+    for k in count(chunk_id):
+        lines = list(islice(fp, chunk_size))
+        if not lines:
+            return
+        end = offset + sum(len(line) for line in lines)
+        yield k, offset, end, lines
+        offset = end
+
+
+class JsonlCheckpoint(Sidecar):
+    """progress of the processing of a json line file
+
+    example:
+        checkpoint = JsonlCheckpoint.read("/path/to/file.jsonl")
+        print(checkpoint.n_chunks, checkpoint.offset)
+    the first `n_chunks` chunks are done and the next one starts at the byte `offset`
+    (of the uncompressed content).
+    """
+
+    # default checkpoint file extension
+    EXTENSION: str = ".ckpt"
+    # version of the checkpoint file format
+    VERSION: int = 1
+
+    def __init__(self,
+                 path: str,
+                 size: int,
+                 mtime: float,
+                 chunk_size: int,
+                 n_chunks: int = 0,
+                 n_documents: int = 0,
+                 offset: int = 0,
+                 done: bool = False,
+                 checkpoint_path: Optional[str] = None):
+        """processing checkpoint
+
+        :param path: the processed file
+        :param size: the processed file size in bytes
+        :param mtime: the processed file modification time
+        :param chunk_size: the number of lines per chunk
+        :param n_chunks: the number of committed chunks (default: 0)
+        :param n_documents: the number of documents in the committed chunks (default: 0)
+        :param offset: the byte offset where the next chunk starts (default: 0)
+        :param done: True if the whole file was processed (default: False)
+        :param checkpoint_path: the checkpoint file, if None use `path + ".ckpt"` (default: None)
+        """
+        super().__init__(path, size, mtime, sidecar_path=checkpoint_path)
+        self.chunk_size = chunk_size
+        self.n_chunks = n_chunks
+        self.n_documents = n_documents
+        self.offset = offset
+        self.done = done
+
+    @classmethod
+    def build(cls,
+              path: str,
+              chunk_size: int = 10000,
+              checkpoint_path: Optional[str] = None) -> "JsonlCheckpoint":
+        """create the empty checkpoint of the processing of `path`
+
+        :param path: the file to be processed
+        :param chunk_size: the number of lines per chunk (default: 10000)
+        :param checkpoint_path: the checkpoint file, if None use `path + ".ckpt"` (default: None)
+        :return: the checkpoint without committed chunks (not saved)
+        """
+        stat = file_stat(path)
+        return cls(path,
+                   stat["size"],
+                   stat["mtime"],
+                   chunk_size,
+                   checkpoint_path=checkpoint_path)
+
+    def to_dict(self) -> dict:
+        """the checkpoint progress"""
+        return {
+            "chunk_size": self.chunk_size,
+            "n_chunks": self.n_chunks,
+            "n_documents": self.n_documents,
+            "offset": self.offset,
+            "done": self.done
+        }
+
+    @classmethod
+    def from_dict(cls, path: str, data: dict) -> "JsonlCheckpoint":
+        """build the checkpoint from the decoded checkpoint file"""
+        return cls(path,
+                   data["size"],
+                   data["mtime"],
+                   data["chunk_size"],
+                   n_chunks=data["n_chunks"],
+                   n_documents=data["n_documents"],
+                   offset=data["offset"],
+                   done=data["done"])
+
+    def commit(self, start: int, end: int,
+               n_documents: int) -> "JsonlCheckpoint":
+        """record the next chunk as done and save the checkpoint
+
+        :param start: the chunk start byte offset
+        :param end: the chunk end byte offset
+        :param n_documents: the number of documents in the chunk
+        :return: the saved checkpoint
+        """
+        if start != self.offset:
+            raise ValueError(
+                f"JsonlCheckpoint.commit expects the chunk starting at {self.offset}. Value provided start={start}"
+            )
+        self.n_chunks += 1
+        self.n_documents += n_documents
+        self.offset = end
+        return self.save()
+
+
+def process_file(path: str,
+                 process_fn: Callable[[int, list], Any],
+                 query: JsonlQuery,
+                 checkpoint_path: Optional[str] = None,
+                 chunk_size: int = 10000,
+                 workers: int = 1,
+                 tqdm_kwargs: Optional[dict] = None) -> int:
+    """apply `process_fn(chunk_id, documents)` to every chunk of a file, resuming from its checkpoint
+
+    :param path: the file to be processed (local or gs://, plain or compressed)
+    :param process_fn: the picklable processing function of the chunk id and its list of documents
+    :param query: the query used to decode the lines
+    :param checkpoint_path: the checkpoint file, if None use `path + ".ckpt"` (default: None)
+    :param chunk_size: the number of lines per chunk (default: 10000)
+    :param workers: the number of parallel jobs (default: 1)
+    :param tqdm_kwargs: if defined, at least {}, display a progress bar with the processed documents (default: None)
+    :return: the number of processed documents, including the ones of previous runs
+    """
+    # 1. read the checkpoint and check it belongs to the current file, unlike the stale
+    #    indexes a stale checkpoint is not rebuilt: the chunks already done were processed
+    #    with another content and their outputs may have to be removed too
+    checkpoint = JsonlCheckpoint.read(path, checkpoint_path)
+    if checkpoint is None:
+        checkpoint = JsonlCheckpoint.build(path, chunk_size, checkpoint_path)
+    elif not checkpoint.is_current() or checkpoint.chunk_size != chunk_size:
+        raise ValueError(
+            f"the checkpoint '{checkpoint.sidecar_path}' doesn't match the file '{path}' or the chunk_size={chunk_size}, "
+            "remove it to process the file from the beginning")
+    if checkpoint.done:
+        return checkpoint.n_documents
+
+    # 2. define the progress bar starting at the committed documents
+    tqdm_kwargs = {
+        **{
+            "initial": checkpoint.n_documents,
+            "desc": f"processing chunks at {workers}x"
+        },
+        **tqdm_kwargs
+    } if tqdm_kwargs is not None else None
+    pbar = tqdm(**tqdm_kwargs) if tqdm_kwargs is not None else None
+
+    # 3. process the chunks after the last committed one and commit them in order
+    with smart_open.open(path, "rb") as fp, Pool(workers) as pool:
+        _seek(fp, checkpoint.offset)
+        chunks_it = _iter_chunks(fp, checkpoint.n_chunks, checkpoint.offset,
+                                 chunk_size)
+        chunk_fn = partial(_process_chunk, process_fn=process_fn, query=query)
+        for _, start, end, n_documents in _imap_bounded(
+                pool, chunk_fn, chunks_it, 2 * workers):
+            checkpoint.commit(start, end, n_documents)
+            _ = pbar.update(n_documents) if pbar is not None else None
+
+    # 4. mark the file as done
+    checkpoint.done = True
+    checkpoint.save()
+    return checkpoint.n_documents
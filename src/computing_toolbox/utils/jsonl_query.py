@@ -0,0 +1,125 @@
+"""projection of json lines
+decode a json line and keep only some fields of the document, i.e.
+
+    query = JsonlQuery(fields=["id", ["user", "name"], ["tags", 0]])
+    query.decode('{"id": 1, "user": {"name": "john", "age": 30}, "tags": ["a", "b"]}')
+    -> {"id": 1, "user.name": "john", "tags.0": "a"}
+
+a field is a key of the document or a `deep_get` path (a list of keys/indexes),
+missing or null values are returned as `default_value`.
+
+the documents can be filtered with a `where` condition, evaluated on the decoded
+document before the projection or the class mapping:
+- a dictionary {"path": value}, the path is a key or dotted keys/indexes, i.e. "user.tags.0",
+  the document matches when all the deep_get values are equal to the given values
+- a callable document -> bool, it must be picklable (a module level function) to
+  be used by the parallel readers
+
+the query is picklable, so it is applied inside the pool workers and only the
+matching documents (or the projected values) are sent back to the parent process.
+"""
+from typing import Any, Callable, Iterable, Optional, Union
+
+from computing_toolbox.utils.deep_get import deep_get
+from computing_toolbox.utils.jsonl_codec import loads
+from computing_toolbox.utils.jsonl_mapping import load
+
+Field = Union[str, list[Union[str, int]]]
+
+
+class Dropped:
+    """marker returned by `JsonlQuery.decode` when the document doesn't match the `where` condition
+    (a class is pickled by reference, so the marker keeps its identity in the pool workers)
+    """
+
+
+class JsonlQuery:
+    """decode json lines as dictionaries or mapping class objects, or project some fields"""
+
+    def __init__(self,
+                 fields: Optional[list[Field]] = None,
+                 mapping_class: Optional[type] = None,
+                 codec: str = "auto",
+                 default_value: Any = None,
+                 where: Optional[Union[dict, Callable]] = None):
+        """json line query
+
+        :param fields: the keys or deep_get paths to keep, None to keep the whole document (default: None)
+        :param mapping_class: the class to map the whole documents to, not allowed with fields (default: None)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param default_value: the value of missing fields (default: None)
+        :param where: keep only the documents matching this {"path": value} spec or callable (default: None)
+        """
+        if fields is not None and mapping_class is not None:
+            raise ValueError(
+                "JsonlQuery expects fields or mapping_class, not both. "
+                f"Value provided fields={fields}, mapping_class={mapping_class}"
+            )
+        self.fields = fields
+        self.mapping_class = mapping_class
+        self.codec = codec
+        self.default_value = default_value
+        self.paths = [[x] if isinstance(x, str) else list(x)
+                      for x in fields] if fields is not None else None
+        self.keys = [".".join(str(k) for k in x)
+                     for x in self.paths] if fields is not None else None
+        self.where = where
+        self.where_paths = [
+            ([int(k) if k.isdigit() else k for k in key.split(".")], value)
+            for key, value in where.items()
+        ] if isinstance(where, dict) else None
+
+    def match(self, document: Any) -> bool:
+        """test if a decoded document matches the `where` condition
+
+        :param document: the decoded document
+        :return: True if there is no condition or the document matches it
+        """
+        if self.where is None:
+            return True
+        if self.where_paths is not None:
+            return all(
+                deep_get(document, path, None) == value
+                for path, value in self.where_paths)
+        return bool(self.where(document))
+
+    def decode(self, line: str | bytes) -> Any:
+        """decode one line and project its fields
+
+        :param line: the json line
+        :return: the document, the mapping class object or the dictionary of projected fields,
+                 `Dropped` if the line is blank or the document doesn't match the `where` condition
+        """
+        if not line or line.isspace():
+            # blank lines (i.e. "\n" or b"\n") are skipped by every reader
+            return Dropped
+        if self.paths is None and self.where is None:
+            return loads(line, self.mapping_class, self.codec)
+        # the document is decoded by the fastest backend without mapping,
+        # filtered and then mapped or projected
+        document = loads(line, None, self.codec)
+        if not self.match(document):
+            return Dropped
+        return self.project(document)
+
+    def project(self, document: Any) -> Any:
+        """map a decoded document to the mapping class or project its fields
+
+        :param document: the decoded document
+        :return: the mapping class object, the dictionary of projected fields or the document
+        """
+        if self.paths is None:
+            return load(document, self.mapping_class)
+        return {
+            key: deep_get(document, path, self.default_value)
+            for key, path in zip(self.keys, self.paths)
+        }
+
+    def decode_lines(self, lines: Iterable[str | bytes]) -> list:
+        """decode many lines skipping the blank ones and the dropped documents
+
+        :param lines: the json lines
+        :return: the list of decoded lines
+        """
+        documents = (self.decode(line) for line in lines)
+        return [x for x in documents if x is not Dropped]
@@ -0,0 +1,143 @@
+"""random access reader for local json line files
+the file is memory mapped once and the start offset of every line is kept in a numpy
+array, so `reader[i]`, `reader[i:j]` and `len(reader)` don't read the file again.
+the offsets are cached in a sidecar file (`path + ".lines.npz"`) that is rebuilt
+when the file size or modification time change.
+
+example:
+    with JsonlReader("/path/to/file.jsonl") as reader:
+        page = reader[100:110]
+"""
+import contextlib
+import mmap
+import os
+from typing import Any, Optional, Type, TypeVar
+
+import numpy as np
+
+from computing_toolbox.utils.jsonl_index import file_stat, is_compressed
+from computing_toolbox.utils.jsonl_query import JsonlQuery
+
+T = TypeVar("T")
+
+
+def line_offsets(buffer, block_size: int = 1 << 26) -> np.ndarray:
+    """find the start offset of every line of a buffer
+
+    :param buffer: the file content (bytes or mmap)
+    :param block_size: the number of bytes scanned at once (default: 64MB)
+    :return: the uint64 array with the start offset of every line plus the end offset
+    """
+    size = len(buffer)
+    blocks = [np.zeros(1, dtype=np.uint64)]
+    for start in range(0, size, block_size):
+        block = np.frombuffer(buffer[start:start + block_size], dtype=np.uint8)
+        newlines = np.flatnonzero(block == ord("\n")).astype(np.uint64)
+        blocks.append(newlines + np.uint64(start + 1))
+    offsets = np.concatenate(blocks)
+    # a last line without a new line character is also a line
+    if size and buffer[size - 1:size] != b"\n":
+        offsets = np.append(offsets, np.uint64(size))
+    return offsets
+
+
+class JsonlReader:
+    """memory mapped random access reader of a local uncompressed json line file"""
+
+    # sidecar file extension
+    EXTENSION: str = ".lines.npz"
+
+    def __init__(self,
+                 path: str,
+                 mapping_class: Optional[Type[T]] = None,
+                 codec: str = "auto",
+                 fields: Optional[list] = None,
+                 cache: bool = True):
+        """random access reader
+
+        :param path: the local uncompressed jsonl file
+        :param mapping_class: the output class (if defined)
+        :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+        :param fields: if defined, return only these keys or deep_get paths, see `JsonlQuery` (default: None)
+        :param cache: if True, load or save the line offsets in the sidecar file (default: True)
+        """
+        if "://" in path or is_compressed(path):
+            raise ValueError(
+                f"JsonlReader expects a local uncompressed file. Value provided path='{path}'"
+            )
+        self.path = path
+        self.query = JsonlQuery(fields, mapping_class, codec)
+
+        # 1. map the file in memory (an empty file can't be mapped)
+        stat = file_stat(path)
+        self._mm = None
+        if stat["size"]:
+            with open(path, "rb") as fp:
+                self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # 2. load or build the line offsets
+        self.offsets = self._load_offsets(stat) if cache else None
+        if self.offsets is None:
+            self.offsets = line_offsets(
+                self._mm if self._mm is not None else b"")
+            _ = self._save_offsets(stat) if cache else None
+
+    def offsets_path(self) -> str:
+        """the sidecar path of the line offsets"""
+        return self.path + self.EXTENSION
+
+    def _load_offsets(self, stat: dict) -> Optional[np.ndarray]:
+        """load the cached line offsets if they belong to the current file"""
+        try:
+            with np.load(self.offsets_path()) as data:
+                if (int(data["size"]),
+                        float(data["mtime"])) != (stat["size"], stat["mtime"]):
+                    return None
+                return data["offsets"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save_offsets(self, stat: dict):
+        """cache the line offsets with the file signature,
+        the offsets are only kept in memory if the sidecar can't be written (read-only directory)
+        """
+        try:
+            with open(self.offsets_path(), "wb") as fp:
+                np.savez(fp,
+                         offsets=self.offsets,
+                         size=stat["size"],
+                         mtime=stat["mtime"])
+        except OSError:
+            # remove a partially written sidecar
+            with contextlib.suppress(OSError):
+                os.remove(self.offsets_path())
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def line(self, k: int) -> bytes:
+        """the raw line k without its new line character"""
+        if not -len(self) <= k < len(self):
+            raise IndexError(f"JsonlReader index {k} out of range")
+        k = k % len(self)
+        start, end = int(self.offsets[k]), int(self.offsets[k + 1])
+        return self._mm[start:end].rstrip(b"\n")
+
+    def __getitem__(self, k: int | slice) -> Any:
+        """the document k or the list of documents of a slice, empty lines are None"""
+        if isinstance(k, slice):
+            return [self[i] for i in range(*k.indices(len(self)))]
+        line = self.line(k)
+        return self.query.decode(line) if line.strip() else None
+
+    def close(self):
+        """release the memory map"""
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def __enter__(self) -> "JsonlReader":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
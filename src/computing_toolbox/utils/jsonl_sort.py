@@ -0,0 +1,198 @@
+"""external memory sort of json line files
+the file is read in runs of at most `run_size` bytes, the workers sort every run by key
+and spill it to a temporary lz4 compressed file as a stream of pickled (key, line) pairs,
+then the runs are merged (k-way) in a streaming fashion while writing the output file.
+a merge opens all its run files at once, so when there are more than `max_open_runs`
+runs (the open file descriptors are limited, see `ulimit -n`) groups of runs are first
+merged in parallel into bigger runs, in as many passes as needed.
+the original lines are written as they are (they are decoded only to get the key) and
+the sort is stable: documents with the same key keep the order of the input file.
+"""
+import os
+import pickle
+import tempfile
+from functools import partial
+from heapq import merge
+from itertools import count
+from multiprocessing import Pool
+from typing import Any, Iterable, Iterator, Optional
+
+import lz4.frame
+import smart_open
+from tqdm import tqdm
+
+from computing_toolbox.utils.compression import COMPRESSION_LEVELS
+from computing_toolbox.utils.deep_get import deep_get
+from computing_toolbox.utils.jsonl_codec import loads
+from computing_toolbox.utils.jsonl_workers import _imap_bounded
+
+# maximum number of run files open at once while merging
+MAX_OPEN_RUNS: int = 128
+
+
+def sort_key(document: Any, paths: list[list]) -> tuple:
+    """the sort key of a document, in ascending order the missing values (None) go last
+
+    :param document: the decoded document
+    :param paths: the deep_get paths of the key
+    :return: the tuple of (is missing, value) pairs
+    """
+    values = (deep_get(document, path, None) for path in paths)
+    return tuple((False, x) if x is not None else (True, 0) for x in values)
+
+
+def _sort_run(args,
+              paths: list[list],
+              reverse: bool = False,
+              codec: str = "auto",
+              level: Optional[int] = None) -> tuple[str, int]:
+    """sort the lines of one run by key and spill them to a compressed run file"""
+    run_path, lines = args
+    pairs = [(sort_key(loads(line, None, codec), paths), line)
+             for line in lines]
+    pairs.sort(key=lambda x: x[0], reverse=reverse)
+    return run_path, _write_run(run_path, pairs, level)
+
+
+def _write_run(run_path: str,
+               pairs: Iterable[tuple],
+               level: Optional[int] = None) -> int:
+    """write the (key, line) pairs to a compressed run file, None level for `COMPRESSION_LEVELS[".lz4"]`"""
+    n = 0
+    level = level if level is not None else COMPRESSION_LEVELS[".lz4"]
+    with lz4.frame.open(run_path, "wb", compression_level=level) as fp:
+        for n, pair in enumerate(pairs, start=1):
+            pickle.dump(pair, fp, protocol=5)
+    return n
+
+
+def _merge_runs(args,
+                reverse: bool = False,
+                level: Optional[int] = None) -> tuple[str, int]:
+    """merge some sorted run files (in order, to keep the sort stable) into a new one and remove them"""
+    run_path, run_paths = args
+    pairs_it = merge(*(_iter_run(x) for x in run_paths),
+                     key=lambda x: x[0],
+                     reverse=reverse)
+    n = _write_run(run_path, pairs_it, level)
+    for path in run_paths:
+        os.remove(path)
+    return run_path, n
+
+
+def _iter_run(run_path: str) -> Iterator[tuple]:
+    """read the (key, line) pairs of a run file"""
+    with lz4.frame.open(run_path, "rb") as fp:
+        while True:
+            try:
+                yield pickle.load(fp)
+            except EOFError:
+                return
+
+
+def _iter_runs(path: str, run_size: int,
+               run_dir: str) -> Iterator[tuple[str, list]]:
+    """split the not empty lines of a file in runs of at most `run_size` characters
+
+    :param path: the file to be split
+    :param run_size: the maximum number of characters per run (at least one line)
+    :param run_dir: the directory of the run files
+    :return: the generator of (run path, lines)
+    """
+    lines, size, run_ids = [], 0, count()
+    with smart_open.open(path) as fp:
+        for line in fp:
+            line = line.rstrip("\n")
+            if not line or line.isspace():
+                continue
+            lines.append(line)
+            size += len(line)
+            if size >= run_size:
+                yield os.path.join(run_dir,
+                                   f"run-{next(run_ids):05d}.lz4"), lines
+                lines, size = [], 0
+    if lines:
+        yield os.path.join(run_dir, f"run-{next(run_ids):05d}.lz4"), lines
+
+
+def sort_file(path: str,
+              out_path: str,
+              paths: list[list],
+              workers: int = 1,
+              run_size: int = 1 << 28,
+              reverse: bool = False,
+              tmp_dir: Optional[str] = None,
+              codec: str = "auto",
+              tqdm_kwargs: Optional[dict] = None,
+              buffer_lines: int = 10000,
+              max_open_runs: int = MAX_OPEN_RUNS) -> int:
+    """sort a json line file by key without loading it in memory
+
+    :param path: the file to be sorted (local or gs://, plain or compressed)
+    :param out_path: the sorted file (local or gs://, plain or compressed)
+    :param paths: the deep_get paths of the key
+    :param workers: the number of parallel jobs sorting runs (default: 1)
+    :param run_size: the maximum number of characters of the lines of a run (default: 256M)
+    :param reverse: if True, sort in descending order (default: False)
+    :param tmp_dir: the directory of the temporary run files, None for the system one (default: None)
+    :param codec: the json codec, see `jsonl_codec.CODECS` (default: "auto")
+    :param tqdm_kwargs: if defined, at least {}, display a progress bar with the merged documents (default: None)
+    :param buffer_lines: the number of lines accumulated before writing them (default: 10000)
+    :param max_open_runs: the maximum number of run files open at once, at least 2 (default: 128)
+    :return: the number of sorted documents
+    """
+    if max_open_runs < 2:
+        raise ValueError(
+            f"sort_file expects max_open_runs>=2. Value provided max_open_runs={max_open_runs}"
+        )
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as run_dir:
+        # 1. sort the runs in parallel, at most `workers` runs are in memory at once
+        # resolve the level here, the workers could not see the changes of COMPRESSION_LEVELS
+        level = COMPRESSION_LEVELS[".lz4"]
+        sort_fn = partial(_sort_run,
+                          paths=paths,
+                          reverse=reverse,
+                          codec=codec,
+                          level=level)
+        with Pool(workers) as pool:
+            runs = list(
+                _imap_bounded(pool, sort_fn,
+                              _iter_runs(path, run_size, run_dir), workers))
+
+            # 2. merge groups of consecutive runs until the last merge can open all of them,
+            # the workers merge in parallel keeping at most `max_open_runs` files open
+            merge_fn, merge_ids = partial(_merge_runs,
+                                          reverse=reverse,
+                                          level=level), count()
+            fan_in = max(2, max_open_runs // workers)
+            while len(runs) > max_open_runs:
+                groups = [(os.path.join(run_dir,
+                                        f"merge-{next(merge_ids):05d}.lz4"),
+                           [run_path for run_path, _ in runs[k:k + fan_in]])
+                          for k in range(0, len(runs), fan_in)]
+                runs = list(pool.imap(merge_fn, groups))
+        tqdm_kwargs = {
+            **{
+                "desc": f"merging {len(runs)} runs",
+                "total": sum(n for _, n in runs)
+            },
+            **tqdm_kwargs
+        } if tqdm_kwargs is not None else None
+        pbar = tqdm(**tqdm_kwargs) if tqdm_kwargs is not None else None
+
+        # 3. merge the runs (in file order to keep the sort stable) writing the lines
+        n_documents, buffer = 0, []
+        pairs_it = merge(*(_iter_run(run_path) for run_path, _ in runs),
+                         key=lambda x: x[0],
+                         reverse=reverse)
+        with smart_open.open(out_path, "w") as fp:
+            for _, line in pairs_it:
+                buffer.append(line + "\n")
+                n_documents += 1
+                if len(buffer) >= buffer_lines:
+                    fp.write("".join(buffer))
+                    _ = pbar.update(len(buffer)) if pbar is not None else None
+                    buffer.clear()
+            fp.write("".join(buffer))
+            _ = pbar.update(len(buffer)) if pbar is not None else None
+    return n_documents
@@ -0,0 +1,300 @@
+"""private helpers of the json line library
+module-level functions executed by the process pools of `Jsonl`
+(they must be picklable) and file helpers shared by the jsonl modules
+"""
+import io
+import mmap
+import os
+from contextlib import contextmanager
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterator, Optional, TextIO
+
+import smart_open
+from smart_open.compression import NO_COMPRESSION
+from tqdm import tqdm
+
+from computing_toolbox.utils.compression import COMPRESSION_LEVELS, compress, get_extension
+from computing_toolbox.utils.jsonl_codec import dumps
+from computing_toolbox.utils.jsonl_index import JsonlIndex
+from computing_toolbox.utils.jsonl_query import Dropped, JsonlQuery
+from computing_toolbox.utils.jsonl_reader import line_offsets
+
+
+def _jsonl_parse_one_line(args,
+                          codec: str = "auto",
+                          query: Optional[JsonlQuery] = None):
+    """parse one line at a time, with the query if defined"""
+    line, mapping_class = args
+    query = query if query is not None else JsonlQuery(
+        mapping_class=mapping_class, codec=codec)
+    document = query.decode(line)
+    return document
+
+
+def _jsonl_dumps_one_object(args, codec: str = "auto"):
+    """dumps one object at a time"""
+    x = args
+    line = dumps(x, codec)
+    return line
+
+
+def _jsonl_dumps_chunk(args, codec: str = "auto") -> tuple[int, str]:
+    """dumps a chunk of objects as one single string of lines"""
+    objects = args
+    content = "\n".join(dumps(x, codec) for x in objects)
+    return len(objects), content
+
+
+def _jsonl_parse_chunk(args,
+                       codec: str = "auto",
+                       query: Optional[JsonlQuery] = None):
+    """parse a chunk of lines joined in one single string, with the query if defined"""
+    text, mapping_class = args
+    query = query if query is not None else JsonlQuery(
+        mapping_class=mapping_class, codec=codec)
+    documents = query.decode_lines(text.split("\n"))
+    return documents
+
+
+def _imap_bounded(pool: Pool, func, iterable, max_pending: int) -> Iterator:
+    """ordered version of `pool.imap` that keeps at most `max_pending` tasks in flight
+    `pool.imap` consumes the whole input iterable as fast as it can, so when the input
+    is a file reader all the file ends up in memory; here the input is consumed only
+    when a result is delivered.
+
+    :param pool: the multiprocessing pool
+    :param func: the function to be applied to every element
+    :param iterable: the input iterable
+    :param max_pending: maximum number of submitted tasks not yet returned
+    :return: the generator of results in the same order as the input
+    """
+    pending = deque()
+    for args in iterable:
+        pending.append(pool.apply_async(func, (args, )))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def _jsonl_parse_byte_range(args,
+                            codec: str = "auto",
+                            query: Optional[JsonlQuery] = None):
+    """parse the lines that start within the byte range [start, end) of an uncompressed file"""
+    path, start, end, mapping_class = args
+    query = query if query is not None else JsonlQuery(
+        mapping_class=mapping_class, codec=codec)
+    documents = []
+    with smart_open.open(path, "rb", compression=NO_COMPRESSION) as fp:
+        # 1. align to the first line starting at or after `start`
+        #    (the previous range is in charge of the line crossing `start`)
+        position = start
+        if start > 0:
+            fp.seek(start - 1)
+            position = start - 1 + len(fp.readline())
+        # 2. parse every line starting before `end`
+        while position < end:
+            line = fp.readline()
+            if not line:
+                break
+            position += len(line)
+            document = query.decode(line)
+            if document is not Dropped:
+                documents.append(document)
+    return documents
+
+
+@contextmanager
+def _open_at_line(path: str,
+                  offset: int = 0,
+                  use_index: bool = False,
+                  tqdm_kwargs: Optional[dict] = None) -> Iterator[TextIO]:
+    """open a json line file in text mode positioned at the beginning of the line `offset`
+
+    :param path: the file to be read
+    :param offset: the number of lines to skip (default: 0)
+    :param use_index: if True, seek near the line with the sidecar index of the file,
+                      building the index if it doesn't exist or is stale (default: False)
+    :param tqdm_kwargs: if defined, display a progress bar for the skipped lines (default: None)
+    :return: the context manager of the text file
+    """
+    # 1. open the file at the nearest indexed line or at the beginning
+    if use_index and offset:
+        position, offset = JsonlIndex.get(path).locate(offset)
+        raw_fp = smart_open.open(path, "rb", compression=NO_COMPRESSION)
+        raw_fp.seek(position)
+        fp = io.TextIOWrapper(raw_fp, encoding="utf8")
+    else:
+        fp = smart_open.open(path)
+
+    with fp:
+        # 2. skip the remaining lines
+        if offset:
+            skip_iterator = tqdm(range(offset), **{
+                "total": offset,
+                **tqdm_kwargs
+            }) if tqdm_kwargs is not None else range(offset)
+            for _, _ in zip(skip_iterator, fp):
+                pass
+        yield fp
+
+
+def _count_newlines(fp,
+                    buffer_size: int,
+                    pbar: Optional[tqdm] = None) -> tuple[int, bytes]:
+    """count the new line characters of a binary file reading large buffers
+
+    :param fp: the binary file object
+    :param buffer_size: the number of bytes read at once
+    :param pbar: if defined, the progress bar updated with the read bytes
+    :return: the number of new line characters and the last byte of the file
+    """
+    n_newlines, last_byte = 0, b""
+    for buffer in iter(lambda: fp.read(buffer_size), b""):
+        n_newlines += buffer.count(b"\n")
+        last_byte = buffer[-1:]
+        _ = pbar.update(len(buffer)) if pbar is not None else None
+    return n_newlines, last_byte
+
+
+def _count_newlines_in_range(args) -> int:
+    """count the new line characters in the byte range [start, end) of an uncompressed file"""
+    path, start, end, buffer_size = args
+    n_newlines = 0
+    with smart_open.open(path, "rb", compression=NO_COMPRESSION) as fp:
+        fp.seek(start)
+        for position in range(start, end, buffer_size):
+            buffer = fp.read(min(buffer_size, end - position))
+            n_newlines += buffer.count(b"\n")
+    return n_newlines
+
+
+def _count_newlines_mmap(path: str,
+                         buffer_size: int,
+                         pbar: Optional[tqdm] = None) -> tuple[int, bytes]:
+    """count the new line characters of a local uncompressed file mapping it in memory"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0, b""
+    n_newlines = 0
+    with open(path, "rb") as fp, mmap.mmap(fp.fileno(),
+                                           0,
+                                           access=mmap.ACCESS_READ) as mapped:
+        for position in range(0, size, buffer_size):
+            buffer = mapped[position:position + buffer_size]
+            n_newlines += buffer.count(b"\n")
+            _ = pbar.update(len(buffer)) if pbar is not None else None
+        last_byte = mapped[size - 1:size]
+    return n_newlines, last_byte
+
+
+@contextmanager
+def _shared_memory_block(
+        contents: list[Optional[bytes]]
+) -> Iterator[list[tuple[str, int, int]]]:
+    """copy the contents in one shared memory block, the block is released at exit
+
+    :param contents: the list of contents, None is handled as an empty content
+    :return: the list of (block name, offset, length) descriptors of every content
+    """
+    size = sum(len(x) for x in contents if x)
+    block = SharedMemory(create=True, size=max(size, 1))
+    try:
+        descriptors, offset = [], 0
+        for content in contents:
+            length = len(content) if content else 0
+            block.buf[offset:offset + length] = content or b""
+            descriptors.append((block.name, offset, length))
+            offset += length
+        yield descriptors
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _jsonl_parse_shared(args,
+                        codec: str = "auto",
+                        query: Optional[JsonlQuery] = None):
+    """parse the lines of a content stored in a shared memory block, with the query if defined
+    the lines are split on the shared block and only one line at a time is copied to be decoded
+    """
+    name, offset, length, mapping_class = args
+    query = query if query is not None else JsonlQuery(
+        mapping_class=mapping_class, codec=codec)
+    block = SharedMemory(name=name)
+    try:
+        with block.buf[offset:offset + length] as view:
+            offsets = line_offsets(view).tolist()
+            documents = query.decode_lines(
+                bytes(view[start:end]).rstrip(b"\n")
+                for start, end in zip(offsets, offsets[1:]))
+    finally:
+        block.close()
+    return documents
+
+
+def _read_text(path: str) -> str:
+    """read the whole (decompressed) content of a file"""
+    with smart_open.open(path) as fp:
+        return fp.read()
+
+
+def _iter_line_chunks(path: str, chunk_size: int) -> Iterator[list[str]]:
+    """stream the lines of a file (local or gs://, plain or compressed) in chunks"""
+    with smart_open.open(path) as fp:
+        lines_it = (line.rstrip("\n") for line in fp)
+        chunk = list(islice(lines_it, chunk_size))
+        while chunk:
+            yield chunk
+            chunk = list(islice(lines_it, chunk_size))
+
+
+def _read_documents(args, codec: str = "auto") -> tuple[str, list]:
+    """parse the documents of one file, if the content is None read the file"""
+    path, content, mapping_class = args
+    if content is None:
+        with smart_open.open(path) as fp:
+            content = fp.read()
+    query = JsonlQuery(mapping_class=mapping_class, codec=codec)
+    documents = query.decode_lines(content.split("\n"))
+    return path, documents
+
+
+def _iter_shards(data: Iterator,
+                 max_records: Optional[int],
+                 max_bytes: Optional[int],
+                 codec: str = "auto") -> Iterator[tuple[int, str]]:
+    """group the serialized objects in shards of at most `max_records` lines
+    and `max_bytes` (uncompressed utf8) bytes, a shard has at least one line
+
+    :return: an iterator of (number of lines, shard content) tuples
+    """
+    lines, n_bytes = [], 0
+    for x in data:
+        line = dumps(x, codec)
+        line_bytes = len(line.encode("utf8")) + 1
+        full_records = max_records is not None and len(lines) >= max_records
+        full_bytes = max_bytes is not None and n_bytes + line_bytes > max_bytes
+        if lines and (full_records or full_bytes):
+            yield len(lines), "\n".join(lines) + "\n"
+            lines, n_bytes = [], 0
+        lines.append(line)
+        n_bytes += line_bytes
+    if lines:
+        yield len(lines), "\n".join(lines) + "\n"
+
+
+def _write_shard(args, levels: Optional[dict] = None) -> tuple[str, int]:
+    """write (and compress given the extension) one shard,
+    with the compression levels of the parent process if defined (default: `COMPRESSION_LEVELS`)
+    """
+    path, n_lines, content = args
+    levels = levels if levels is not None else COMPRESSION_LEVELS
+    data = compress(content.encode("utf8"), path,
+                    levels.get(get_extension(path)))
+    with smart_open.open(path, "wb", compression=NO_COMPRESSION) as fp:
+        fp.write(data)
+    return path, n_lines
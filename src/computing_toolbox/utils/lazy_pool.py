@@ -0,0 +1,51 @@
+"""multiprocessing pool created on its first use"""
+from contextlib import ExitStack
+from multiprocessing import cpu_count, Pool
+from typing import Callable, Iterable, Iterator, Optional
+
+
+class LazyPool:
+    """a process pool created the first time a task is submitted
+    share one instance between several calls to pay the processes start up cost once
+
+    example:
+        with LazyPool(4) as pool:
+            documents1 = Jsonl.async_read(paths1, pool=pool)
+            documents2 = Jsonl.async_read(paths2, pool=pool)
+    both calls use the same 4 processes, they are terminated when leaving the `with` block
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        """lazy process pool
+
+        :param workers: the number of processes, if None use the number of cpus (default: None)
+        """
+        self.workers = workers if workers is not None else cpu_count()
+        self._pool: Optional[Pool] = None
+        self._exit_stack = ExitStack()
+
+    @property
+    def pool(self) -> Pool:
+        """the underlying pool, created on first access"""
+        if self._pool is None:
+            self._pool = self._exit_stack.enter_context(Pool(self.workers))
+        return self._pool
+
+    def map(self, func: Callable, iterable: Iterable) -> list:
+        """same as `Pool.map`"""
+        return self.pool.map(func, iterable)
+
+    def imap(self, func: Callable, iterable: Iterable) -> Iterator:
+        """same as `Pool.imap`"""
+        return self.pool.imap(func, iterable)
+
+    def close(self):
+        """terminate the processes if they were created"""
+        self._exit_stack.close()
+        self._pool = None
+
+    def __enter__(self) -> "LazyPool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
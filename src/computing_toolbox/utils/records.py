@@ -0,0 +1,356 @@
+"""binary record files
+a sibling of the json line files for hot intermediate data that is read many times:
+every object is stored as a length-prefixed binary record (msgpack or pickle protocol 5),
+so reading it again doesn't parse json text, and a sidecar offset index
+(`path + ".ridx"`) gives O(1) random access to any record.
+
+file layout:
+- data file: MAGIC, one serializer byte (b"m" msgpack, b"p" pickle), then the records
+  as a little endian uint32 length followed by the payload
+- index file: the little endian uint64 byte offset of every record plus the end offset
+
+the files are never compressed, they are meant for fast local (or gs://) re-reads.
+msgpack is the default serializer. pickle is opt-in: unpickling runs arbitrary code, so
+reading a pickle file also requires `allow_pickle=True` (only for trusted files).
+"""
+import pickle
+import struct
+from functools import partial
+from multiprocessing import Pool, cpu_count
+from typing import Any, Iterable, Iterator, Optional, Type, TypeVar
+
+import jsons
+import msgpack
+import numpy as np
+import smart_open
+from smart_open.compression import NO_COMPRESSION
+from tqdm import tqdm
+
+from computing_toolbox.algorithms.split_range import split_range_ab
+from computing_toolbox.utils.jsonl_columns import GrowableArray
+from computing_toolbox.utils.jsonl_mapping import load
+from computing_toolbox.utils.sidecar import file_stat
+
+T = TypeVar("T")
+
+# the length prefix of every record
+LENGTH = struct.Struct("<I")
+
+
+def _pack(obj: Any, serializer: str) -> bytes:
+    """serialize one object"""
+    if serializer == "msgpack":
+        return msgpack.packb(obj, default=jsons.dump)
+    return pickle.dumps(obj, protocol=5)
+
+
+def _unpack(payload: bytes | memoryview,
+            serializer: str,
+            mapping_class: Optional[Type[T]] = None) -> T | Any:
+    """deserialize one object and map it to a class if defined"""
+    if serializer == "msgpack":
+        obj = msgpack.unpackb(payload, strict_map_key=False)
+        return load(obj, mapping_class)
+    return pickle.loads(payload)
+
+
+def _unpack_records(buffer: bytes,
+                    serializer: str,
+                    mapping_class: Optional[Type[T]] = None) -> list:
+    """deserialize all the consecutive records of a buffer"""
+    view, position, objects = memoryview(buffer), 0, []
+    while position < len(view):
+        (length, ) = LENGTH.unpack_from(view, position)
+        position += LENGTH.size
+        objects.append(
+            _unpack(view[position:position + length], serializer,
+                    mapping_class))
+        position += length
+    return objects
+
+
+def _read_byte_range(args, serializer: str) -> list:
+    """read and deserialize the records in the byte range [start, end) of a file"""
+    path, start, end, mapping_class = args
+    with smart_open.open(path, "rb", compression=NO_COMPRESSION) as fp:
+        fp.seek(start)
+        buffer = fp.read(end - start)
+    return _unpack_records(buffer, serializer, mapping_class)
+
+
+class Records:
+    """read and write binary record files with the same api as `Jsonl`
+
+    example:
+        Records.write("/path/to/data.rec", [{"k": 1}, {"k": 2}])
+        data = Records.read("/path/to/data.rec")
+        second = Records.get("/path/to/data.rec", 1)
+    """
+
+    # first bytes of every record file
+    MAGIC: bytes = b"CTREC1"
+    # index file extension
+    INDEX_EXTENSION: str = ".ridx"
+    # valid serializer names and the byte stored in the header
+    SERIALIZERS: dict = {"msgpack": b"m", "pickle": b"p"}
+
+    @classmethod
+    def index_path(cls, path: str) -> str:
+        """the sidecar path of the offset index of `path`"""
+        return path + cls.INDEX_EXTENSION
+
+    @classmethod
+    def resolve_serializer(cls, serializer: str = "auto") -> str:
+        """get the serializer used to write
+
+        :param serializer: "msgpack", "pickle" or "auto" for msgpack (default: "auto")
+        :return: the serializer name
+        """
+        serializer = "msgpack" if serializer == "auto" else serializer
+        if serializer not in cls.SERIALIZERS:
+            raise ValueError(
+                f"Records expects a serializer in {('auto', *cls.SERIALIZERS)}. Value provided serializer='{serializer}'"
+            )
+        return serializer
+
+    @classmethod
+    def _read_header(cls,
+                     fp,
+                     path: str,
+                     allow_pickle: bool = False,
+                     mapping_class: Optional[Type[T]] = None) -> str:
+        """read the header of an open record file and return its serializer if it can be read"""
+        header = fp.read(len(cls.MAGIC) + 1)
+        codes = {v: k for k, v in cls.SERIALIZERS.items()}
+        if header[:-1] != cls.MAGIC or header[-1:] not in codes:
+            raise ValueError(f"'{path}' is not a record file")
+        serializer = codes[header[-1:]]
+        if serializer == "pickle" and not allow_pickle:
+            raise ValueError(
+                f"'{path}' is a pickle record file, unpickling runs arbitrary code: "
+                "read it with allow_pickle=True only if it comes from a trusted source"
+            )
+        if serializer == "pickle" and mapping_class is not None:
+            raise ValueError(
+                f"'{path}' is a pickle record file, it restores the original classes and can't use mapping_class"
+            )
+        return serializer
+
+    @classmethod
+    def offsets(cls, path: str) -> np.ndarray:
+        """load the offset index of a record file
+
+        :param path: the record file
+        :return: the array with the byte offset of every record plus the end offset
+        """
+        with smart_open.open(cls.index_path(path),
+                             "rb",
+                             compression=NO_COMPRESSION) as fp:
+            offsets = np.frombuffer(fp.read(), dtype="<u8")
+        if offsets.size == 0 or int(offsets[-1]) != file_stat(path)["size"]:
+            raise ValueError(
+                f"the index '{cls.index_path(path)}' doesn't match the file '{path}'"
+            )
+        return offsets
+
+    @classmethod
+    def count(cls, path: str) -> int:
+        """the number of records of a file"""
+        return len(cls.offsets(path)) - 1
+
+    @classmethod
+    def write(cls,
+              path: str,
+              data: Iterable,
+              tqdm_kwargs: Optional[dict] = None,
+              serializer: str = "auto") -> int:
+        """write the objects as a record file and its offset index
+
+        :param path: the record file (local or gs://)
+        :param data: any iterable of objects
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar (default: None)
+        :param serializer: "msgpack", "pickle" or "auto" for msgpack (default: "auto")
+        :return: the number of written records
+        """
+        serializer = cls.resolve_serializer(serializer)
+        tqdm_kwargs = {
+            **{
+                "desc": f"records_write('{path}')",
+                "total": len(data) if hasattr(data, "__len__") else None
+            },
+            **tqdm_kwargs
+        } if tqdm_kwargs is not None else None
+        data_it = tqdm(data, **
+                       tqdm_kwargs) if tqdm_kwargs is not None else data
+
+        # 1. write the header and the length-prefixed records saving their offsets
+        offsets = GrowableArray("<u8")
+        with smart_open.open(path, "wb", compression=NO_COMPRESSION) as fp:
+            header = cls.MAGIC + cls.SERIALIZERS[serializer]
+            fp.write(header)
+            position = len(header)
+            for obj in data_it:
+                payload = _pack(obj, serializer)
+                offsets.append(position)
+                fp.write(LENGTH.pack(len(payload)))
+                fp.write(payload)
+                position += LENGTH.size + len(payload)
+            offsets.append(position)
+
+        # 2. write the offset index
+        with smart_open.open(cls.index_path(path),
+                             "wb",
+                             compression=NO_COMPRESSION) as fp:
+            fp.write(offsets.to_numpy().tobytes())
+        return len(offsets) - 1
+
+    @classmethod
+    def get(cls,
+            path: str,
+            k: int,
+            mapping_class: Optional[Type[T]] = None,
+            allow_pickle: bool = False) -> T | Any:
+        """read one record in O(1) with the offset index
+
+        :param path: the record file
+        :param k: the record number (starting at 0)
+        :param mapping_class: the output class of msgpack records, not allowed with pickle that restores the original classes (default: None)
+        :param allow_pickle: if True, read pickle files (only from trusted sources) (default: False)
+        :return: the object
+        """
+        if k < 0:
+            raise IndexError(f"Records.get index {k} out of range")
+        with smart_open.open(cls.index_path(path),
+                             "rb",
+                             compression=NO_COMPRESSION) as fp:
+            fp.seek(8 * k)
+            bounds = np.frombuffer(fp.read(16), dtype="<u8")
+        if len(bounds) < 2:
+            raise IndexError(f"Records.get index {k} out of range")
+        start, end = int(bounds[0]), int(bounds[1])
+        with smart_open.open(path, "rb", compression=NO_COMPRESSION) as fp:
+            serializer = cls._read_header(fp, path, allow_pickle,
+                                          mapping_class)
+            fp.seek(start + LENGTH.size)
+            payload = fp.read(end - start - LENGTH.size)
+        return _unpack(payload, serializer, mapping_class)
+
+    @classmethod
+    def iter_read(cls,
+                  path: str,
+                  mapping_class: Optional[Type[T]] = None,
+                  offset: int = 0,
+                  limit: Optional[int] = None,
+                  tqdm_kwargs: Optional[dict] = None,
+                  allow_pickle: bool = False) -> Iterator[T | Any]:
+        """lazily read the records of a file
+
+        :param path: the record file
+        :param mapping_class: the output class of msgpack records, not allowed with pickle that restores the original classes (default: None)
+        :param offset: skip the first `offset` records seeking with the index (default: 0)
+        :param limit: if defined, yield at most `limit` objects (default: None)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar (default: None)
+        :param allow_pickle: if True, read pickle files (only from trusted sources) (default: False)
+        :return: the generator of objects
+        """
+        offsets = cls.offsets(path)
+        n = len(offsets) - 1
+        end = n if limit is None else min(n, offset + limit)
+        tqdm_kwargs = {
+            **{
+                "desc": f"records_read('{path}')",
+                "total": max(end - offset, 0)
+            },
+            **tqdm_kwargs
+        } if tqdm_kwargs is not None else None
+        pbar = tqdm(**tqdm_kwargs) if tqdm_kwargs is not None else None
+
+        with smart_open.open(path, "rb", compression=NO_COMPRESSION) as fp:
+            serializer = cls._read_header(fp, path, allow_pickle,
+                                          mapping_class)
+            if offset < end:
+                fp.seek(int(offsets[offset]))
+            for _ in range(offset, end):
+                (length, ) = LENGTH.unpack(fp.read(LENGTH.size))
+                _ = pbar.update() if pbar is not None else None
+                yield _unpack(fp.read(length), serializer, mapping_class)
+
+    @classmethod
+    def read(cls,
+             path: str,
+             mapping_class: Optional[Type[T]] = None,
+             offset: int = 0,
+             limit: Optional[int] = None,
+             tqdm_kwargs: Optional[dict] = None,
+             allow_pickle: bool = False) -> list[T | Any]:
+        """read the records of a file, see `iter_read`
+
+        :param path: the record file
+        :param mapping_class: the output class of msgpack records, not allowed with pickle that restores the original classes (default: None)
+        :param offset: skip the first `offset` records seeking with the index (default: 0)
+        :param limit: if defined, return at most `limit` objects (default: None)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar (default: None)
+        :param allow_pickle: if True, read pickle files (only from trusted sources) (default: False)
+        :return: the list of objects
+        """
+        return list(
+            cls.iter_read(path,
+                          mapping_class=mapping_class,
+                          offset=offset,
+                          limit=limit,
+                          tqdm_kwargs=tqdm_kwargs,
+                          allow_pickle=allow_pickle))
+
+    @classmethod
+    def parallel_read(cls,
+                      path: str,
+                      mapping_class: Optional[Type[T]] = None,
+                      offset: int = 0,
+                      limit: Optional[int] = None,
+                      workers: Optional[int] = None,
+                      tqdm_kwargs: Optional[dict] = None,
+                      allow_pickle: bool = False) -> list[T | Any]:
+        """read the records of a file in parallel
+        the records are split in `workers` contiguous ranges with the offset index and
+        every worker reads its byte range at once and deserializes it.
+
+        :param path: the record file
+        :param mapping_class: the output class of msgpack records, not allowed with pickle that restores the original classes (default: None)
+        :param offset: skip the first `offset` records (default: 0)
+        :param limit: if defined, return at most `limit` objects (default: None)
+        :param workers: the number of parallel jobs, if None use the number of cpus (default: None)
+        :param tqdm_kwargs: if defined, at least {}, display a progress bar with the read ranges (default: None)
+        :param allow_pickle: if True, read pickle files (only from trusted sources) (default: False)
+        :return: the list of objects in file order
+        """
+        workers = workers if workers is not None else cpu_count()
+        offsets = cls.offsets(path)
+        n = len(offsets) - 1
+        end = n if limit is None else min(n, offset + limit)
+        if offset >= end:
+            return []
+        with smart_open.open(path, "rb", compression=NO_COMPRESSION) as fp:
+            serializer = cls._read_header(fp, path, allow_pickle,
+                                          mapping_class)
+
+        # 1. split the records in ranges of bytes
+        ranges = split_range_ab(offset, end, min(end - offset, workers))
+        parameters = [(path, int(offsets[a]), int(offsets[b]), mapping_class)
+                      for a, b in ranges]
+        tqdm_kwargs = {
+            **{
+                "total": len(parameters),
+                "desc": f"reading records at {workers}x"
+            },
+            **tqdm_kwargs
+        } if tqdm_kwargs is not None else None
+
+        # 2. read and deserialize every range in parallel
+        with Pool(workers) as pool:
+            list_of_objects = pool.imap(
+                partial(_read_byte_range, serializer=serializer), parameters)
+            list_of_objects = tqdm(
+                list_of_objects, **
+                tqdm_kwargs) if tqdm_kwargs is not None else list_of_objects
+            objects = [x for xs in list_of_objects for x in xs]
+        return objects
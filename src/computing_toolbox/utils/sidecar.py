@@ -0,0 +1,163 @@
+"""json sidecar files
+small json files stored next to a data file (`path + EXTENSION` by default) with data derived
+from it (line indexes, gzip member indexes, processing checkpoints, ...). the sidecar keeps
+the size and modification time of the data file and it is stale when they change: `load` and
+`get` ignore and rebuild the stale indexes, while a checkpoint can reject it with `is_current`.
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+import smart_open
+from google.api_core.exceptions import GoogleAPICallError, NotFound
+
+from computing_toolbox.gcp.gs import Gs
+
+
+def file_stat(path: str) -> dict:
+    """get the size and modification time of a local or gs:// file
+
+    :param path: the file path
+    :return: a dictionary with the keys "size" and "mtime"
+    """
+    if path.startswith("gs://"):
+        return Gs.stat(path)
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def read_json(path: str) -> Optional[Any]:
+    """read a small json file (local or gs://)
+
+    :param path: the file path
+    :return: the decoded content or None if the file doesn't exist or is not valid json
+    """
+    try:
+        with smart_open.open(path) as fp:
+            return json.loads(fp.read())
+    except (OSError, ValueError, NotFound):
+        # smart_open raises google's NotFound (not an OSError) for missing gs:// objects
+        return None
+
+
+class Sidecar(ABC):
+    """base class of the json sidecar files of a data file
+    the subclasses define `EXTENSION`, `VERSION`, `build`, `to_dict` and `from_dict`
+    """
+
+    # sidecar file extension
+    EXTENSION: str = ".sidecar"
+    # version of the sidecar file format
+    VERSION: int = 1
+
+    def __init__(self,
+                 path: str,
+                 size: int,
+                 mtime: float,
+                 sidecar_path: Optional[str] = None):
+        """sidecar of a data file
+
+        :param path: the data file
+        :param size: the data file size in bytes
+        :param mtime: the data file modification time
+        :param sidecar_path: the sidecar file, None for `index_path(path)` (default: None)
+        """
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.sidecar_path = sidecar_path if sidecar_path is not None else self.index_path(
+            path)
+
+    @classmethod
+    def index_path(cls, path: str) -> str:
+        """the sidecar path of `path`"""
+        return path + cls.EXTENSION
+
+    @classmethod
+    @abstractmethod
+    def build(cls, path: str) -> "Sidecar":
+        """scan the data file and build its sidecar (it is not saved)"""
+
+    @abstractmethod
+    def to_dict(self) -> dict:
+        """the fields of the sidecar, besides the version and the file signature"""
+
+    @classmethod
+    @abstractmethod
+    def from_dict(cls, path: str, data: dict) -> "Sidecar":
+        """build the sidecar of `path` from the content of its file"""
+
+    def save(self) -> "Sidecar":
+        """write the sidecar file, local files are replaced atomically"""
+        data = {
+            "version": self.VERSION,
+            "size": self.size,
+            "mtime": self.mtime,
+            **self.to_dict()
+        }
+        is_local = "://" not in self.sidecar_path
+        path = self.sidecar_path + ".tmp" if is_local else self.sidecar_path
+        with smart_open.open(path, "w") as fp:
+            fp.write(json.dumps(data))
+        _ = os.replace(path, self.sidecar_path) if is_local else None
+        return self
+
+    def is_current(self, stat: Optional[dict] = None) -> bool:
+        """test if the sidecar belongs to the current data file (same size and modification time)
+
+        :param stat: the `file_stat` of the data file, None to get it (default: None)
+        :return: True if the sidecar is not stale
+        """
+        stat = stat if stat is not None else file_stat(self.path)
+        return (self.size, self.mtime) == (stat["size"], stat["mtime"])
+
+    @classmethod
+    def read(cls,
+             path: str,
+             sidecar_path: Optional[str] = None) -> Optional["Sidecar"]:
+        """read the sidecar file of `path` without checking if it is stale
+
+        :param path: the data file
+        :param sidecar_path: the sidecar file, None for `index_path(path)` (default: None)
+        :return: the sidecar or None if it doesn't exist or has another version
+        """
+        sidecar_path = sidecar_path if sidecar_path is not None else cls.index_path(
+            path)
+        data = read_json(sidecar_path)
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            return None
+        sidecar = cls.from_dict(path, data)
+        sidecar.sidecar_path = sidecar_path
+        return sidecar
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Sidecar"]:
+        """load the sidecar of `path`
+
+        :param path: the data file
+        :return: the sidecar or None if it doesn't exist or is stale
+                 (the file size or modification time changed)
+        """
+        sidecar = cls.read(path)
+        return sidecar if sidecar is not None and sidecar.is_current(
+        ) else None
+
+    @classmethod
+    def get(cls, path: str, **kwargs) -> "Sidecar":
+        """load the sidecar of `path` or build and save it if it doesn't exist or is stale,
+        the sidecar is only an optimization, so it is used from memory if it can't be saved
+        (read-only directory, bucket without write access, ...)
+
+        :param path: the data file
+        :param kwargs: the parameters of `build`
+        :return: the sidecar
+        """
+        sidecar = cls.load(path)
+        if sidecar is None:
+            sidecar = cls.build(path, **kwargs)
+            try:
+                sidecar.save()
+            except (OSError, GoogleAPICallError):
+                pass
+        return sidecar
@@ -0,0 +1,57 @@
+"""shared fixtures of the tests"""
+import os
+
+import pytest
+import smart_open
+from google.api_core.exceptions import NotFound
+
+from computing_toolbox.gcp.gs import Gs
+
+
+@pytest.fixture
+def fake_gs(tmp_path, monkeypatch):
+    """emulate gs:// paths with local files under `tmp_path/gs`
+    reading a missing object raises google's NotFound, as smart_open does
+    """
+    root = os.path.join(tmp_path, "gs")
+    real_open = smart_open.open
+
+    def local_path(path: str) -> str:
+        return os.path.join(
+            root, path[len("gs://"):]) if path.startswith("gs://") else path
+
+    def fake_open(path, mode="r", **kwargs):
+        if path.startswith("gs://") and "r" in mode and not os.path.exists(
+                local_path(path)):
+            raise NotFound(f"'{path}' not found")
+        os.makedirs(os.path.dirname(local_path(path)), exist_ok=True)
+        return real_open(local_path(path), mode, **kwargs)
+
+    def fake_stat(path: str) -> dict:
+        if not os.path.exists(local_path(path)):
+            raise FileNotFoundError(path)
+        stat = os.stat(local_path(path))
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    monkeypatch.setattr(smart_open, "open", fake_open)
+    monkeypatch.setattr(Gs, "stat", fake_stat)
+    return local_path
+
+
+@pytest.fixture
+def read_only(monkeypatch):
+    """make smart_open.open raise an error when a file is opened for writing
+    the fixture returns the function that sets the error (default: PermissionError)
+    """
+    real_open = smart_open.open
+
+    def set_error(error: Exception = PermissionError(13, "Permission denied")):
+
+        def read_only_open(path, mode="r", **kwargs):
+            if "w" in mode:
+                raise error
+            return real_open(path, mode, **kwargs)
+
+        monkeypatch.setattr(smart_open, "open", read_only_open)
+
+    return set_error
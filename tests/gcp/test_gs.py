@@ -1,6 +1,9 @@
 """Test Gs class for Google cloud storage"""
+from datetime import datetime, timezone
 from unittest.mock import patch, Mock
 
+import pytest
+
 from computing_toolbox.gcp.gs import Gs
 
 
@@ -100,3 +103,34 @@ class TestGS:
         path = "gs://my-bucket/dir1/dir2/file.txt"
         response = Gs.rm(path)
         assert response is False
+
+    @patch("computing_toolbox.gcp.gs.storage")
+    def test_stat(self, mock_storage):
+        """test the size and mtime of an object"""
+        # 1. mocking an existing blob
+        mock_blob = Mock()
+        mock_blob.size = 123
+        mock_blob.updated = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        mock_get_blob = mock_storage.Client.return_value.bucket.return_value.get_blob
+        mock_get_blob.return_value = mock_blob
+        stat = Gs.stat("gs://my-bucket/dir1/file.jsonl")
+        assert stat == {"size": 123, "mtime": mock_blob.updated.timestamp()}
+
+        # 2. mocking a non existing blob
+        mock_get_blob.return_value = None
+        with pytest.raises(FileNotFoundError):
+            _ = Gs.stat("gs://my-bucket/dir1/missing.jsonl")
+
+    @patch("computing_toolbox.gcp.gs.storage")
+    def test_rename(self, mock_storage):
+        """test how to rename an object"""
+        # 1. rename inside the same bucket
+        new_path = Gs.rename("gs://my-bucket/dir1/a.txt",
+                             "gs://my-bucket/dir2/b.txt")
+        assert new_path == "gs://my-bucket/dir2/b.txt"
+        mock_bucket = mock_storage.Client.return_value.bucket.return_value
+        assert mock_bucket.rename_blob.call_args.args[1] == "dir2/b.txt"
+
+        # 2. rename across buckets is not supported
+        with pytest.raises(ValueError):
+            _ = Gs.rename("gs://my-bucket/a.txt", "gs://other-bucket/a.txt")
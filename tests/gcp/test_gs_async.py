@@ -1,7 +1,9 @@
 """testing the gs_async.py file"""
-from unittest.mock import patch
+import asyncio
+from unittest.mock import patch, AsyncMock
 import gcloud.aio.storage
 from computing_toolbox.gcp.gs_async import GsAsync
+from computing_toolbox.utils.compression import decompress
 
 
 @patch("computing_toolbox.gcp.gs_async.Storage")
@@ -44,6 +46,48 @@ def test_read_bad(mock_storage):
     assert all(x is None for x in data)
 
 
+@patch("computing_toolbox.gcp.gs_async.Storage")
+def test_read_bytes(mock_storage):
+    """test file reading as strings or as bytes"""
+    client = mock_storage.return_value.__aenter__.return_value
+    client.download = AsyncMock(return_value=b"hello")
+
+    files = ["gs://file/1", "gs://file/2"]
+    assert GsAsync.read(files) == ["hello", "hello"]
+    assert GsAsync.read(files, decode=False) == [b"hello", b"hello"]
+
+
+@patch("computing_toolbox.gcp.gs_async.Storage")
+def test_aread(mock_storage):
+    """test the read coroutine inside a running event loop"""
+    client = mock_storage.return_value.__aenter__.return_value
+    client.download = AsyncMock(return_value=b"hello")
+
+    files = ["gs://file/1", "gs://file/2", "gs://file/3"]
+
+    async def main():
+        return await GsAsync.aread(files, batch_size=2)
+
+    assert asyncio.run(main()) == ["hello", "hello", "hello"]
+    assert client.download.call_count == 3
+
+
+@patch("computing_toolbox.gcp.gs_async.Storage")
+def test_read_write_compressed(mock_storage):
+    """test the content is compressed and decompressed given the path extension"""
+    client = mock_storage.return_value.__aenter__.return_value
+    client.upload = AsyncMock(return_value={"size": 10})
+
+    for extension in [".gz", ".zst", ".lz4"]:
+        path = f"gs://bucket/file.txt{extension}"
+        assert GsAsync.write([path], ["hello"]) == [10]
+        content = client.upload.call_args.args[2]
+        assert content != b"hello" and decompress(content, path) == b"hello"
+
+        client.download = AsyncMock(return_value=content)
+        assert GsAsync.read([path]) == ["hello"]
+
+
 @patch("computing_toolbox.gcp.gs_async.Storage")
 def test_write_ok(mock_storage):
     """test file writing, this case test for good results"""
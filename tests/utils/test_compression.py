@@ -0,0 +1,119 @@
+"""test the compression module"""
+import multiprocessing
+import os
+from unittest.mock import patch
+
+import pytest
+import smart_open
+
+from computing_toolbox.utils import jsonl_files, jsonl_sort
+from computing_toolbox.utils.compression import COMPRESSION_LEVELS, compress, decompress, get_extension, \
+    is_compressed_path
+from computing_toolbox.utils.jsonl import Jsonl
+
+
+def test_get_extension():
+    """test the extension is taken in lower case"""
+    assert get_extension("gs://bucket/file.jsonl.ZST") == ".zst"
+    assert get_extension("/path/to/file.jsonl") == ".jsonl"
+    assert get_extension("/path/to/file") == ""
+
+
+def test_is_compressed_path():
+    """test the known compression extensions"""
+    for extension in [".gz", ".bz2", ".zst", ".lz4"]:
+        assert is_compressed_path(f"file.jsonl{extension}")
+    assert not is_compressed_path("file.jsonl")
+
+
+@pytest.mark.parametrize("extension", [".gz", ".bz2", ".zst", ".lz4"])
+def test_compress_decompress(extension):
+    """test the compression round trip of every format"""
+    path = f"file.jsonl{extension}"
+    data = b'{"k": 1}\n' * 1000
+    compressed = compress(data, path)
+    assert len(compressed) < len(data)
+    assert decompress(compressed, path) == data
+    # an explicit compression level
+    assert decompress(compress(data, path, level=1), path) == data
+
+
+def test_compress_passthrough():
+    """test unknown extensions are not compressed"""
+    assert compress(b"hello", "file.txt") == b"hello"
+    assert decompress(b"hello", "file.txt") == b"hello"
+
+
+def test_decompress_zst_frames():
+    """test a zstandard file with many frames is fully decompressed"""
+    path = "file.jsonl.zst"
+    compressed = compress(b"hello, ", path) + compress(b"world", path)
+    assert decompress(compressed, path) == b"hello, world"
+
+
+@pytest.mark.parametrize("extension", [".zst", ".lz4"])
+def test_smart_open(tmp_path, extension):
+    """test smart_open reads and writes the registered formats"""
+    path = os.path.join(tmp_path, f"file.txt{extension}")
+    with smart_open.open(path, "w") as fp:
+        fp.write("hello\nworld\n")
+    with open(path, "rb") as fp:
+        assert decompress(fp.read(), path) == b"hello\nworld\n"
+    with smart_open.open(path) as fp:
+        assert fp.read() == "hello\nworld\n"
+
+
+@pytest.mark.parametrize("extension,levels", [(".gz", [1, 9]),
+                                              (".bz2", [1, 9]),
+                                              (".zst", [1, 19])])
+def test_smart_open_level(tmp_path, extension, levels):
+    """test the written files use the configured compression level"""
+    data = "".join(f'{{"k": {k}, "v": "{k % 7}"}}\n' for k in range(10000))
+    sizes = []
+    for level in levels:
+        path = os.path.join(tmp_path, f"level-{level}.jsonl{extension}")
+        with patch.dict(COMPRESSION_LEVELS, {extension: level}):
+            with smart_open.open(path, "w") as fp:
+                fp.write(data)
+        sizes.append(os.path.getsize(path))
+        with smart_open.open(path) as fp:
+            assert fp.read() == data
+    # the built-in handlers ignored the level and wrote the same bytes
+    assert sizes[0] != sizes[1]
+
+
+def test_levels_in_spawned_workers(tmp_path, monkeypatch):
+    """test the workers use the levels of the parent process with the spawn start method"""
+    spawn_pool = multiprocessing.get_context("spawn").Pool
+    monkeypatch.setattr(jsonl_files, "Pool", spawn_pool)
+    monkeypatch.setattr(jsonl_sort, "Pool", spawn_pool)
+    data = [{"k": k, "text": f"value {k % 97} " * 5} for k in range(3000)]
+
+    # 1. the shards of write_sharded
+    sizes = {}
+    for level in [1, 9]:
+        monkeypatch.setitem(COMPRESSION_LEVELS, ".gz", level)
+        paths = Jsonl.write_sharded(os.path.join(tmp_path, f"level{level}"),
+                                    data,
+                                    workers=2)
+        sizes[level] = os.path.getsize(paths[0])
+        assert Jsonl.read(paths[0]) == data
+    assert sizes[1] != sizes[9]
+
+    # 2. the runs of sort (merged in the parent process)
+    path = os.path.join(tmp_path, "data.jsonl")
+    Jsonl.write(path, data)
+    iter_run, run_sizes = jsonl_sort._iter_run, {}
+
+    def iter_run_recorder(run_path):
+        run_sizes[COMPRESSION_LEVELS[".lz4"]] = os.path.getsize(run_path)
+        return iter_run(run_path)
+
+    monkeypatch.setattr(jsonl_sort, "_iter_run", iter_run_recorder)
+    for level in [0, 12]:
+        monkeypatch.setitem(COMPRESSION_LEVELS, ".lz4", level)
+        Jsonl.sort(path,
+                   os.path.join(tmp_path, "sorted.jsonl"),
+                   key=["k"],
+                   workers=2)
+    assert run_sizes[0] != run_sizes[12]
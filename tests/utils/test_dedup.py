@@ -1,5 +1,14 @@
 """test the dedup function"""
-from computing_toolbox.utils.dedup import dedup
+import os
+from dataclasses import dataclass
+
+from computing_toolbox.utils.dedup import DedupFilter, DigestSet, dedup
+
+
+@dataclass
+class Point:
+    """an object with a key"""
+    x: int
 
 
 def test_dedup():
@@ -18,3 +27,69 @@ def test_dedup():
     #2. compact
     x = dedup([1] * 100)
     assert x == [1]
+
+
+def test_dedup_filter():
+    """test the streaming filter of duplicated documents"""
+    documents = [{
+        "id": k % 3,
+        "user": {
+            "name": f"u{k % 2}"
+        }
+    } for k in range(6)]
+
+    # 1. one key, a deep_get path and many keys
+    with DedupFilter(["id"]) as dedup_filter:
+        assert [x["id"] for x in documents
+                if dedup_filter.is_new(x)] == [0, 1, 2]
+        assert dedup_filter.n_duplicates == 3
+    with DedupFilter([["user", "name"]]) as dedup_filter:
+        assert sum(dedup_filter.is_new(x) for x in documents) == 2
+    with DedupFilter(["id", ["user", "name"]]) as dedup_filter:
+        assert sum(dedup_filter.is_new(x) for x in documents) == 6
+
+    # 2. without key every document is new
+    with DedupFilter() as dedup_filter:
+        assert all(dedup_filter.is_new(x) for x in documents + documents)
+
+    # 3. objects are compared by their json representation
+    with DedupFilter(["x"]) as dedup_filter:
+        assert [
+            dedup_filter.is_new(x)
+            for x in [Point(1), Point(2), Point(1)]
+        ] == [True, True, False]
+
+
+def test_dedup_filter_spill(tmp_path):
+    """test the digests are spilled to disk"""
+    documents = [{"id": k % 50} for k in range(200)]
+    with DedupFilter(["id"], spill_dir=str(tmp_path),
+                     max_memory_keys=10) as dedup_filter:
+        assert [x["id"] for x in documents
+                if dedup_filter.is_new(x)] == list(range(50))
+        assert len(os.listdir(tmp_path)) == 1
+    assert not os.listdir(tmp_path)
+
+
+def test_digest_set(monkeypatch):
+    """test the digests are merged in the sorted array"""
+    monkeypatch.setattr(DigestSet, "MIN_BUFFER_SIZE", 4)
+    digests = DigestSet()
+    values = [5, -3, 2**63 - 1, -2**63, 0, 7, 1, 9, 2, 8]
+    assert all(digests.add(x) for x in values)
+    assert not any(digests.add(x) for x in values)
+    assert len(digests) == len(values)
+    assert digests._sorted.tolist() == sorted(values[:8])
+    assert sorted(digests) == sorted(values)
+    assert 3 not in digests and 2**62 not in digests
+
+    digests.clear()
+    assert len(digests) == 0 and -3 not in digests
+
+
+def test_dedup_filter_collision(monkeypatch):
+    """test the distinct keys with the same digest are taken as duplicates"""
+    monkeypatch.setattr(DedupFilter, "digest", lambda self, document: 1)
+    with DedupFilter(["id"]) as dedup_filter:
+        assert [dedup_filter.is_new({"id": k})
+                for k in range(3)] == [True, False, False]
@@ -1,14 +1,29 @@
 """test jsonl file"""
+import gzip
 import json
 import os
+import types
 from dataclasses import dataclass, asdict
 from datetime import date, timedelta
+from multiprocessing import Pool
 from unittest.mock import patch
 
 import jsons
+import pytest
 
-from computing_toolbox.utils.jsonl import Jsonl, _jsonl_parse_one_line, _jsonl_dumps_one_object, _split_str, \
-    _parse_documents
+from computing_toolbox.utils.jsonl_codec import CODECS
+from computing_toolbox.utils.jsonl import Jsonl
+from computing_toolbox.utils.jsonl_query import JsonlQuery
+from computing_toolbox.utils.jsonl_workers import _jsonl_parse_one_line, _jsonl_dumps_one_object, \
+    _jsonl_parse_chunk, _jsonl_dumps_chunk, _imap_bounded, _jsonl_parse_byte_range, \
+    _count_newlines_in_range, _iter_shards, _write_shard, _read_documents, _shared_memory_block, _jsonl_parse_shared
+from computing_toolbox.utils.jsonl_gzip import GzipMemberIndex
+from computing_toolbox.utils.lazy_pool import LazyPool
+
+# parallel read modes able to read plain text files
+PLAIN_TEXT_MODES = [
+    x for x in Jsonl.PARALLEL_READ_MODES if x != "gzip_members"
+]
 
 
 def test_write_read_and_count_lines(tmp_path):
@@ -102,6 +117,59 @@ def test_offset_limit_with_class(tmp_path):
     assert data_y.k == expected_n
 
 
+def test_iter_read_and_iter_batches(tmp_path):
+    """test how to read lazily a file one document or one batch at a time"""
+    # A. write the data
+    expected_n: int = 10
+    expected_data = [{"k": k + 1, "name": "foo"} for k in range(expected_n)]
+    path = str(tmp_path / "counter.jsonl")
+    Jsonl.write(path, expected_data)
+
+    # B. iter_read should be a generator returning the same documents
+    documents = Jsonl.iter_read(path)
+    assert isinstance(documents, types.GeneratorType)
+    assert list(documents) == expected_data
+    documents = Jsonl.iter_read(path, offset=3, limit=4, tqdm_kwargs={})
+    assert list(documents) == expected_data[3:7]
+
+    # C. read in batches of size 4 (last batch is smaller)
+    batches = list(Jsonl.iter_batches(path, batch_size=4))
+    assert [len(x) for x in batches] == [4, 4, 2]
+    assert sum(batches, []) == expected_data
+    # C.1 iter_read with batch_size is an alias of iter_batches
+    batches = list(Jsonl.iter_read(path, offset=2, batch_size=5))
+    assert batches == [expected_data[2:7], expected_data[7:]]
+
+    # D. invalid batch size
+    with pytest.raises(ValueError):
+        _ = list(Jsonl.iter_batches(path, batch_size=0))
+
+
+def test_write_generator_with_small_buffer(tmp_path):
+    """test how to write any iterable flushing the buffer many times"""
+    expected_data = [{"k": k, "name": "foo"} for k in range(20)]
+    path = str(tmp_path / "generator.jsonl")
+
+    # 1. write a generator with a buffer smaller than the lines
+    n = Jsonl.write(path, (x for x in expected_data),
+                    buffer_size=30,
+                    tqdm_kwargs={})
+    assert n == len(expected_data)
+    assert Jsonl.read(path) == expected_data
+
+    # 2. append another generator
+    n = Jsonl.write(path,
+                    iter(expected_data[:3]),
+                    append_mode=True,
+                    buffer_size=1)
+    assert n == 3
+    assert Jsonl.read(path) == expected_data + expected_data[:3]
+
+    # 3. an empty generator creates an empty file
+    assert Jsonl.write(path, iter([])) == 0
+    assert Jsonl.count_lines(path) == 0
+
+
 def test__jsonl_parse_one_line():
     expected_data = MyCounter(k=66, name="foo", date=date.today())
     expected_data_as_str = jsons.dumps(asdict(expected_data))
@@ -121,6 +189,185 @@ def test_parallel_read():
     assert len(numbers1) == 8
 
 
+def test_parallel_read_chunks_mode(tmp_path):
+    """test the pipelined parallel read"""
+    # A. write the data
+    expected_data = [{"k": k, "name": "foo"} for k in range(25)]
+    path = str(tmp_path / "chunks.jsonl")
+    Jsonl.write(path, expected_data)
+
+    # B. read the whole file in chunks of 4 lines
+    data = Jsonl.parallel_read(path, workers=2, mode="chunks", chunk_size=4)
+    assert data == expected_data
+    # C. read with offset and limit and a progress bar
+    documents = Jsonl.parallel_iter_read(path,
+                                         offset=5,
+                                         limit=12,
+                                         workers=2,
+                                         chunk_size=5,
+                                         tqdm_kwargs={})
+    assert isinstance(documents, types.GeneratorType)
+    assert list(documents) == expected_data[5:17]
+
+    # D. bad parameters
+    with pytest.raises(ValueError):
+        _ = Jsonl.parallel_read(path, mode="unknown")
+    with pytest.raises(ValueError):
+        _ = list(Jsonl.parallel_iter_read(path, chunk_size=0))
+
+
+def test_dumps_chunk():
+    """test the function used to dumps a chunk of objects"""
+    assert _jsonl_dumps_chunk([{
+        "k": 1
+    }, {
+        "k": 2
+    }]) == (2, '{"k": 1}\n{"k": 2}')
+    assert _jsonl_dumps_chunk([]) == (0, "")
+
+
+def test_parse_chunk():
+    """test the function used to parse a chunk of lines"""
+    text = '{"k": 1}\n{"k": 2}\n'
+    documents = _jsonl_parse_chunk((text, None))
+    assert documents == [{"k": 1}, {"k": 2}]
+
+
+def test_imap_bounded():
+    """test the ordered imap with bounded number of pending tasks"""
+    with Pool(2) as pool:
+        results = list(_imap_bounded(pool, abs, range(-10, 0), 3))
+    assert results == [abs(x) for x in range(-10, 0)]
+
+
+def test_parallel_read_byte_ranges_mode(tmp_path):
+    """test the parallel read splitting the file in byte ranges"""
+    # A. write documents of different sizes
+    expected_data = [{"k": k, "name": "x" * (k % 7)} for k in range(50)]
+    path = str(tmp_path / "ranges.jsonl")
+    Jsonl.write(path, expected_data)
+
+    # B. read the file by byte ranges
+    data = Jsonl.parallel_read(path, workers=3, mode="byte_ranges")
+    assert data == expected_data
+    data = Jsonl.parallel_read(path,
+                               workers=2,
+                               mode="byte_ranges",
+                               tqdm_kwargs={})
+    assert data == expected_data
+
+    # C. an empty file has no documents
+    empty_path = str(tmp_path / "empty.jsonl")
+    Jsonl.write(empty_path, [])
+    assert not Jsonl.parallel_read(empty_path, mode="byte_ranges")
+
+    # D. compressed files or offset/limit are not supported
+    with pytest.raises(ValueError):
+        _ = Jsonl.parallel_read(str(tmp_path / "ranges.jsonl.gz"),
+                                mode="byte_ranges")
+    with pytest.raises(ValueError):
+        _ = Jsonl.parallel_read(path, offset=1, mode="byte_ranges")
+
+
+def test_parse_byte_range(tmp_path):
+    """test every line is parsed by exactly one byte range"""
+    path = str(tmp_path / "ranges.jsonl")
+    with open(path, "w", encoding="utf8") as fp:
+        fp.write('{"k": 1}\n{"k": 2}\n\n{"k": 3}\n')
+    size = os.path.getsize(path)
+    for cut in range(size + 1):
+        first = _jsonl_parse_byte_range((path, 0, cut, None))
+        second = _jsonl_parse_byte_range((path, cut, size + 10, None))
+        assert first + second == [{"k": 1}, {"k": 2}, {"k": 3}]
+
+
+def test_read_with_index(tmp_path):
+    """test offset reads seeking with the sidecar line index"""
+    expected_data = [{"k": k, "name": "x" * (k % 5)} for k in range(30)]
+    path = str(tmp_path / "indexed.jsonl")
+    Jsonl.write(path, expected_data)
+
+    # A. the index is built on the first indexed read
+    assert not os.path.exists(path + ".idx")
+    data = Jsonl.read(path, offset=17, limit=5, use_index=True)
+    assert data == expected_data[17:22]
+    assert os.path.exists(path + ".idx")
+
+    # B. explicit build and reads with every reader
+    index = Jsonl.build_index(path, every=4)
+    assert index.every == 4
+    data = Jsonl.read(path, offset=9, use_index=True, tqdm_kwargs={})
+    assert data == expected_data[9:]
+    batches = list(
+        Jsonl.iter_read(path, offset=8, batch_size=10, use_index=True))
+    assert batches == [
+        expected_data[8:18], expected_data[18:28], expected_data[28:]
+    ]
+    data = Jsonl.parallel_read(path, offset=13, workers=2, use_index=True)
+    assert data == expected_data[13:]
+    data = Jsonl.parallel_read(path,
+                               offset=13,
+                               limit=3,
+                               workers=2,
+                               mode="chunks",
+                               use_index=True)
+    assert data == expected_data[13:16]
+    assert not Jsonl.read(path, offset=100, use_index=True)
+
+
+def test_count_lines(tmp_path):
+    """test every strategy to count lines gives the same result as the text iteration"""
+    contents = ["", "\n", "a", "a\n", "a\nb", "a\nb\n", "\n\na\n\nbc"]
+    for k, content in enumerate(contents):
+        path = str(tmp_path / f"file-{k}.jsonl")
+        with open(path, "w", encoding="utf8") as fp:
+            fp.write(content)
+        with open(path, "r", encoding="utf8") as fp:
+            expected_n = len(fp.readlines())
+        assert Jsonl.count_lines(path) == expected_n
+        assert Jsonl.count_lines(path, buffer_size=2) == expected_n
+        assert Jsonl.count_lines(path, use_mmap=True,
+                                 buffer_size=3) == expected_n
+        assert Jsonl.count_lines(path,
+                                 workers=2,
+                                 buffer_size=2,
+                                 tqdm_kwargs={}) == expected_n
+
+    # compressed files are counted sequentially
+    path = str(tmp_path / "file.jsonl.gz")
+    Jsonl.write(path, [{"k": k} for k in range(7)])
+    assert Jsonl.count_lines(path, workers=2, use_mmap=True,
+                             tqdm_kwargs={}) == 7
+
+
+def test_count_newlines_in_range(tmp_path):
+    """test the count of new lines in a byte range"""
+    path = tmp_path / "file.jsonl"
+    path.write_text("a\nbb\nccc\n")
+    assert _count_newlines_in_range((str(path), 0, 9, 2)) == 3
+    assert _count_newlines_in_range((str(path), 2, 6, 3)) == 1
+
+
+def test_write_and_read_with_codecs(tmp_path):
+    """test every json codec writes and reads the same documents"""
+    expected_data = [{
+        "k": k,
+        "name": "foo",
+        "values": [k, None]
+    } for k in range(12)]
+    for codec in CODECS:
+        path = str(tmp_path / f"{codec}.jsonl")
+        Jsonl.write(path, expected_data, codec=codec)
+        assert Jsonl.read(path, codec=codec) == expected_data
+        for mode in PLAIN_TEXT_MODES:
+            data = Jsonl.parallel_read(path, workers=2, mode=mode, codec=codec)
+            assert data == expected_data
+
+        path = str(tmp_path / f"{codec}-parallel.jsonl")
+        Jsonl.parallel_write(path, expected_data, workers=2, codec=codec)
+        assert Jsonl.read(path) == expected_data
+
+
 def test_dumps_one_object():
     """test the function used in parallel write"""
     data = {"name": "foo", "value": "bar", "n": 10}
@@ -155,37 +402,38 @@ def test_parallel_write(tmp_path):
     }]
 
     assert not os.path.exists(path)
-    n_bytes = Jsonl.parallel_write(path=path, data=fibs, tqdm_kwargs={})
+    n = Jsonl.parallel_write(path=path, data=fibs, tqdm_kwargs={})
     assert os.path.exists(path)
-    assert n_bytes > 0
+    assert n == len(fibs)
     data = Jsonl.read(path)
     assert data == fibs
 
-    n_bytes = Jsonl.parallel_write(path=path, data=fibs)
+    n = Jsonl.parallel_write(path=path, data=fibs)
     assert os.path.exists(path)
-    assert n_bytes > 0
+    assert n == len(fibs)
     data = Jsonl.read(path)
     assert data == fibs
 
+    # streaming a generator in small chunks
+    n = Jsonl.parallel_write(path=path,
+                             data=(x for x in fibs),
+                             workers=2,
+                             chunk_size=2,
+                             tqdm_kwargs={})
+    assert n == len(fibs)
+    assert Jsonl.read(path) == fibs
 
-def test_split_str():
-    """test the _split_str method"""
-    content = "hello\nworld"
-    lines = _split_str(content)
-    assert lines == ["hello", "world"]
-
+    # a single object is written as one line
+    n = Jsonl.parallel_write(path=path, data=fibs[0])
+    assert n == 1
+    assert Jsonl.read(path) == fibs[:1]
 
-def test_parse_document():
-    """test the parse_document method"""
-    lines = ['{"name":"hello"}', '{"name":"world"}']
-    documents = _parse_documents(lines)
-    assert len(documents) == 2
-    assert documents[0] == {"name": "hello"}
-    assert documents[1] == {"name": "world"}
+    with pytest.raises(ValueError):
+        _ = Jsonl.parallel_write(path=path, data=fibs, chunk_size=0)
 
 
-@patch('computing_toolbox.utils.jsonl.Pool')
-@patch("computing_toolbox.utils.jsonl.GsAsync.read")
+@patch('computing_toolbox.utils.lazy_pool.Pool')
+@patch("computing_toolbox.utils.jsonl_files.GsAsync.read")
 def test_async_read_no_tqdm(async_read_mock, pool_mock):
     """test async read method"""
     # 1. load documents for testing
@@ -208,9 +456,9 @@ def test_async_read_no_tqdm(async_read_mock, pool_mock):
     expected_documents = [[json.loads(xk) for xk in x] for x in raw_lines]
     # 1.5 mock the async read method with the raw contents
     async_read_mock.return_value = raw_contents
-    # 1.6 mock the multiprocessing Pool.map with a) raw_lines and b) dictionary documents
+    # 1.6 mock the multiprocessing Pool.map with the parsed documents (split and parse in one step)
     pool_mock.return_value.__enter__.return_value.map.side_effect = [
-        raw_lines, expected_documents
+        expected_documents
     ]
     # 1.7 define what we expect from documents
     primes = [x["value"] for x in expected_documents[0]]
@@ -238,8 +486,8 @@ def test_async_read_no_tqdm(async_read_mock, pool_mock):
                for yk, fk in zip(fibos, [a["value"] for a in documents[1]]))
 
 
-@patch('computing_toolbox.utils.jsonl.Pool')
-@patch("computing_toolbox.utils.jsonl.GsAsync.read")
+@patch('computing_toolbox.utils.lazy_pool.Pool')
+@patch("computing_toolbox.utils.jsonl_files.GsAsync.read")
 def test_async_read_with_tqdm(async_read_mock, pool_mock):
     """test async read method"""
     # 1. load documents for testing
@@ -262,9 +510,9 @@ def test_async_read_with_tqdm(async_read_mock, pool_mock):
     expected_documents = [[json.loads(xk) for xk in x] for x in raw_lines]
     # 1.5 mock the async read method with the raw contents
     async_read_mock.return_value = raw_contents
-    # 1.6 mock the multiprocessing Pool.map with a) raw_lines and b) dictionary documents
+    # 1.6 mock the multiprocessing Pool.imap with the parsed documents (split and parse in one step)
     pool_mock.return_value.__enter__.return_value.imap.side_effect = [
-        raw_lines, expected_documents
+        expected_documents
     ]
     # 1.7 define what we expect from documents
     primes = [x["value"] for x in expected_documents[0]]
@@ -290,3 +538,444 @@ def test_async_read_with_tqdm(async_read_mock, pool_mock):
     assert len(documents[1]) == len(fibos)
     assert all(yk == fk
                for yk, fk in zip(fibos, [a["value"] for a in documents[1]]))
+
+
+def test_iter_shards():
+    """test how objects are grouped in shards"""
+    data = [{"k": k} for k in range(5)]
+    # 1. without limits there is only one shard
+    shards = list(_iter_shards(iter(data), None, None))
+    assert [n for n, _ in shards] == [5]
+    # 2. limited by the number of records
+    shards = list(_iter_shards(iter(data), 2, None))
+    assert [n for n, _ in shards] == [2, 2, 1]
+    assert shards[0][1] == '{"k": 0}\n{"k": 1}\n'
+    # 3. limited by bytes, every line has 9 bytes (with the new line)
+    shards = list(_iter_shards(iter(data), None, 20))
+    assert [n for n, _ in shards] == [2, 2, 1]
+    # 3.1 a line bigger than max_bytes is written alone
+    shards = list(_iter_shards(iter(data), None, 1))
+    assert [n for n, _ in shards] == [1] * 5
+    # 4. no data, no shards
+    assert not list(_iter_shards(iter([]), 2, None))
+
+
+def test_write_shard(tmp_path):
+    """test the function used to write one shard"""
+    path = os.path.join(tmp_path, "shard.jsonl.gz")
+    assert _write_shard((path, 1, '{"k": 1}\n')) == (path, 1)
+    assert Jsonl.read(path) == [{"k": 1}]
+
+
+def test_write_sharded(tmp_path):
+    """test how to write local shards"""
+    data = [{"k": k} for k in range(25)]
+    prefix = os.path.join(tmp_path, "out", "part")
+
+    # 1. write 3 shards from a generator
+    paths = Jsonl.write_sharded(prefix, (x for x in data),
+                                max_records=10,
+                                workers=2,
+                                tqdm_kwargs={})
+    assert [os.path.basename(p) for p in paths] == [
+        "part-00000-of-00003.jsonl.gz", "part-00001-of-00003.jsonl.gz",
+        "part-00002-of-00003.jsonl.gz"
+    ]
+    assert sorted(os.listdir(os.path.dirname(prefix))) == sorted(
+        os.path.basename(p) for p in paths)
+    assert [x for p in paths for x in Jsonl.read(p)] == data
+
+    # 2. uncompressed shards limited by size
+    paths = Jsonl.write_sharded(prefix, data, max_bytes=100, suffix=".jsonl")
+    assert len(paths) == 3
+    assert all(os.path.getsize(p) <= 100 for p in paths)
+    assert [x for p in paths for x in Jsonl.read(p)] == data
+
+    # 3. invalid limits
+    with pytest.raises(ValueError):
+        _ = Jsonl.write_sharded(prefix, data, max_records=0)
+
+
+@patch("computing_toolbox.utils.jsonl_files.Gs.rename")
+@patch("computing_toolbox.utils.jsonl_files.GsAsync.write")
+def test_write_sharded_gs(write_mock, rename_mock):
+    """test how to upload shards to google storage"""
+    data = [{"k": k} for k in range(5)]
+    write_mock.side_effect = lambda paths, contents, batch_size: [
+        len(c) for c in contents
+    ]
+
+    # 1. upload 3 shards, 2 at a time
+    paths = Jsonl.write_sharded("gs://bucket/dir/part",
+                                data,
+                                max_records=2,
+                                workers=2,
+                                tqdm_kwargs={})
+    assert paths == [
+        f"gs://bucket/dir/part-0000{k}-of-00003.jsonl.gz" for k in range(3)
+    ]
+    assert write_mock.call_count == 2
+    assert [c.args for c in rename_mock.call_args_list
+            ] == [(f"gs://bucket/dir/part-0000{k}.tmp.jsonl.gz", path)
+                  for k, path in enumerate(paths)]
+
+    # 2. a failed upload raises an error
+    write_mock.side_effect = lambda paths, contents, batch_size: [None]
+    with pytest.raises(OSError):
+        _ = Jsonl.write_sharded("gs://bucket/dir/part", data)
+
+
+def test_glob(tmp_path):
+    """test how to list files with a glob pattern or a prefix"""
+    for name in ["part-0.jsonl", "part-1.jsonl.gz", "other.jsonl"]:
+        Jsonl.write(os.path.join(tmp_path, name), [{"name": name}])
+
+    # 1. a glob pattern
+    paths = Jsonl.glob(os.path.join(tmp_path, "part-*.jsonl*"))
+    assert [os.path.basename(p)
+            for p in paths] == ["part-0.jsonl", "part-1.jsonl.gz"]
+    # 2. a prefix and a regex filter
+    paths = Jsonl.glob(os.path.join(tmp_path, "part-"),
+                       re_filter=r"\.gz$",
+                       tqdm_kwargs={})
+    assert [os.path.basename(p) for p in paths] == ["part-1.jsonl.gz"]
+    # 3. a directory
+    assert len(Jsonl.glob(str(tmp_path))) == 3
+    assert len(Jsonl.glob(str(tmp_path) + os.sep)) == 3
+
+
+def test_glob_segments(tmp_path, monkeypatch):
+    """test the wildcards match inside one path segment and the patterns are normalized"""
+    for name in [
+            "data/p-1.jsonl", "data/sub/p-2.jsonl", "data/sub/deep/p-3.jsonl"
+    ]:
+        os.makedirs(os.path.dirname(os.path.join(tmp_path, name)),
+                    exist_ok=True)
+        Jsonl.write(os.path.join(tmp_path, name), [{"name": name}])
+    monkeypatch.chdir(tmp_path)
+
+    assert Jsonl.glob("./data/*.jsonl") == ["data/p-1.jsonl"]
+    assert Jsonl.glob("data/*.jsonl") == ["data/p-1.jsonl"]
+    assert Jsonl.glob("data/*/p-*.jsonl") == ["data/sub/p-2.jsonl"]
+    assert Jsonl.glob("./data/**/p-*.jsonl") == [
+        "data/p-1.jsonl", "data/sub/deep/p-3.jsonl", "data/sub/p-2.jsonl"
+    ]
+    assert Jsonl.glob(os.path.join(tmp_path, "data", "*.jsonl")) == [
+        os.path.join(tmp_path, "data", "p-1.jsonl")
+    ]
+    assert Jsonl.glob("./data/sub/") == [
+        "data/sub/deep/p-3.jsonl", "data/sub/p-2.jsonl"
+    ]
+
+
+@patch("computing_toolbox.utils.jsonl_files.Gs.list_files")
+def test_glob_gs(list_files_mock):
+    """test how to list gs files with a glob pattern"""
+    list_files_mock.return_value = iter([
+        "gs://bucket/export/part-1.jsonl.gz",
+        "gs://bucket/export/part-0.jsonl.gz", "gs://bucket/export/part-0.txt",
+        "gs://bucket/export/part-2/nested.jsonl.gz"
+    ])
+    paths = Jsonl.glob("gs://bucket/export/part-*.jsonl.gz")
+    assert paths == [
+        "gs://bucket/export/part-0.jsonl.gz",
+        "gs://bucket/export/part-1.jsonl.gz"
+    ]
+    assert list_files_mock.call_args.args == ("gs://bucket/export/part-", )
+
+
+def test_read_documents(tmp_path):
+    """test the function used to parse the documents of one file"""
+    path = os.path.join(tmp_path, "a.jsonl")
+    Jsonl.write(path, [{"k": 1}, {"k": 2}])
+    assert _read_documents((path, None, None)) == (path, [{"k": 1}, {"k": 2}])
+    assert _read_documents(("gs://b/a.jsonl", '{"k": 3}\n', None)) == \
+        ("gs://b/a.jsonl", [{"k": 3}])
+
+
+def test_read_glob(tmp_path):
+    """test how to read many local files as a single stream"""
+    expected = []
+    for k in range(5):
+        data = [{"file": k, "line": j} for j in range(k + 1)]
+        Jsonl.write(os.path.join(tmp_path, f"part-{k}.jsonl.gz"), data)
+        expected += data
+
+    # 1. read all the documents
+    documents_it = Jsonl.read_glob(os.path.join(tmp_path, "part-*.jsonl.gz"),
+                                   workers=2,
+                                   tqdm_kwargs={})
+    assert isinstance(documents_it, types.GeneratorType)
+    assert list(documents_it) == expected
+
+    # 2. tag every document with its file
+    documents = list(
+        Jsonl.read_glob(os.path.join(tmp_path, "part-"),
+                        re_filter=r"part-[01]",
+                        with_path=True))
+    assert [(os.path.basename(p), x)
+            for p, x in documents] == [("part-0.jsonl.gz", expected[0]),
+                                       ("part-1.jsonl.gz", expected[1]),
+                                       ("part-1.jsonl.gz", expected[2])]
+
+
+@patch("computing_toolbox.utils.jsonl_files.GsAsync.read")
+@patch("computing_toolbox.utils.jsonl_files.Gs.list_files")
+def test_read_glob_gs(list_files_mock, read_mock):
+    """test how to read many gs files as a single stream"""
+    paths = [f"gs://bucket/export/part-{k}.jsonl.gz" for k in range(3)]
+    list_files_mock.side_effect = lambda *args, **kwargs: iter(paths)
+    read_mock.side_effect = lambda batch, batch_size: [
+        f'{{"path": "{x}"}}\n' for x in batch
+    ]
+
+    # 1. download in batches of 2 files
+    documents = list(Jsonl.read_glob("gs://bucket/export/part-*", workers=2))
+    assert documents == [{"path": x} for x in paths]
+    assert read_mock.call_count == 2
+
+    # 2. a failed download raises an error
+    read_mock.side_effect = lambda batch, batch_size: [None] * len(batch)
+    with pytest.raises(OSError):
+        _ = list(Jsonl.read_glob("gs://bucket/export/part-*", workers=2))
+
+
+@patch("computing_toolbox.utils.jsonl_files.GsAsync.read")
+def test_async_read_shared_pool(async_read_mock):
+    """test async read with one pool shared by many calls"""
+    async_read_mock.return_value = ['{"k": 1}\n{"k": 2}\n', None]
+    with patch("computing_toolbox.utils.lazy_pool.Pool",
+               wraps=Pool) as pool_mock, LazyPool(2) as pool:
+        for _ in range(2):
+            documents = Jsonl.async_read(["gs://b/a.jsonl", "gs://b/b.jsonl"],
+                                         pool=pool)
+            assert documents == [[{"k": 1}, {"k": 2}], []]
+        pool_mock.assert_called_once_with(2)
+
+
+def test_shared_memory_block():
+    """test how contents are stored and parsed from shared memory"""
+    contents = [b'{"k": 1}\n{"k": 2}\n', None, b'{"k": 3}']
+    with _shared_memory_block(contents) as descriptors:
+        assert [(offset, length)
+                for _, offset, length in descriptors] == [(0, 18), (18, 0),
+                                                          (18, 8)]
+        documents = [_jsonl_parse_shared((*x, None)) for x in descriptors]
+    assert documents == [[{"k": 1}, {"k": 2}], [], [{"k": 3}]]
+
+    # the query projects and filters the documents
+    with _shared_memory_block([b'{"k": 1}\n\n{"k": 2}']) as descriptors:
+        query = JsonlQuery(fields=["k"], where={"k": 2})
+        assert _jsonl_parse_shared((*descriptors[0], None), query=query) == [{
+            "k":
+            2
+        }]
+
+    # empty contents
+    with _shared_memory_block([]) as descriptors:
+        assert not descriptors
+
+
+@patch("computing_toolbox.utils.jsonl_files.GsAsync.read")
+def test_async_read_shared_memory(async_read_mock):
+    """test async read sending the contents through shared memory"""
+    async_read_mock.return_value = [b'{"k": 1}\n{"k": 2}\n', None]
+    documents = Jsonl.async_read(["gs://b/a.jsonl", "gs://b/b.jsonl"],
+                                 workers=2,
+                                 shared_memory=True)
+    assert documents == [[{"k": 1}, {"k": 2}], []]
+    assert async_read_mock.call_args.kwargs["decode"] is False
+
+
+def test_read_fields(tmp_path):
+    """test how to read only some fields with every read method"""
+    path = os.path.join(tmp_path, "users.jsonl")
+    data = [{
+        "id": k,
+        "user": {
+            "name": f"u{k}",
+            "tags": list(range(k))
+        },
+        "payload": "x" * 100
+    } for k in range(20)]
+    Jsonl.write(path, data)
+    fields = ["id", ["user", "name"], ["user", "tags", 0]]
+    expected = [{
+        "id": k,
+        "user.name": f"u{k}",
+        "user.tags.0": 0 if k else None
+    } for k in range(20)]
+
+    assert Jsonl.read(path, fields=fields) == expected
+    assert Jsonl.read(path, offset=5, limit=3, fields=fields) == expected[5:8]
+    assert list(Jsonl.iter_read(path, batch_size=7,
+                                fields=fields))[-1] == expected[14:]
+    for mode in PLAIN_TEXT_MODES:
+        assert Jsonl.parallel_read(path,
+                                   workers=2,
+                                   mode=mode,
+                                   chunk_size=3,
+                                   fields=fields) == expected
+    gz_path = path + ".gz"
+    Jsonl.parallel_write(gz_path, data, workers=2, gzip_members=True)
+    assert Jsonl.parallel_read(gz_path, mode="gzip_members",
+                               fields=fields) == expected
+
+    # projections can't be mapped to a class
+    with pytest.raises(ValueError):
+        _ = Jsonl.parallel_read(path, mapping_class=dict, fields=fields)
+
+
+def has_even_id(document: dict) -> bool:
+    """a picklable where condition"""
+    return document["id"] % 2 == 0
+
+
+def test_read_where(tmp_path):
+    """test how to filter documents with every read method"""
+    path = os.path.join(tmp_path, "users.jsonl")
+    data = [{"id": k, "group": {"name": f"g{k % 3}"}} for k in range(20)]
+    Jsonl.write(path, data)
+    expected = [x for x in data if x["group"]["name"] == "g1"]
+
+    where = {"group.name": "g1"}
+    assert Jsonl.read(path, where=where) == expected
+    assert Jsonl.read(path, offset=2, limit=3, where=where) == [data[4]]
+    assert Jsonl.read(path, where=where, fields=["id"]) == [{
+        "id": x["id"]
+    } for x in expected]
+    for mode in PLAIN_TEXT_MODES:
+        assert Jsonl.parallel_read(path,
+                                   workers=2,
+                                   mode=mode,
+                                   chunk_size=3,
+                                   where=where) == expected
+        assert Jsonl.parallel_read(path,
+                                   workers=2,
+                                   mode=mode,
+                                   where=has_even_id) == data[::2]
+
+
+def test_read_columns(tmp_path):
+    """test how to read a file as typed columns"""
+    path = os.path.join(tmp_path, "users.jsonl")
+    data = [{
+        "id": k,
+        "user": {
+            "name": f"u{k}",
+            "score": k / 2 if k else None
+        }
+    } for k in range(10)]
+    Jsonl.write(path, data)
+
+    columns = ["id", ["user", "name"], ["user", "score"]]
+    for workers in [None, 2]:
+        result = Jsonl.read_columns(
+            path,
+            columns,
+            dtypes={"id": "int32"},
+            where={"user.name": "u0"} if workers else None,
+            workers=workers,
+            chunk_size=3)
+        assert list(result) == ["id", "user.name", "user.score"]
+        assert result["id"].dtype == "int32"
+        if workers:
+            assert result["id"].tolist() == [0]
+        else:
+            assert result["id"].tolist() == list(range(10))
+            assert result["user.name"].to_list() == [
+                f"u{k}" for k in range(10)
+            ]
+            assert result["user.score"].mask.tolist() == [True] + [False] * 9
+            assert result["user.score"].sum() == sum(range(10)) / 2
+
+
+def test_gzip_members(tmp_path):
+    """test how to write and read multi-member gzip files in parallel"""
+    path = os.path.join(tmp_path, "data.jsonl.gz")
+    data = [{"k": k, "name": f"n{k}"} for k in range(25)]
+
+    # 1. write 3 members of at most 10 objects
+    n = Jsonl.parallel_write(path,
+                             iter(data),
+                             workers=2,
+                             chunk_size=10,
+                             gzip_members=True,
+                             level=1,
+                             tqdm_kwargs={})
+    assert n == len(data)
+    assert os.path.exists(GzipMemberIndex.index_path(path))
+    assert len(GzipMemberIndex.load(path).members) == 3
+
+    # 2. it is a valid gzip file for the sequential readers
+    with gzip.open(path, "rt") as fp:
+        assert [json.loads(x) for x in fp] == data
+    assert Jsonl.read(path) == data
+
+    # 3. read the members in parallel
+    assert Jsonl.parallel_read(path,
+                               workers=2,
+                               mode="gzip_members",
+                               tqdm_kwargs={}) == data
+    with pytest.raises(ValueError):
+        _ = Jsonl.parallel_read(path, mode="gzip_members", limit=2)
+    with pytest.raises(ValueError):
+        _ = Jsonl.parallel_write(str(tmp_path / "a.jsonl"),
+                                 data,
+                                 gzip_members=True)
+
+
+@pytest.mark.parametrize("extension", [".zst", ".lz4"])
+def test_zst_lz4(tmp_path, extension):
+    """test the zstandard and lz4 files are read and written by extension"""
+    path = os.path.join(tmp_path, f"data.jsonl{extension}")
+    data = [{"k": k, "name": f"n{k}"} for k in range(25)]
+
+    # 1. sequential and parallel writers
+    Jsonl.write(path, data)
+    with open(path, "rb") as fp:
+        assert not fp.read().startswith(b'{"k"')
+    assert Jsonl.read(path) == data
+    assert Jsonl.count_lines(path) == len(data)
+    assert Jsonl.parallel_write(path, iter(data), workers=2,
+                                chunk_size=10) == len(data)
+
+    # 2. sequential and parallel readers
+    assert Jsonl.read(path, offset=5, limit=3) == data[5:8]
+    assert list(Jsonl.iter_read(path)) == data
+    for mode in ["lines", "chunks"]:
+        assert Jsonl.parallel_read(path, workers=2, mode=mode) == data
+    with pytest.raises(ValueError):
+        _ = Jsonl.parallel_read(path, mode="byte_ranges")
+
+    # 3. sharded writes
+    paths = Jsonl.write_sharded(os.path.join(tmp_path, "part"),
+                                data,
+                                max_records=10,
+                                workers=2,
+                                suffix=f".jsonl{extension}")
+    assert [x for p in paths for x in Jsonl.read(p)] == data
+
+
+def test_dedup_key(tmp_path):
+    """test how to drop the duplicated documents while reading and writing"""
+    path = os.path.join(tmp_path, "data.jsonl")
+    data = [{"id": k % 4, "user": {"name": f"u{k}"}} for k in range(10)]
+
+    # 1. write only the first document of every id
+    assert Jsonl.write(path, data, dedup_key=["id"]) == 4
+    assert Jsonl.read(path) == data[:4]
+
+    # 2. read only the first document of every id
+    Jsonl.write(path, data)
+    assert Jsonl.read(path, dedup_key=["id"]) == data[:4]
+    assert Jsonl.read(path, dedup_key=["id"], fields=[["user", "name"]]) == [{
+        "user.name":
+        f"u{k}"
+    } for k in range(4)]
+    assert Jsonl.read(path, dedup_key=["id"], where={"id": 3}) == [data[3]]
+    assert list(
+        Jsonl.iter_read(path,
+                        dedup_key=["id"],
+                        dedup_spill_dir=str(tmp_path),
+                        batch_size=3)) == [data[:3], data[3:4]]
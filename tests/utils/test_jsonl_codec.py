@@ -0,0 +1,107 @@
+"""test the jsonl_codec file"""
+import json
+import math
+from dataclasses import dataclass
+from datetime import date
+from unittest.mock import patch
+
+import jsons
+import pytest
+
+from computing_toolbox.utils.jsonl_codec import CODECS, dumps, has_big_float, loads, optional_import, resolve_codec
+
+
+@dataclass
+class Person:
+    """simple dataclass for testing"""
+    name: str
+    birthday: date
+
+
+def test_optional_import():
+    """test the import of installed and not installed modules"""
+    assert optional_import("json") is json
+    assert optional_import("this_module_doesnt_exist") is None
+
+
+def test_resolve_codec():
+    """test how the codec names are resolved to backends"""
+    assert resolve_codec("json") == "json"
+    assert resolve_codec("jsons") == "jsons"
+    assert resolve_codec("auto") in ("orjson", "ujson", "json")
+    with pytest.raises(ValueError):
+        _ = resolve_codec("yaml")
+
+    # without fast backends installed
+    with patch("computing_toolbox.utils.jsonl_codec.orjson", None), \
+            patch("computing_toolbox.utils.jsonl_codec.ujson", None):
+        assert resolve_codec("auto") == "json"
+        with pytest.raises(ValueError):
+            _ = resolve_codec("orjson")
+
+
+def test_loads_every_codec():
+    """test every codec decodes the same document"""
+    line = '{"name": "foo", "values": [1, 2.5, null, true], "nested": {"a": "b"}}'
+    expected = json.loads(line)
+    for codec in CODECS:
+        assert loads(line, codec=codec) == expected
+        assert loads(line.encode("utf8"), codec=codec) == expected
+
+    # values rejected by fast backends fall back to json
+    for codec in CODECS:
+        assert math.isnan(loads('{"n": NaN}', codec=codec)["n"])
+
+
+def test_loads_big_integers():
+    """test the integers out of the 64 bits range are decoded exactly by every codec"""
+    line = '{"a": 18446744073709551616, "b": [-9223372036854775809], "c": "12345678901234567890"}'
+    expected = {
+        "a": 18446744073709551616,
+        "b": [-9223372036854775809],
+        "c": "12345678901234567890"
+    }
+    for codec in CODECS:
+        for value in [line, line.encode("utf8")]:
+            document = loads(value, codec=codec)
+            assert document == expected
+            assert isinstance(document["a"], int)
+            assert isinstance(document["b"][0], int)
+
+    # the floats out of the 64 bits range are found in any nested container
+    assert not has_big_float({"a": [1.5, {"b": -2.0**62}], "c": 2**64 - 1})
+    assert has_big_float({"a": [1.5, {"b": -2.0**63}]})
+    assert has_big_float([1e20])
+    assert loads('"12345678901234567890"') == "12345678901234567890"
+    assert loads("12345678901234567890") == 12345678901234567890
+    assert loads('[1e20, 18446744073709551615]') == [1e20, 2**64 - 1]
+
+
+def test_loads_with_mapping_class():
+    """test the mapping class is always decoded with jsons"""
+    person = Person(name="foo", birthday=date(2000, 1, 2))
+    line = jsons.dumps(person)
+    for codec in CODECS:
+        assert loads(line, Person, codec) == person
+        assert loads(line.encode("utf8"), Person, codec) == person
+
+
+def test_dumps_every_codec():
+    """test every codec encodes the same json value as jsons"""
+    person = Person(name="foo", birthday=date(2000, 1, 2))
+    objects = [{
+        "name": "foo",
+        "n": 1,
+        "values": [1.5, None]
+    }, {
+        1: "int key",
+        "person": person
+    }, person, 2**70]
+    for obj in objects:
+        expected = json.loads(jsons.dumps(obj))
+        for codec in CODECS:
+            assert json.loads(dumps(obj, codec)) == expected
+
+    # the default codec keeps the same output as jsons
+    for obj in objects:
+        assert dumps(obj) == jsons.dumps(obj)
@@ -0,0 +1,138 @@
+"""test the jsonl_columns.py file"""
+import numpy as np
+import pytest
+
+from computing_toolbox.utils.jsonl_columns import GrowableArray, StringColumn, ColumnBuilder, build_columns
+
+
+def test_growable_array():
+    """test the array grows when it is full"""
+    array = GrowableArray(np.int64, capacity=2)
+    for k in range(5):
+        array.append(k)
+    assert len(array) == 5
+    assert array[-1] == 4
+    assert array.to_numpy().tolist() == [0, 1, 2, 3, 4]
+    assert array.astype(float).to_numpy().dtype == np.float64
+
+
+def test_string_column():
+    """test the strings are stored in one buffer with offsets"""
+    column = StringColumn()
+    for value in ["ab", None, "ñandú", ""]:
+        column.append(value)
+    assert len(column) == 4
+    assert column.to_list() == ["ab", None, "ñandú", ""]
+    assert column[-2] == "ñandú"
+    assert bytes(column.data) == "abñandú".encode("utf8")
+    assert column.offsets.to_numpy().tolist() == [0, 2, 2, 9, 9]
+    with pytest.raises(IndexError):
+        _ = column[4]
+
+
+def test_column_builder():
+    """test the dtype inference and promotion"""
+    # 1. inferred int column promoted to float, missing values are masked
+    builder = ColumnBuilder()
+    for value in [None, 1, None, 2.5]:
+        builder.append(value)
+    column = builder.build()
+    assert column.dtype == np.float64
+    assert column.mask.tolist() == [True, False, True, False]
+    assert column.compressed().tolist() == [1.0, 2.5]
+
+    # 2. a numeric column with a non numeric value becomes an object column
+    builder = ColumnBuilder()
+    for value in [1, [2], None]:
+        builder.append(value)
+    column = builder.build()
+    assert column.dtype == object
+    assert column.tolist() == [1, [2], None]
+
+    # 3. given string dtype
+    builder = ColumnBuilder(str)
+    for value in ["1", None]:
+        builder.append(value)
+    assert builder.build().to_list() == ["1", None]
+
+    # 4. only missing values
+    builder = ColumnBuilder()
+    builder.append(None)
+    assert builder.build().mask.tolist() == [True]
+
+    # 5. a string column inferred after missing values
+    builder = ColumnBuilder()
+    for value in [None, "a"]:
+        builder.append(value)
+    assert builder.build().to_list() == [None, "a"]
+
+
+def test_build_columns():
+    """test how to store rows by column"""
+    rows = [{"id": k, "ok": k % 2 == 0, "name": f"n{k}"} for k in range(3)]
+    columns = build_columns(rows, ["id", "ok", "name", "x"],
+                            dtypes={"id": np.int32})
+    assert columns["id"].dtype == np.int32
+    assert columns["id"].tolist() == [0, 1, 2]
+    assert columns["ok"].tolist() == [True, False, True]
+    assert columns["name"].to_list() == ["n0", "n1", "n2"]
+    assert columns["x"].mask.all()
+
+
+def test_column_builder_promotion():
+    """test the inferred columns are promoted without losing values"""
+    # 1. bools mixed with numbers fall back to an object column
+    for values in [[True, 5, None], [False, 0.5, None], [1, True, None],
+                   [0.5, False, None]]:
+        columns = build_columns([{"a": x} for x in values], ["a"])
+        assert columns["a"].dtype == object
+        assert columns["a"].tolist() == values
+        assert [type(x)
+                for x in columns["a"].tolist()] == [type(x) for x in values]
+
+    # 2. strings mixed with other types fall back to an object column
+    values = [None, "a", 5, {"k": 1}, None, "b"]
+    columns = build_columns([{"a": x} for x in values], ["a"])
+    assert columns["a"].dtype == object
+    assert columns["a"].tolist() == values
+    columns = build_columns([{"a": x} for x in [5, "a"]], ["a"])
+    assert columns["a"].tolist() == [5, "a"]
+
+    # 3. integers out of the int64 range fall back to an object column
+    for rows in [[{"a": 1}, {"a": 2**64}], [{"a": True}, {"a": -2**70}]]:
+        columns = build_columns(rows, ["a"])
+        assert columns["a"].dtype == object
+        assert columns["a"].tolist()[-1] == rows[-1]["a"]
+
+    # 4. a float column with an integer out of the float64 range
+    columns = build_columns([{"a": 0.5}, {"a": 2**1100}], ["a"])
+    assert columns["a"].dtype == object
+    assert columns["a"].tolist() == [0.5, 2**1100]
+
+
+def test_column_builder_explicit_dtype():
+    """test a provided dtype is kept and the values that don't fit raise an error"""
+    columns = build_columns([{"a": 1}, {"a": None}], ["a"], dtypes={"a": int})
+    assert columns["a"].dtype == np.int64
+    assert columns["a"].tolist() == [1, None]
+    columns = build_columns([{
+        "a": 1
+    }, {
+        "a": "x"
+    }, {
+        "b": 1
+    }], ["a", "b"],
+                            dtypes={
+                                "a": object,
+                                "b": complex
+                            })
+    assert columns["a"].tolist() == [1, "x", None]
+    assert columns["b"].tolist() == [None, None, 1 + 0j]
+
+    for dtype, value in [(int, 2.5), (int, 2**64), (np.int8, 300), (bool, 5),
+                         (float, "x"), (int, [1]), (int, True), (float, False),
+                         (str, 5), (str, {
+                             "k": 1
+                         })]:
+        with pytest.raises(ValueError):
+            _ = build_columns([{"a": value}], ["a"], dtypes={"a": dtype})
@@ -0,0 +1,128 @@
+"""test the jsonl_files.py file"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from computing_toolbox.utils.jsonl import Jsonl
+from computing_toolbox.utils.jsonl_workers import _iter_line_chunks
+
+
+def test_aread_aiter(tmp_path):
+    """test the async read and iteration inside a running event loop"""
+    data = [{"k": k, "even": k % 2 == 0} for k in range(25)]
+    paths = [str(tmp_path / f"data-{k}.jsonl.gz") for k in range(3)]
+    for path in paths:
+        Jsonl.write(path, data)
+
+    async def main():
+        documents = await Jsonl.aread(paths, batch_size=2)
+        projected = await Jsonl.aread(paths[:1],
+                                      fields=["k"],
+                                      where={"even": True})
+        with ProcessPoolExecutor(2) as executor:
+            iterated = [
+                x async for x in Jsonl.aiter(
+                    paths[0], executor=executor, chunk_size=7)
+            ]
+        filtered = [
+            x async for x in Jsonl.aiter(paths[1], where={"even": False})
+        ]
+        return documents, projected, iterated, filtered
+
+    documents, projected, iterated, filtered = asyncio.run(main())
+    assert documents == [data] * 3
+    assert projected == [[{"k": k} for k in range(0, 25, 2)]]
+    assert iterated == data
+    assert filtered == [x for x in data if not x["even"]]
+
+
+@patch("computing_toolbox.utils.jsonl_files.GsAsync.aread",
+       new_callable=AsyncMock)
+def test_aread_gs(aread_mock, tmp_path):
+    """test the gs:// files are downloaded with the GsAsync coroutines"""
+    local_path = str(tmp_path / "local.jsonl")
+    Jsonl.write(local_path, [{"k": 0}])
+    aread_mock.return_value = ['{"k": 1}\n{"k": 2}\n']
+    paths = ["gs://bucket/a.jsonl", local_path]
+
+    assert asyncio.run(Jsonl.aread(paths)) == [[{
+        "k": 1
+    }, {
+        "k": 2
+    }], [{
+        "k": 0
+    }]]
+
+    aread_mock.return_value = [None]
+    with pytest.raises(OSError):
+        asyncio.run(Jsonl.aread(paths[:1]))
+
+
+def test_aiter_gs_stream(fake_gs):
+    """test a gs:// file is streamed in chunks and closed when the consumer stops early"""
+    path = "gs://bucket/a.jsonl.gz"
+    data = [{"k": k} for k in range(10)]
+    Jsonl.write(path, data)
+    closed = []
+
+    def iter_chunks(path, chunk_size):
+        try:
+            yield from _iter_line_chunks(path, chunk_size)
+        finally:
+            closed.append(path)
+
+    async def iterate(limit=None):
+        documents = []
+        async for document in Jsonl.aiter(path, chunk_size=3):
+            documents.append(document)
+            if len(documents) == limit:
+                break
+        return documents
+
+    with patch("computing_toolbox.utils.jsonl_files._iter_line_chunks",
+               side_effect=iter_chunks):
+        assert asyncio.run(iterate()) == data
+        assert asyncio.run(iterate(limit=2)) == data[:2]
+    assert closed == [path, path]
+    assert fake_gs(path).endswith("a.jsonl.gz")
+
+
+def test_write_gs_no_local_dirs(fake_gs, tmp_path, monkeypatch):
+    """test the writers don't create local directories for gs:// paths"""
+    cwd = os.path.join(tmp_path, "cwd")
+    os.makedirs(cwd)
+    monkeypatch.chdir(cwd)
+    data = [{"k": k} for k in range(5)]
+    Jsonl.write("gs://bucket/dir/a.jsonl", data)
+    Jsonl.parallel_write("gs://bucket/dir/b.jsonl", data, workers=2)
+    assert not os.listdir(cwd)
+    assert Jsonl.read(fake_gs("gs://bucket/dir/b.jsonl")) == data
+
+
+@pytest.mark.parametrize("make_data", [
+    tuple, lambda x: (obj for obj in x), lambda x: map(dict, x), lambda x: x[0]
+])
+def test_writers_input_types(make_data, tmp_path):
+    """test the three writers accept the same input types"""
+    documents = [{"k": k} for k in range(5)]
+    expected = [documents[0]] if isinstance(make_data(documents),
+                                            dict) else documents
+    path = str(tmp_path / "data.jsonl")
+
+    assert Jsonl.write(path, make_data(documents)) == len(expected)
+    assert Jsonl.read(path) == expected
+    assert Jsonl.parallel_write(path,
+                                make_data(documents),
+                                workers=1,
+                                chunk_size=2,
+                                tqdm_kwargs={}) == len(expected)
+    assert Jsonl.read(path) == expected
+    shards = Jsonl.write_sharded(str(tmp_path / "part"),
+                                 make_data(documents),
+                                 max_records=2,
+                                 workers=1,
+                                 tqdm_kwargs={})
+    assert [x for shard in shards for x in Jsonl.read(shard)] == expected
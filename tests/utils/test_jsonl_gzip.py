@@ -0,0 +1,90 @@
+"""test the jsonl_gzip.py file"""
+import gzip
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from computing_toolbox.utils.compression import COMPRESSION_LEVELS
+from computing_toolbox.utils.jsonl import Jsonl
+from computing_toolbox.utils.jsonl_gzip import GzipMemberIndex, _compress_member, _parse_member, read_gzip_members
+from computing_toolbox.utils.jsonl_query import JsonlQuery
+
+
+def test_compress_and_parse_member(tmp_path):
+    """test the functions used to compress and parse one member"""
+    n, member = _compress_member([{"k": 1}, {"k": 2}])
+    assert n == 2
+    assert gzip.decompress(member) == b'{"k": 1}\n{"k": 2}\n'
+
+    path = os.path.join(tmp_path, "data.jsonl.gz")
+    with open(path, "wb") as fp:
+        fp.write(member + member)
+    query = JsonlQuery(where={"k": 2})
+    assert _parse_member((path, len(member), len(member)), query) == [{"k": 2}]
+
+
+def test_compress_member_level():
+    """test the member compression level defaults to COMPRESSION_LEVELS"""
+    data = [{"k": k, "v": str(k % 7)} for k in range(3000)]
+    with patch.dict(COMPRESSION_LEVELS, {".gz": 1}):
+        fast = _compress_member(data)[1]
+    assert len(_compress_member(data)[1]) < len(fast)
+    assert _compress_member(data, level=1)[1] == fast
+
+
+def test_build_index(tmp_path):
+    """test how to find the members of a gzip file"""
+    members = [gzip.compress(f"line {k}\n".encode() * 1000) for k in range(3)]
+    path = os.path.join(tmp_path, "data.jsonl.gz")
+    with open(path, "wb") as fp:
+        fp.write(b"".join(members))
+
+    # 1. scan the file with a small buffer
+    index = GzipMemberIndex.build(path, buffer_size=7)
+    lengths = [len(x) for x in members]
+    assert index.members == [[0, lengths[0]], [lengths[0], lengths[1]],
+                             [lengths[0] + lengths[1], lengths[2]]]
+
+    # 2. get builds and saves the index, then it is loaded
+    assert GzipMemberIndex.load(path) is None
+    assert GzipMemberIndex.get(path).members == index.members
+    assert GzipMemberIndex.load(path).members == index.members
+
+    # 3. the index is stale when the file changes
+    time.sleep(0.01)
+    with open(path, "wb") as fp:
+        fp.write(members[0])
+    assert GzipMemberIndex.load(path) is None
+    assert GzipMemberIndex.get(path).members == [[0, lengths[0]]]
+
+    # 4. only gzip files
+    with pytest.raises(ValueError):
+        _ = GzipMemberIndex.build(os.path.join(tmp_path, "data.jsonl"))
+
+
+def test_gs_first_read(fake_gs):
+    """test the member index of a gs:// file written by other tools is built on the first read"""
+    path = "gs://bucket/data.jsonl.gz"
+    os.makedirs(os.path.dirname(fake_gs(path)))
+    with open(fake_gs(path), "wb") as fp:
+        fp.write(gzip.compress(b'{"k": 1}\n') + gzip.compress(b'{"k": 2}\n'))
+
+    assert GzipMemberIndex.load(path) is None
+    assert read_gzip_members(path, JsonlQuery(), 2) == [{"k": 1}, {"k": 2}]
+    assert len(GzipMemberIndex.load(path).members) == 2
+
+
+def test_read_only_location(tmp_path, read_only):
+    """test the member index is used from memory when it can't be saved"""
+    path = os.path.join(tmp_path, "data.jsonl.gz")
+    with open(path, "wb") as fp:
+        fp.write(gzip.compress(b'{"k": 1}\n') + gzip.compress(b'{"k": 2}\n'))
+    read_only()
+    assert Jsonl.parallel_read(path, workers=2, mode="gzip_members") == [{
+        "k": 1
+    }, {
+        "k": 2
+    }]
+    assert not os.path.exists(GzipMemberIndex.index_path(path))
@@ -0,0 +1,135 @@
+"""test the jsonl_index file"""
+import os
+from unittest.mock import patch
+
+import pytest
+from google.api_core.exceptions import Forbidden
+
+from computing_toolbox.utils.jsonl import Jsonl
+from computing_toolbox.utils.jsonl_index import JsonlIndex, file_stat, is_compressed
+
+
+def write_lines(path: str, n: int) -> list[int]:
+    """write n lines of different sizes and return the offset of every line"""
+    offsets, position = [], 0
+    with open(path, "w", encoding="utf8") as fp:
+        for k in range(n):
+            line = f'{{"k": {k}, "name": "{"x" * (k % 3)}"}}\n'
+            offsets.append(position)
+            position += len(line)
+            fp.write(line)
+    return offsets
+
+
+def test_build_save_load_and_locate(tmp_path):
+    """test the full life cycle of an index"""
+    path = str(tmp_path / "file.jsonl")
+    expected_offsets = write_lines(path, 10)
+
+    # 1. build the index
+    index = JsonlIndex.build(path, every=3, tqdm_kwargs={})
+    assert index.n_lines == 10
+    assert index.offsets == expected_offsets[::3]
+    assert not os.path.exists(JsonlIndex.index_path(path))
+
+    # 2. save and load it
+    index.save()
+    assert os.path.exists(path + ".idx")
+    loaded = JsonlIndex.load(path)
+    assert loaded.offsets == index.offsets
+    assert loaded.n_lines == index.n_lines
+
+    # 3. locate some lines
+    assert loaded.locate(0) == (0, 0)
+    assert loaded.locate(4) == (expected_offsets[3], 1)
+    assert loaded.locate(9) == (expected_offsets[9], 0)
+    assert loaded.locate(10) == (os.path.getsize(path), 0)
+
+
+def test_get_and_invalidation(tmp_path):
+    """test the index is rebuilt when missing or stale"""
+    path = str(tmp_path / "file.jsonl")
+    write_lines(path, 5)
+
+    # 1. no sidecar file: load returns None and get builds it
+    assert JsonlIndex.load(path) is None
+    index = JsonlIndex.get(path, every=2)
+    assert index.n_lines == 5
+    assert JsonlIndex.load(path) is not None
+
+    # 2. the file changes: the index is stale
+    write_lines(path, 7)
+    assert JsonlIndex.load(path) is None
+    index = JsonlIndex.get(path, every=2)
+    assert index.n_lines == 7
+
+    # 3. a corrupted sidecar is ignored
+    with open(path + ".idx", "w", encoding="utf8") as fp:
+        fp.write("not a json")
+    assert JsonlIndex.load(path) is None
+
+
+def test_build_errors_and_empty_file(tmp_path):
+    """test bad parameters and the empty file"""
+    path = str(tmp_path / "empty.jsonl")
+    write_lines(path, 0)
+    index = JsonlIndex.build(path)
+    assert index.n_lines == 0
+    assert index.locate(3) == (0, 0)
+
+    with pytest.raises(ValueError):
+        _ = JsonlIndex.build(path, every=0)
+    with pytest.raises(ValueError):
+        _ = JsonlIndex.build(str(tmp_path / "file.jsonl.gz"))
+
+
+@patch("computing_toolbox.utils.sidecar.Gs.stat")
+def test_file_stat(gs_stat_mock, tmp_path):
+    """test the file stat for local and gs paths"""
+    gs_stat_mock.return_value = {"size": 1, "mtime": 2.0}
+    assert file_stat("gs://bucket/file.jsonl") == {"size": 1, "mtime": 2.0}
+
+    path = tmp_path / "file.jsonl"
+    path.write_text("{}")
+    stat = file_stat(str(path))
+    assert stat["size"] == 2
+    assert stat["mtime"] == os.path.getmtime(path)
+
+
+def test_is_compressed():
+    """test the compression detection by extension"""
+    assert is_compressed("gs://bucket/file.jsonl.gz")
+    assert is_compressed("/tmp/file.jsonl.BZ2")
+    assert not is_compressed("/tmp/file.jsonl")
+
+
+def test_gs_first_read(fake_gs):
+    """test the index of a gs:// file is built on the first read"""
+    path = "gs://bucket/file.jsonl"
+    os.makedirs(os.path.dirname(fake_gs(path)))
+    write_lines(fake_gs(path), 5)
+
+    assert JsonlIndex.load(path) is None
+    assert Jsonl.read(path, offset=3, use_index=True) == [{
+        "k": 3,
+        "name": ""
+    }, {
+        "k": 4,
+        "name": "x"
+    }]
+    assert JsonlIndex.load(path).n_lines == 5
+
+
+@pytest.mark.parametrize(
+    "error",
+    [PermissionError(13, "Permission denied"),
+     Forbidden("no access")])
+def test_read_only_location(error, tmp_path, read_only):
+    """test the index is used from memory when it can't be saved"""
+    path = str(tmp_path / "file.jsonl")
+    write_lines(path, 5)
+    read_only(error)
+    assert [x["k"]
+            for x in Jsonl.read(path, offset=3, use_index=True)] == [3, 4]
+    assert JsonlIndex.get(path, every=2).n_lines == 5
+    assert not os.path.exists(path + JsonlIndex.EXTENSION)
@@ -0,0 +1,202 @@
+"""test the jsonl_mapping.py file"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Union
+
+import jsons
+import pytest
+
+from computing_toolbox.utils.jsonl_codec import loads
+from computing_toolbox.utils.jsonl_mapping import compile_decoder, load
+
+
+class Color(Enum):
+    """an enum delegated to jsons"""
+    RED = "red"
+    BLUE = "blue"
+
+
+@dataclass
+class Address:
+    """a nested dataclass"""
+    city: str
+    zip_code: Optional[str] = None
+
+
+@dataclass
+class Person:
+    """a dataclass with many kinds of type hints"""
+    name: str
+    age: int
+    height: float
+    active: bool
+    address: Address
+    tags: List[str] = field(default_factory=list)
+    scores: Dict[str, float] = field(default_factory=dict)
+    friends: List["Person"] = field(default_factory=list)
+    color: Optional[Color] = None
+    born: Optional[datetime] = None
+    extra: Any = None
+    meta: dict = field(default_factory=dict)
+    pair: tuple[int, str] = (0, "")
+    code: Union[int, str] = 0
+
+
+class Point:
+    """a __slots__ class"""
+    __slots__ = ("x", "y")
+
+    def __init__(self, x: int, y: int = 0):
+        self.x = x
+        self.y = y
+
+    def __eq__(self, other):
+        return (self.x, self.y) == (other.x, other.y)
+
+
+class Plain:
+    """a class without slots decoded by jsons"""
+
+    def __init__(self, x: int):
+        self.x = x
+
+
+@dataclass
+class Maybe:
+    """a dataclass with a required optional argument"""
+    x: Optional[int]
+
+
+@dataclass
+class Lookup:
+    """a dataclass with a dictionary of integer keys"""
+    names: Dict[int, str]
+
+
+@dataclass
+class Validated:
+    """a dataclass with a failing constructor"""
+    x: int
+
+    def __post_init__(self):
+        if self.x < 0:
+            raise ValueError("x must be positive")
+
+
+DOCUMENTS = [{
+    "name":
+    "ana",
+    "age":
+    30,
+    "height":
+    1,
+    "active":
+    1,
+    "address": {
+        "city": "cdmx",
+        "zip_code": "01000"
+    },
+    "tags": ["a", "b"],
+    "scores": {
+        "math": 9,
+        "art": 7.5
+    },
+    "friends": [{
+        "name": "bob",
+        "age": 31,
+        "height": 1.8,
+        "active": True,
+        "address": {
+            "city": "gdl"
+        }
+    }],
+    "color":
+    "red",
+    "born":
+    "2000-01-02T03:04:05Z",
+    "extra": {
+        "k": [1, 2]
+    },
+    "meta": {
+        "source": "x"
+    },
+    "pair": [1, "one"],
+    "code":
+    "x1",
+    "unknown":
+    "value"
+}, {
+    "name": "eve",
+    "age": "33",
+    "height": 1.6,
+    "active": False,
+    "address": {
+        "city": "mty"
+    },
+    "tags": ["c"],
+    "scores": {},
+    "color": None
+}]
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_same_as_jsons(document):
+    """test the compiled decoder gives the same objects as jsons"""
+    expected = jsons.load(document, Person)
+    result = load(document, Person)
+    assert result == expected
+    assert vars(result) == vars(expected)
+
+
+def test_slots_class():
+    """test the __slots__ classes are compiled"""
+    assert load({"x": 1}, Point) == Point(1, 0)
+    assert load({"x": 1, "y": 2, "z": 3}, Point) == Point(1, 2)
+    assert load({"x": 1, "z": 3}, Plain).z == 3
+    document = {"names": {"1": "a"}}
+    assert load(document, Lookup) == jsons.load(document, Lookup)
+
+
+def test_fallback_to_jsons():
+    """test the documents out of the fast path have the jsons result or error"""
+    # 1. a missing required argument
+    with pytest.raises(jsons.exceptions.JsonsError):
+        _ = load({"city": None, "other": 1}, Person)
+    with pytest.raises(jsons.exceptions.JsonsError):
+        _ = load({"name": "x", "tags": None}, Person)
+    assert load({"y": 1}, Maybe) == jsons.load({"y": 1}, Maybe) == Maybe(None)
+
+    # 2. a failing constructor
+    assert load({"x": 1}, Validated) == Validated(1)
+    with pytest.raises(jsons.exceptions.DeserializationError):
+        _ = load({"x": -1}, Validated)
+
+    # 3. documents with jsons meta data and no dictionaries
+    document = jsons.dump(Address("cdmx"), verbose=True)
+    assert load(document, Address) == Address("cdmx")
+    assert load(None, Optional[int]) is None
+    assert load([1, "2"], List[int]) == [1, 2]
+    assert load({"a": 1}) == {"a": 1}
+
+
+def test_compile_decoder_cache():
+    """test the decoders are compiled once per class"""
+    assert compile_decoder(Person) is compile_decoder(Person)
+    assert compile_decoder(Plain) is compile_decoder(Plain)
+
+    # unresolved type hints fall back to jsons
+    @dataclass
+    class Broken:
+        """a dataclass with an unknown type hint"""
+        x: "Unknown"  # noqa: F821
+
+    with pytest.raises(jsons.exceptions.JsonsError):
+        _ = compile_decoder(Broken)({"x": 1})
+
+
+def test_loads_mapping_class():
+    """test the codecs map the documents with the compiled decoder"""
+    line = '{"city": "cdmx", "zip_code": 1000}'
+    for codec in ["auto", "json", "jsons"]:
+        assert loads(line, Address, codec) == Address("cdmx", "1000")
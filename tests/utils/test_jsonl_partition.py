@@ -0,0 +1,101 @@
+"""test the jsonl_partition.py file"""
+import os
+
+import pytest
+import smart_open
+
+from computing_toolbox.utils.dedup import key_digest
+from computing_toolbox.utils.jsonl import Jsonl
+from computing_toolbox.utils.jsonl_partition import _partition_chunk, gcs_part_size, partition_files
+
+
+def test_partition_chunk():
+    """test the lines are grouped by the hash of their key"""
+    lines = [f'{{"id": {k}}}\n' for k in range(20)] + ["\n"]
+    partitions = _partition_chunk(lines, [["id"]], 3)
+    assert sum(len(x) for x in partitions) == 20
+    for k, partition in enumerate(partitions):
+        for line in partition:
+            assert key_digest({"id": int(line[7:-1])}, [["id"]]) % 3 == k
+
+
+def test_partition(tmp_path):
+    """test how to partition many files by key"""
+    data = [{"id": k % 25, "k": k} for k in range(100)]
+    paths = [os.path.join(tmp_path, f"data-{k}.jsonl") for k in range(2)]
+    Jsonl.write(paths[0], data[:60])
+    Jsonl.write(paths[1], data[60:])
+
+    # 1. every key lands in exactly one partition
+    prefix = os.path.join(tmp_path, "out", "part")
+    out_paths = Jsonl.partition(paths,
+                                prefix,
+                                key=["id"],
+                                n_partitions=4,
+                                workers=2,
+                                memory_limit=100,
+                                chunk_size=7,
+                                tqdm_kwargs={})
+    assert [os.path.basename(x) for x in out_paths
+            ] == [f"part-0000{k}-of-00004.jsonl.gz" for k in range(4)]
+    partitions = [Jsonl.read(x) for x in out_paths]
+    assert sorted(
+        (x["k"] for xs in partitions for x in xs)) == list(range(100))
+    ids = [{x["id"] for x in xs} for xs in partitions]
+    assert sum(len(x) for x in ids) == 25
+    # the file order is kept inside every partition
+    assert all([x["k"] for x in xs] == sorted(x["k"] for x in xs)
+               for xs in partitions)
+
+    # 2. the partition of a key is stable
+    out_paths_2 = Jsonl.partition(paths[1],
+                                  os.path.join(tmp_path, "other"),
+                                  key=["id"],
+                                  n_partitions=4,
+                                  suffix=".jsonl")
+    for partition, other_path in zip(partitions, out_paths_2):
+        assert {x["id"]
+                for x in Jsonl.read(other_path)
+                } <= {x["id"]
+                      for x in partition}
+
+    with pytest.raises(ValueError):
+        _ = Jsonl.partition(paths, prefix, key=["id"], n_partitions=0)
+
+
+def test_partition_files(tmp_path):
+    """test the partition counts and the empty partitions"""
+    path = os.path.join(tmp_path, "data.jsonl")
+    Jsonl.write(path, [{"id": 1}] * 5)
+    out_paths = [os.path.join(tmp_path, f"p{k}.jsonl") for k in range(3)]
+    counts = partition_files([path], out_paths, [["id"]])
+    assert sorted(counts) == [0, 0, 5]
+    assert all(os.path.exists(x) for x in out_paths)
+
+
+def test_partition_gs(fake_gs, monkeypatch):
+    """test the gs:// partitions buffer upload parts bounded by the memory limit"""
+    path = "gs://bucket/data.jsonl"
+    Jsonl.write(path, [{"id": k} for k in range(20)])
+    fake_open, part_sizes = smart_open.open, {}
+
+    def open_recorder(path, mode="r", **kwargs):
+        part_sizes[path] = kwargs.get("transport_params",
+                                      {}).get("min_part_size")
+        return fake_open(path, mode, **kwargs)
+
+    monkeypatch.setattr(smart_open, "open", open_recorder)
+    out_paths = Jsonl.partition(path,
+                                "gs://bucket/out/part",
+                                key=["id"],
+                                n_partitions=2,
+                                workers=1,
+                                memory_limit=4 << 20)
+    assert [part_sizes[x] for x in out_paths] == [1 << 20, 1 << 20]
+    assert part_sizes[path] is None
+    assert sorted(x["id"] for y in out_paths
+                  for x in Jsonl.read(y)) == list(range(20))
+    assert os.path.exists(fake_gs(out_paths[0]))
+
+    assert gcs_part_size(1) == gcs_part_size(1 << 18) == 1 << 18
+    assert gcs_part_size((1 << 18) + 1) == 1 << 19
@@ -0,0 +1,177 @@
+"""test the jsonl_process.py file"""
+import json
+import os
+from functools import partial
+from unittest.mock import patch
+
+import pytest
+
+from computing_toolbox.utils.jsonl import Jsonl
+from computing_toolbox.utils.jsonl_process import JsonlCheckpoint, _iter_chunks, _process_chunk, _seek
+from computing_toolbox.utils.jsonl_query import JsonlQuery
+
+
+def save_chunk(chunk_id: int, documents: list, out_dir: str, fail_at=None):
+    """processing function: save the documents of a chunk in its own file"""
+    if any(x["k"] == fail_at for x in documents):
+        raise RuntimeError(f"failing at k={fail_at}")
+    with open(os.path.join(out_dir, f"chunk-{chunk_id}.json"),
+              "w",
+              encoding="utf8") as fp:
+        fp.write(json.dumps(documents))
+
+
+def read_chunks(out_dir: str) -> dict:
+    """the saved documents by chunk id"""
+    chunks = {}
+    for name in os.listdir(out_dir):
+        with open(os.path.join(out_dir, name), encoding="utf8") as fp:
+            chunks[int(name[6:-5])] = json.loads(fp.read())
+    return chunks
+
+
+def test_process_chunk(tmp_path):
+    """test the worker function and the chunk splitting"""
+    lines = [b'{"k": 1}\n', b'{"k": 2}\n', b'{"k": 3}\n']
+    with open(os.path.join(tmp_path, "data.jsonl"), "wb") as fp:
+        fp.write(b"".join(lines))
+    with open(os.path.join(tmp_path, "data.jsonl"), "rb") as fp:
+        chunks = list(_iter_chunks(fp, chunk_id=4, offset=0, chunk_size=2))
+    assert chunks == [(4, 0, 18, lines[:2]), (5, 18, 27, lines[2:])]
+
+    # a not seekable file is read forward up to the offset
+    with open(os.path.join(tmp_path, "data.jsonl"), "rb") as fp:
+        with patch.object(fp, "seekable", return_value=False):
+            _seek(fp, 18, buffer_size=4)
+            assert fp.read() == lines[2]
+            _seek(fp, 10)
+
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    save_fn = partial(save_chunk, out_dir=out_dir)
+    query = JsonlQuery(where={"k": 2})
+    assert _process_chunk(chunks[0], save_fn, query) == (4, 0, 18, 1)
+    assert read_chunks(out_dir) == {4: [{"k": 2}]}
+
+
+@pytest.mark.parametrize("extension", ["", ".gz", ".zst"])
+def test_process_resume(tmp_path, extension):
+    """test a failed processing is resumed after the last committed chunk"""
+    path = os.path.join(tmp_path, f"data.jsonl{extension}")
+    data = [{"k": k} for k in range(50)]
+    Jsonl.write(path, data)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+
+    # 1. the processing dies at the chunk 3
+    with pytest.raises(RuntimeError):
+        _ = Jsonl.process(path,
+                          partial(save_chunk, out_dir=out_dir, fail_at=35),
+                          workers=1,
+                          chunk_size=10)
+    checkpoint = JsonlCheckpoint.read(path)
+    assert (checkpoint.n_chunks, checkpoint.n_documents,
+            checkpoint.done) == (3, 30, False)
+    # the chunk 4 could have been in flight
+    assert sorted(read_chunks(out_dir))[:3] == [0, 1, 2]
+    assert 3 not in read_chunks(out_dir)
+
+    # 2. the chunks 0-2 are not processed again
+    os.remove(os.path.join(out_dir, "chunk-0.json"))
+    n = Jsonl.process(path,
+                      partial(save_chunk, out_dir=out_dir),
+                      workers=2,
+                      chunk_size=10,
+                      tqdm_kwargs={})
+    assert n == len(data)
+    chunks = read_chunks(out_dir)
+    assert sorted(chunks) == [1, 2, 3, 4]
+    assert [x for k in range(1, 5) for x in chunks[k]] == data[10:]
+
+    # 3. a done file is not processed again
+    assert Jsonl.process(path,
+                         partial(save_chunk, out_dir=out_dir),
+                         chunk_size=10) == len(data)
+
+
+def test_process_checkpoint_mismatch(tmp_path):
+    """test the checkpoint of another file or chunk size is not used"""
+    path = os.path.join(tmp_path, "data.jsonl")
+    checkpoint_path = os.path.join(tmp_path, "progress.ckpt")
+    Jsonl.write(path, [{"k": k} for k in range(5)])
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    save_fn = partial(save_chunk, out_dir=out_dir)
+
+    n = Jsonl.process(path,
+                      save_fn,
+                      checkpoint_path=checkpoint_path,
+                      chunk_size=2,
+                      where={"k": 3},
+                      workers=1)
+    assert n == 1
+    assert os.path.exists(checkpoint_path)
+    with pytest.raises(ValueError):
+        _ = Jsonl.process(path, save_fn, checkpoint_path=checkpoint_path)
+    with pytest.raises(ValueError):
+        _ = Jsonl.process(path, save_fn, chunk_size=0)
+
+
+def test_checkpoint(tmp_path):
+    """test how to save, read and commit a checkpoint"""
+    path = os.path.join(tmp_path, "data.jsonl")
+    checkpoint_path = os.path.join(tmp_path, "data.jsonl.ckpt")
+    Jsonl.write(path, [{"k": k} for k in range(5)])
+    assert JsonlCheckpoint.read(path) is None
+
+    checkpoint = JsonlCheckpoint.build(path, 10).save()
+    assert checkpoint.sidecar_path == checkpoint_path
+    assert not os.path.exists(checkpoint_path + ".tmp")
+    checkpoint.commit(0, 40, 10)
+    loaded = JsonlCheckpoint.read(path)
+    assert loaded.is_current()
+    assert (loaded.chunk_size, loaded.n_chunks, loaded.n_documents,
+            loaded.offset) == (10, 1, 10, 40)
+    with pytest.raises(ValueError):
+        loaded.commit(0, 40, 10)
+
+    # a checkpoint of another content is read but it is not current
+    JsonlCheckpoint(path, 100, 1.5, 10).save()
+    assert not JsonlCheckpoint.read(path).is_current()
+    assert JsonlCheckpoint.load(path) is None
+
+    # an unknown version is ignored
+    with open(checkpoint_path, "w", encoding="utf8") as fp:
+        fp.write(json.dumps({"version": 0}))
+    assert JsonlCheckpoint.read(path) is None
+
+
+def test_process_modified_file(tmp_path):
+    """test the checkpoint of a modified file is rejected"""
+    path = os.path.join(tmp_path, "data.jsonl")
+    Jsonl.write(path, [{"k": k} for k in range(5)])
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    save_fn = partial(save_chunk, out_dir=out_dir)
+
+    assert Jsonl.process(path, save_fn, chunk_size=2, workers=1) == 5
+    Jsonl.write(path, [{"k": k} for k in range(6)])
+    with pytest.raises(ValueError):
+        _ = Jsonl.process(path, save_fn, chunk_size=2, workers=1)
+
+
+def test_process_gs_first_run(fake_gs, tmp_path):
+    """test the first run on a gs:// file, without a checkpoint, starts from the beginning"""
+    path = "gs://bucket/data.jsonl"
+    Jsonl.write(path, [{"k": k} for k in range(15)])
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+
+    assert JsonlCheckpoint.read(path) is None
+    assert Jsonl.process(path,
+                         partial(save_chunk, out_dir=out_dir),
+                         chunk_size=10,
+                         workers=1) == 15
+    assert sorted(read_chunks(out_dir)) == [0, 1]
+    assert os.path.exists(fake_gs(path + ".ckpt"))
+    assert JsonlCheckpoint.read(path).done
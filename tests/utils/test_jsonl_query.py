@@ -0,0 +1,137 @@
+"""test the jsonl_query.py file"""
+import gzip
+import json
+import os
+import pickle
+from dataclasses import dataclass
+from functools import partial
+
+import pytest
+
+from computing_toolbox.utils.jsonl import Jsonl
+from computing_toolbox.utils.jsonl_query import Dropped, JsonlQuery
+
+
+@dataclass
+class Person:
+    """a class to map the documents"""
+    name: str
+    age: int
+
+
+def test_decode():
+    """test how to decode whole documents or mapping class objects"""
+    line = '{"name": "john", "age": 30}'
+    assert JsonlQuery().decode(line) == {"name": "john", "age": 30}
+    assert JsonlQuery(mapping_class=Person).decode(line) == Person("john", 30)
+
+
+def test_decode_fields():
+    """test how to project fields with keys and deep_get paths"""
+    line = '{"id": 1, "user": {"name": "john", "age": 30}, "tags": ["a", "b"], "x": null}'
+    query = JsonlQuery(fields=["id", ["user", "name"], ["tags", 1], "x", "y"],
+                       default_value="-")
+    assert query.keys == ["id", "user.name", "tags.1", "x", "y"]
+    assert query.decode(line) == {
+        "id": 1,
+        "user.name": "john",
+        "tags.1": "b",
+        "x": "-",
+        "y": "-"
+    }
+    assert query.decode(line.encode("utf8"))["id"] == 1
+
+
+def test_decode_lines():
+    """test how to decode many lines skipping the empty ones"""
+    query = JsonlQuery(fields=["k"], codec="json")
+    assert query.decode_lines(['{"k": 1, "v": 1}', "", '{"k": 2}']) == [{
+        "k": 1
+    }, {
+        "k": 2
+    }]
+
+
+def is_adult(document: dict) -> bool:
+    """a where condition as a module level function"""
+    return document["age"] >= 18
+
+
+def test_where():
+    """test how to filter documents with a spec or a callable"""
+    lines = [
+        '{"name": "ann", "age": 30, "tags": ["a"]}',
+        '{"name": "bob", "age": 10, "tags": ["b"]}'
+    ]
+    # 1. a {"path": value} spec with dotted paths
+    query = JsonlQuery(where={"tags.0": "b"})
+    assert query.decode(lines[0]) is Dropped
+    assert query.decode_lines(lines) == [{
+        "name": "bob",
+        "age": 10,
+        "tags": ["b"]
+    }]
+    # 2. a callable mapping the matching documents to a class
+    query = JsonlQuery(mapping_class=Person, where=is_adult)
+    assert query.decode_lines(lines) == [Person("ann", 30)]
+    # 3. filter and project
+    query = JsonlQuery(fields=["name"], where={"age": 10})
+    assert query.decode_lines(lines) == [{"name": "bob"}]
+    assert query.match({"age": 10}) and not query.match({})
+
+
+def test_pickle():
+    """the query is sent to the pool workers, so it must be picklable"""
+    query = JsonlQuery(fields=["id", ["a", 0]], where=is_adult)
+    other = pickle.loads(pickle.dumps(query))
+    assert other.decode('{"id": 3, "a": [4], "age": 20}') == {
+        "id": 3,
+        "a.0": 4
+    }
+    assert pickle.loads(pickle.dumps(Dropped)) is Dropped
+
+
+def test_fields_and_mapping_class():
+    """fields and mapping_class can't be used at the same time"""
+    with pytest.raises(ValueError):
+        _ = JsonlQuery(fields=["name"], mapping_class=Person)
+
+
+def save_documents(chunk_id: int, documents: list, out_dir: str):
+    """processing function: save the documents of a chunk in its own file"""
+    with open(os.path.join(out_dir, f"{chunk_id}.json"), "w",
+              encoding="utf8") as fp:
+        fp.write(json.dumps(documents))
+
+
+@pytest.mark.parametrize(
+    "mode",
+    ["read", "lines", "chunks", "byte_ranges", "gzip_members", "process"])
+def test_blank_lines(mode, tmp_path):
+    """test the blank lines are skipped by every reader"""
+    content = b'{"a": 1}\n\n  \n{"a": 2}\n\n'
+    path = os.path.join(
+        tmp_path, "data.jsonl.gz" if mode == "gzip_members" else "data.jsonl")
+    with open(path, "wb") as fp:
+        fp.write(gzip.compress(content) if mode == "gzip_members" else content)
+
+    if mode == "read":
+        documents = Jsonl.read(path)
+    elif mode == "process":
+        out_dir = os.path.join(tmp_path, "out")
+        os.makedirs(out_dir)
+        Jsonl.process(path,
+                      partial(save_documents, out_dir=out_dir),
+                      workers=2,
+                      chunk_size=2)
+        documents = []
+        for name in sorted(os.listdir(out_dir)):
+            with open(os.path.join(out_dir, name), encoding="utf8") as fp:
+                documents += json.loads(fp.read())
+    else:
+        documents = Jsonl.parallel_read(path,
+                                        workers=2,
+                                        mode=mode,
+                                        chunk_size=2)
+    assert documents == [{"a": 1}, {"a": 2}]
+    assert JsonlQuery().decode(" \n") is Dropped
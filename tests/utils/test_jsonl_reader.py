@@ -0,0 +1,99 @@
+"""test the jsonl_reader.py file"""
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pytest
+
+from computing_toolbox.utils.jsonl import Jsonl
+from computing_toolbox.utils.jsonl_reader import JsonlReader, line_offsets
+
+
+@dataclass
+class Item:
+    """a mapping class"""
+    k: int
+    name: str
+
+
+def test_line_offsets():
+    """test the start offset of every line is found"""
+    assert line_offsets(b"").tolist() == [0]
+    assert line_offsets(b"a\nbb\n").tolist() == [0, 2, 5]
+    assert line_offsets(b"a\nbb").tolist() == [0, 2, 4]
+    assert line_offsets(b"a\n\nbb\nc",
+                        block_size=2).tolist() == [0, 2, 3, 6, 7]
+
+
+def test_reader(tmp_path):
+    """test random access to the documents"""
+    path = os.path.join(tmp_path, "data.jsonl")
+    data = [{"k": k, "name": f"n{k}"} for k in range(25)]
+    Jsonl.write(path, data)
+
+    with JsonlReader(path) as reader:
+        assert len(reader) == len(data)
+        assert reader[0] == data[0]
+        assert reader[-1] == data[-1]
+        assert reader[10:15] == data[10:15]
+        assert reader[::5] == data[::5]
+        assert reader[30:] == []
+        assert reader.line(1) == b'{"k": 1, "name": "n1"}'
+        for k in [25, -26]:
+            with pytest.raises(IndexError):
+                _ = reader[k]
+    assert os.path.exists(path + JsonlReader.EXTENSION)
+
+    # mapping classes and fields
+    assert JsonlReader(path, mapping_class=Item)[3] == Item(3, "n3")
+    assert JsonlReader(path, fields=["name"], cache=False)[3] == {"name": "n3"}
+
+
+def test_reader_cache(tmp_path):
+    """test the cached offsets are rebuilt when the file changes"""
+    path = os.path.join(tmp_path, "data.jsonl")
+    with open(path, "w", encoding="utf8") as fp:
+        fp.write('{"k": 1}\n\n{"k": 2}')
+    reader = JsonlReader(path)
+    assert reader[:] == [{"k": 1}, None, {"k": 2}]
+    reader.close()
+    reader.close()
+
+    # 1. the cached offsets are loaded
+    assert JsonlReader(path).offsets.tolist() == [0, 9, 10, 18]
+
+    # 2. a modified file is indexed again
+    with open(path, "a", encoding="utf8") as fp:
+        fp.write('\n{"k": 3}\n')
+    assert JsonlReader(path)[:] == [{"k": 1}, None, {"k": 2}, {"k": 3}]
+
+    # 3. a corrupted cache is ignored
+    with open(path + JsonlReader.EXTENSION, "wb") as fp:
+        fp.write(b"garbage")
+    assert len(JsonlReader(path)) == 4
+
+
+def test_reader_read_only(tmp_path, monkeypatch):
+    """test the offsets are kept in memory when the sidecar can't be written"""
+    path = os.path.join(tmp_path, "data.jsonl")
+    Jsonl.write(path, [{"k": 1}, {"k": 2}])
+
+    def savez(*args, **kwargs):
+        raise PermissionError(13, "Permission denied")
+
+    monkeypatch.setattr(np, "savez", savez)
+    with JsonlReader(path) as reader:
+        assert reader[:] == [{"k": 1}, {"k": 2}]
+    assert not os.path.exists(path + JsonlReader.EXTENSION)
+
+
+def test_reader_errors(tmp_path):
+    """test the empty, remote and compressed files"""
+    path = os.path.join(tmp_path, "empty.jsonl")
+    Jsonl.write(path, [])
+    with JsonlReader(path) as reader:
+        assert len(reader) == 0
+        assert reader[:] == []
+    for path in ["gs://bucket/data.jsonl", "data.jsonl.gz"]:
+        with pytest.raises(ValueError):
+            _ = JsonlReader(path)
@@ -0,0 +1,133 @@
+"""test the jsonl_sort.py file"""
+import os
+import random
+from unittest.mock import patch
+
+import pytest
+
+from computing_toolbox.utils.jsonl import Jsonl
+from computing_toolbox.utils.jsonl_sort import _iter_run, _iter_runs, _merge_runs, _sort_run, sort_file, \
+    sort_key
+
+
+def test_sort_key():
+    """test the missing values go after any other value"""
+    documents = [{"a": 2}, {"a": None}, {}, {"a": 1}]
+    keys = [sort_key(x, [["a"]]) for x in documents]
+    assert sorted(range(4), key=lambda k: keys[k]) == [3, 0, 1, 2]
+
+
+def test_runs(tmp_path):
+    """test how to split, sort and read the runs"""
+    path = os.path.join(tmp_path, "data.jsonl")
+    with open(path, "w", encoding="utf8") as fp:
+        fp.write('{"k": 3}\n{"k": 1}\n\n{"k": 2}')
+
+    # 1. split in runs of at least 10 characters
+    runs = list(_iter_runs(path, 10, str(tmp_path)))
+    assert [lines for _, lines in runs] == [['{"k": 3}', '{"k": 1}'],
+                                            ['{"k": 2}']]
+
+    # 2. sort and spill a run
+    run_path, n = _sort_run(runs[0], [["k"]])
+    assert n == 2
+    assert [line
+            for _, line in _iter_run(run_path)] == ['{"k": 1}', '{"k": 3}']
+
+    # 3. merge two runs in a new one
+    other_path, _ = _sort_run(runs[1], [["k"]])
+    merged_path = os.path.join(tmp_path, "merged.lz4")
+    assert _merge_runs((merged_path, [run_path,
+                                      other_path])) == (merged_path, 3)
+    assert [line for _, line in _iter_run(merged_path)
+            ] == ['{"k": 1}', '{"k": 2}', '{"k": 3}']
+    assert not os.path.exists(run_path) and not os.path.exists(other_path)
+
+
+@pytest.mark.parametrize("extension", ["", ".gz"])
+def test_sort(tmp_path, extension):
+    """test the external sort gives the same result as sorted"""
+    path = os.path.join(tmp_path, f"data.jsonl{extension}")
+    out_path = os.path.join(tmp_path, f"sorted.jsonl{extension}")
+    rng = random.Random(0)
+    data = [{
+        "id": k,
+        "user": {
+            "score": rng.randint(0, 20)
+        }
+    } for k in range(300)]
+    Jsonl.write(path, data)
+
+    # 1. small runs force many runs to be merged
+    n = Jsonl.sort(path,
+                   out_path,
+                   key=[["user", "score"]],
+                   workers=2,
+                   memory_limit=3000,
+                   tmp_dir=str(tmp_path),
+                   tqdm_kwargs={})
+    assert n == len(data)
+    expected = sorted(data, key=lambda x: x["user"]["score"])
+    assert Jsonl.read(out_path) == expected
+    assert not [x for x in os.listdir(tmp_path) if x.startswith("tmp")]
+
+    # 2. descending order and many keys, stable for the ties
+    Jsonl.sort(path,
+               out_path,
+               key=[["user", "score"], "id"],
+               reverse=True,
+               memory_limit=1000)
+    expected = sorted(data,
+                      key=lambda x: (x["user"]["score"], x["id"]),
+                      reverse=True)
+    assert Jsonl.read(out_path) == expected
+
+    # 3. the lines are written in small buffers
+    assert sort_file(path,
+                     out_path, [["id"]],
+                     run_size=500,
+                     buffer_lines=7,
+                     tqdm_kwargs={}) == len(data)
+    assert Jsonl.read(out_path) == data
+
+    with pytest.raises(ValueError):
+        _ = Jsonl.sort(path, path, key=["id"])
+
+
+def test_sort_empty(tmp_path):
+    """test an empty file"""
+    path = os.path.join(tmp_path, "empty.jsonl")
+    Jsonl.write(path, [])
+    assert Jsonl.sort(path, path + ".sorted", key=["id"], workers=1) == 0
+    assert not Jsonl.read(path + ".sorted")
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_sort_many_runs(tmp_path, reverse):
+    """test the runs are merged in many passes when they can't be open at once"""
+    path = os.path.join(tmp_path, "data.jsonl")
+    out_path = os.path.join(tmp_path, "sorted.jsonl")
+    rng = random.Random(1)
+    data = [{"id": k, "score": rng.randint(0, 9)} for k in range(500)]
+    Jsonl.write(path, data)
+
+    # one document per run: 500 runs merged 3 at a time
+    opened = []
+    with patch("computing_toolbox.utils.jsonl_sort._iter_run",
+               side_effect=lambda x: opened.append(x) or _iter_run(x)):
+        n = Jsonl.sort(path,
+                       out_path,
+                       key=["score"],
+                       workers=1,
+                       memory_limit=2,
+                       reverse=reverse,
+                       max_open_runs=3)
+    assert n == len(data)
+    expected = sorted(data, key=lambda x: x["score"], reverse=reverse)
+    assert Jsonl.read(out_path) == expected
+    # the final merge opens at most 3 runs, the previous ones are merged runs
+    assert len([x for x in opened if "/run-" in x]) == 0
+    assert len(opened) == 3
+
+    with pytest.raises(ValueError):
+        _ = sort_file(path, out_path, [["id"]], max_open_runs=1)
@@ -0,0 +1,27 @@
+"""test the lazy_pool.py file"""
+from unittest.mock import patch
+
+from computing_toolbox.utils.lazy_pool import LazyPool
+
+
+def test_lazy_pool():
+    """test the pool methods with real processes"""
+    with LazyPool(2) as pool:
+        assert pool.workers == 2
+        assert pool.map(abs, [-1, -2]) == [1, 2]
+        assert list(pool.imap(abs, [-3])) == [3]
+
+    # closing an unused pool does nothing
+    LazyPool().close()
+
+
+@patch("computing_toolbox.utils.lazy_pool.Pool")
+def test_lazy_pool_reuse(pool_mock):
+    """test the processes are created on first use and shared by many calls"""
+    with LazyPool(3) as pool:
+        pool_mock.assert_not_called()
+        _ = pool.map(abs, [1])
+        _ = pool.imap(abs, [2])
+        _ = pool.map(abs, [3])
+        pool_mock.assert_called_once_with(3)
+    pool_mock.return_value.__exit__.assert_called_once()
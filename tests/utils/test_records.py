@@ -0,0 +1,120 @@
+"""test the records.py file"""
+import os
+from dataclasses import dataclass
+
+import pytest
+
+from computing_toolbox.utils.records import Records, _read_byte_range
+
+
+@dataclass
+class Point:
+    """a mapping class"""
+    x: int
+    y: int
+
+
+@pytest.mark.parametrize("serializer", ["msgpack", "pickle"])
+def test_write_read(tmp_path, serializer):
+    """test how to write and read record files"""
+    path = os.path.join(tmp_path, "data.rec")
+    data = [{"k": k, "name": f"n{k}", "tags": [k, k + 1]} for k in range(25)]
+
+    # 1. write the records and the index
+    assert Records.write(path, data, tqdm_kwargs={},
+                         serializer=serializer) == len(data)
+    assert os.path.exists(Records.index_path(path))
+    assert Records.count(path) == len(data)
+
+    # 2. sequential reads
+    allow = serializer == "pickle"
+    assert Records.read(path, tqdm_kwargs={}, allow_pickle=allow) == data
+    assert Records.read(path, offset=20, allow_pickle=allow) == data[20:]
+    assert Records.read(path, offset=3, limit=4,
+                        allow_pickle=allow) == data[3:7]
+    assert not Records.read(path, offset=30, allow_pickle=allow)
+    assert list(Records.iter_read(path, limit=2,
+                                  allow_pickle=allow)) == data[:2]
+
+    # 3. parallel reads
+    assert Records.parallel_read(path,
+                                 workers=3,
+                                 tqdm_kwargs={},
+                                 allow_pickle=allow) == data
+    assert Records.parallel_read(path,
+                                 offset=5,
+                                 limit=10,
+                                 workers=4,
+                                 allow_pickle=allow) == data[5:15]
+    assert not Records.parallel_read(path, offset=25, allow_pickle=allow)
+
+    # 4. random access
+    assert Records.get(path, 0, allow_pickle=allow) == data[0]
+    assert Records.get(path, 24, allow_pickle=allow) == data[24]
+    for k in [-1, 25]:
+        with pytest.raises(IndexError):
+            _ = Records.get(path, k, allow_pickle=allow)
+
+
+def test_mapping_class(tmp_path):
+    """test the objects are mapped to a class"""
+    path = os.path.join(tmp_path, "points.rec")
+    points = [Point(k, 2 * k) for k in range(5)]
+
+    # msgpack stores the dataclasses as dictionaries
+    Records.write(path, points, serializer="msgpack")
+    assert Records.read(path) == [{"x": p.x, "y": p.y} for p in points]
+    assert Records.read(path, mapping_class=Point) == points
+    assert Records.get(path, 3, mapping_class=Point) == points[3]
+
+    # pickle restores the original objects
+    Records.write(path, iter(points), serializer="pickle")
+    assert Records.read(path, allow_pickle=True) == points
+    for read_fn in [
+            Records.read, Records.parallel_read,
+            lambda x, **kwargs: Records.get(x, 0, **kwargs)
+    ]:
+        with pytest.raises(ValueError, match="mapping_class"):
+            _ = read_fn(path, mapping_class=Point, allow_pickle=True)
+
+
+def test_read_byte_range(tmp_path):
+    """test the worker function"""
+    path = os.path.join(tmp_path, "data.rec")
+    Records.write(path, [{"k": k} for k in range(3)], serializer="msgpack")
+    offsets = Records.offsets(path)
+    args = (path, int(offsets[1]), int(offsets[3]), None)
+    assert _read_byte_range(args, "msgpack") == [{"k": 1}, {"k": 2}]
+
+
+def test_errors(tmp_path):
+    """test invalid serializers, files and indexes"""
+    path = os.path.join(tmp_path, "data.rec")
+    with pytest.raises(ValueError):
+        _ = Records.resolve_serializer("json")
+    assert Records.resolve_serializer() == "msgpack"
+    assert Records.resolve_serializer("pickle") == "pickle"
+
+    # 1. a stale index
+    Records.write(path, [{"k": 1}])
+    with open(path, "ab") as fp:
+        fp.write(b"garbage")
+    with pytest.raises(ValueError):
+        _ = Records.read(path)
+
+    # 2. not a record file
+    with open(path, "wb") as fp:
+        fp.write(b"hello, world")
+    with pytest.raises(ValueError):
+        _ = Records.get(path, 0)
+
+
+def test_safe_reads(tmp_path):
+    """test pickle files are read only on demand"""
+    path = os.path.join(tmp_path, "data.rec")
+    Records.write(path, [{"k": 1}], serializer="pickle")
+    for read_fn in [
+            Records.read, Records.parallel_read, lambda x: Records.get(x, 0)
+    ]:
+        with pytest.raises(ValueError, match="allow_pickle"):
+            _ = read_fn(path)
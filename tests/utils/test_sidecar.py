@@ -0,0 +1,20 @@
+"""test the sidecar.py file"""
+from unittest.mock import patch
+
+from google.api_core.exceptions import NotFound
+
+from computing_toolbox.utils.sidecar import read_json
+
+
+def test_read_json(tmp_path):
+    """test missing, invalid and valid json files"""
+    path = tmp_path / "data.json"
+    assert read_json(str(path)) is None
+    path.write_text("not a json")
+    assert read_json(str(path)) is None
+    path.write_text('{"a": 1}')
+    assert read_json(str(path)) == {"a": 1}
+
+    with patch("computing_toolbox.utils.sidecar.smart_open.open",
+               side_effect=NotFound("missing")):
+        assert read_json("gs://bucket/data.json") is None